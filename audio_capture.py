@@ -0,0 +1,191 @@
+import subprocess
+import threading
+import wave
+
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit signed little endian, mono
+
+
+class RingBuffer:
+    """Fixed-size byte ring that hands out zero-copy views of recent audio.
+
+    Everything written is stored twice, at `pos` and `pos + capacity`, so any
+    window of up to `capacity` bytes is contiguous in memory and can be
+    returned as a memoryview without copying or stitching. Positions are
+    absolute byte offsets since the buffer was created.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = bytearray(capacity * 2)
+        self.total = 0
+        self.cond = threading.Condition()
+
+    def write(self, chunk):
+        chunk = memoryview(chunk)
+        # Only the last `capacity` bytes of an oversized chunk can be kept
+        if len(chunk) > self.capacity:
+            skip = len(chunk) - self.capacity
+            with self.cond:
+                self.total += skip
+            chunk = chunk[skip:]
+        with self.cond:
+            pos = self.total % self.capacity
+            first = min(len(chunk), self.capacity - pos)
+            self.data[pos:pos + first] = chunk[:first]
+            self.data[pos + self.capacity:pos + self.capacity + first] = chunk[:first]
+            rest = len(chunk) - first
+            if rest:
+                self.data[0:rest] = chunk[first:]
+                self.data[self.capacity:self.capacity + rest] = chunk[first:]
+            self.total += len(chunk)
+            self.cond.notify_all()
+
+    def oldest(self):
+        """Oldest absolute position still held in the buffer"""
+        return max(0, self.total - self.capacity)
+
+    def view(self, start, end):
+        """Zero-copy view of bytes [start, end). Overwritten data raises ValueError."""
+        with self.cond:
+            if start < self.oldest() or end > self.total or start > end:
+                raise ValueError(f"range {start}-{end} not in buffer ({self.oldest()}-{self.total})")
+            offset = start % self.capacity
+            return memoryview(self.data)[offset:offset + (end - start)]
+
+    def wait_for(self, position, timeout=None):
+        """Block until `position` bytes have been written. Returns False on timeout."""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.total >= position, timeout)
+
+
+class AudioCapture:
+    """One long-running ffmpeg process streaming 16 kHz mono PCM into a ring buffer.
+
+    Replaces starting ffmpeg for every recording window: capture never stops,
+    so nothing said between windows is lost and there is no per-window
+    process startup cost.
+    """
+
+    def __init__(self, input_args, buffer_seconds=60, sample_rate=SAMPLE_RATE):
+        self.input_args = input_args
+        self.sample_rate = sample_rate
+        self.bytes_per_second = sample_rate * SAMPLE_WIDTH
+        self.ring = RingBuffer(int(buffer_seconds * self.bytes_per_second))
+        self.process = None
+        self.thread = None
+        self.cursor = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def command(self):
+        return [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            *self.input_args,
+            "-ac", "1",
+            "-ar", str(self.sample_rate),
+            "-f", "s16le",
+            "pipe:1",
+        ]
+
+    def start(self):
+        """Start the capture process. Returns True if audio is flowing."""
+        if self.running:
+            return True
+        try:
+            self.process = subprocess.Popen(
+                self.command(),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=0,
+            )
+        except OSError as e:
+            print(f"Could not start audio capture: {e}")
+            self.process = None
+            return False
+
+        self.thread = threading.Thread(target=self._reader, daemon=True)
+        self.thread.start()
+        # Wait briefly for the first samples so callers know the device opened
+        if not self.ring.wait_for(self.ring.total + 1, timeout=5) or not self.running:
+            print("Audio capture produced no data")
+            self.stop()
+            return False
+        return True
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def _reader(self):
+        stream = self.process.stdout
+        chunk = bytearray(self.bytes_per_second // 20)  # 50 ms reads
+        while True:
+            try:
+                n = stream.readinto(chunk)
+            except (OSError, ValueError):
+                break
+            if not n:
+                break
+            self.ring.write(memoryview(chunk)[:n])
+
+    def _oldest(self):
+        oldest = self.ring.oldest()
+        return oldest + oldest % SAMPLE_WIDTH
+
+    def position(self):
+        """Current absolute write position, aligned to a whole sample"""
+        return self.ring.total - self.ring.total % SAMPLE_WIDTH
+
+    def seconds_to_bytes(self, seconds):
+        n = int(seconds * self.bytes_per_second)
+        return n - n % SAMPLE_WIDTH
+
+    def read(self, start, end, timeout=None):
+        """Wait for [start, end) to be captured and return a zero-copy view of it"""
+        if timeout is None:
+            timeout = (end - self.ring.total) / self.bytes_per_second + 2
+        if not self.ring.wait_for(end, timeout):
+            return None
+        start = max(start, self._oldest())
+        return self.ring.view(start, end)
+
+    def latest(self, seconds):
+        """View of the most recent `seconds` of audio"""
+        end = self.position()
+        return self.ring.view(max(self._oldest(), end - self.seconds_to_bytes(seconds)), end)
+
+    def record(self, seconds, continuous=False):
+        """Return the next `seconds` of audio.
+
+        With `continuous`, the window starts where the previous continuous
+        read ended, so back-to-back calls cover the stream without gaps even
+        while the caller was busy transcribing.
+        """
+        if continuous and self.cursor is not None:
+            start = max(self.cursor, self._oldest())
+        else:
+            start = self.position()
+        end = start + self.seconds_to_bytes(seconds)
+        pcm = self.read(start, end)
+        if pcm is not None and continuous:
+            self.cursor = end
+        return pcm
+
+
+def write_wav(pcm, output_file, sample_rate=SAMPLE_RATE):
+    """Write raw 16-bit mono PCM to a WAV file"""
+    with wave.open(output_file, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
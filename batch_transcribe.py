@@ -0,0 +1,247 @@
+import argparse
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".opus", ".webm", ".aac")
+
+# Set in each pool process by _init_worker
+_worker = None
+
+
+class _Worker:
+    """One pool process: its own scratch directory and Whisper engine, so nothing is shared"""
+
+    def __init__(self, index, options):
+        from main import WHISPER_MODEL, WHISPER_PATH, WHISPER_SERVER_PATH, WHISPER_SERVER_PORT
+        from whisper_engine import WhisperEngine
+
+        self.index = index
+        self.scratch = tempfile.mkdtemp(prefix=f"braincharge-batch-{index}-")
+        self.engine = WhisperEngine(
+            WHISPER_PATH,
+            WHISPER_MODEL,
+            transcript_base=os.path.join(self.scratch, "transcript"),
+            server_path=WHISPER_SERVER_PATH,
+            # Clear of the bot's server and service.py's workers
+            port=WHISPER_SERVER_PORT + 50 + index,
+            use_server=options["server"],
+            threads=options["threads"],
+        )
+
+    def transcribe(self, path):
+        audio_file = path
+        if not _is_whisper_wav(path):
+            audio_file = os.path.join(self.scratch, "input.wav")
+            subprocess.run(
+                ["ffmpeg", "-nostdin", "-y", "-loglevel", "error", "-i", path,
+                 "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le", audio_file],
+                check=True, capture_output=True,
+            )
+        with wave.open(audio_file, "rb") as wav:
+            audio_seconds = wav.getnframes() / float(wav.getframerate())
+        started = time.perf_counter()
+        text = self.engine.transcribe(audio_file)
+        return {
+            "text": text,
+            "audio_seconds": round(audio_seconds, 2),
+            "transcribe_seconds": round(time.perf_counter() - started, 3),
+            "worker": self.index,
+        }
+
+    def close(self):
+        self.engine.stop()
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+
+def _is_whisper_wav(path):
+    """Whether whisper.cpp can read the file as-is (16 kHz 16-bit WAV)"""
+    try:
+        with wave.open(path, "rb") as wav:
+            return wav.getframerate() == 16000 and wav.getsampwidth() == 2
+    except (wave.Error, EOFError, OSError):
+        return False
+
+
+def _init_worker(counter, options):
+    global _worker
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    _worker = _Worker(index, options)
+    # Pool processes leave through os._exit(), which skips atexit; multiprocessing
+    # still runs its own finalizers, so the server and scratch directory go with them
+    multiprocessing.util.Finalize(_worker, _worker.close, exitpriority=10)
+
+
+def _transcribe(path):
+    return _worker.transcribe(path)
+
+
+def find_audio_files(root):
+    """Audio files under `root` (or `root` itself), sorted by path"""
+    if os.path.isfile(root):
+        return [root]
+    found = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                found.append(os.path.join(directory, name))
+    return sorted(found)
+
+
+def _file_key(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": int(st.st_mtime)}
+
+
+class Manifest:
+    """Append-only JSONL record of which files are done, so an interrupted run can resume.
+
+    A file counts as done only while its size and mtime are unchanged, so
+    a re-recorded file is transcribed again. Failed files are retried.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    self.entries.setdefault(record["path"], {}).update(record)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, path):
+        entry = self.entries.get(path)
+        return bool(entry) and entry.get("status") == "done" and \
+            (entry.get("size"), entry.get("mtime")) == tuple(_file_key(path).values())
+
+    def record(self, path, **fields):
+        record = {"path": path, **fields}
+        self.entries.setdefault(path, {}).update(record)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def transcribe_all(files, output, manifest, workers, options):
+    """Transcribe `files` across a process pool, appending one JSON line per file to `output`.
+
+    Returns (files done, audio seconds, wall seconds, failures).
+    """
+    # Longest first, so one long recording doesn't finish alone at the end
+    files = sorted(files, key=lambda path: os.path.getsize(path), reverse=True)
+    done = failed = 0
+    audio_total = 0.0
+    started = time.perf_counter()
+    counter = multiprocessing.Value("i", 0)
+    with open(output, "a", encoding="utf-8") as out, \
+            ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(counter, options)) as pool:
+        futures = {pool.submit(_transcribe, path): path for path in files}
+        for future in as_completed(futures):
+            path = futures[future]
+            key = _file_key(path)
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  FAILED {path}: {e}")
+                manifest.record(path, status="failed", error=str(e), **key)
+                continue
+            out.write(json.dumps({"path": path, **result}) + "\n")
+            out.flush()
+            manifest.record(path, status="done", **key)
+            done += 1
+            audio_total += result["audio_seconds"]
+            elapsed = time.perf_counter() - started
+            print(f"  [{done + failed}/{len(files)}] {path}: {result['audio_seconds']:.0f}s audio "
+                  f"in {result['transcribe_seconds']:.1f}s  "
+                  f"(running {audio_total / elapsed:.1f} audio-s per wall-s)")
+    return done, audio_total, time.perf_counter() - started, failed
+
+
+def fold_into_context(output, manifest):
+    """Add transcribed recordings not yet folded to the conversation history and recall index"""
+    from main import CONTEXT_FILE, SUMMARY_FILE, ConversationContext
+
+    texts = {}
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            texts[record["path"]] = record["text"]
+
+    pending = [
+        path for path, entry in manifest.entries.items()
+        if entry.get("status") == "done" and not entry.get("folded") and texts.get(path) and os.path.exists(path)
+    ]
+    if not pending:
+        print("No new transcripts to add to conversation memory")
+        return 0
+    context = ConversationContext(CONTEXT_FILE, SUMMARY_FILE)
+    # In recording order, so the history reads chronologically
+    for path in sorted(pending, key=os.path.getmtime):
+        context.add_exchange(texts[path], "", source=path)
+        manifest.record(path, folded=True)
+    context.history.close()
+    context.memory.close()
+    print(f"Added {len(pending)} recorded sessions to conversation memory "
+          f"(summarized on the bot's next summary update)")
+    return len(pending)
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Transcribe a directory of recordings in parallel")
+    parser.add_argument("source", help="audio file or directory (searched recursively)")
+    parser.add_argument("-o", "--output", default="transcripts.jsonl", help="JSONL results, appended to")
+    parser.add_argument("--manifest", help="resume manifest (default: <output>.manifest)")
+    parser.add_argument("--threads", type=int, default=2, help="whisper.cpp threads per worker")
+    parser.add_argument("--workers", type=int, help="worker processes (default: cores / threads)")
+    parser.add_argument("--cli", action="store_true",
+                        help="spawn whisper-cli per file instead of a resident server per worker")
+    parser.add_argument("--fold", action="store_true",
+                        help="add the transcripts to the bot's conversation history and recall index")
+    args = parser.parse_args()
+
+    workers = args.workers or max(1, cores // args.threads)
+    manifest = Manifest(args.manifest or args.output + ".manifest")
+    files = find_audio_files(args.source)
+    todo = [path for path in files if not manifest.is_done(path)]
+    print(f"{len(files)} audio files, {len(files) - len(todo)} already done; "
+          f"transcribing {len(todo)} with {workers} workers x {args.threads} threads")
+
+    failed = 0
+    if todo:
+        options = {"threads": args.threads, "server": not args.cli}
+        done, audio, wall, failed = transcribe_all(todo, args.output, manifest, workers, options)
+        if wall > 0:
+            print(f"Transcribed {done} files, {audio / 60:.1f} min of audio in {wall:.1f}s: "
+                  f"{audio / wall:.1f} audio-seconds per wall-second"
+                  + (f", {failed} failed (rerun to retry)" if failed else ""))
+    if args.fold:
+        fold_into_context(args.output, manifest)
+    manifest.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
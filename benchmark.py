@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from ollama_client import OllamaClient
+from ollama_stub import StubOllamaServer
+
+
+STAGES = ["record", "transcribe", "llm", "tts", "persist"]
+
+# Stand-in programs put first on PATH, so the real pipeline functions spawn them
+_FAKE_FFMPEG = '''
+import sys, time, wave
+args = sys.argv[1:]
+if {realtime} and "-t" in args:
+    time.sleep(float(args[args.index("-t") + 1]))
+with wave.open({source!r}, "rb") as wav:
+    sys.stdout.buffer.write(wav.readframes(wav.getnframes()))
+'''
+
+_FAKE_WHISPER = '''
+import sys, time
+args = sys.argv[1:]
+if args[args.index("-f") + 1] == "-":
+    sys.stdin.buffer.read()
+time.sleep({delay})
+if "-of" in args:
+    with open(args[args.index("-of") + 1] + ".txt", "w") as f:
+        f.write({transcript!r})
+else:
+    print("[00:00:00.000 --> 00:00:02.000]   " + {transcript!r})
+'''
+
+_FAKE_ESPEAK = '''
+import io, sys, time, wave
+time.sleep({delay})
+if "--stdout" in sys.argv:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(22050)
+        wav.writeframes(bytes(len(sys.argv[-1]) * 1000))
+    sys.stdout.buffer.write(buffer.getvalue())
+'''
+
+# Swallows the PCM it is sent, like a player with no sound card
+_FAKE_PLAYER = '''
+import sys
+while sys.stdin.buffer.read(65536):
+    pass
+'''
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples):
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+    }
+
+
+def _write_script(directory, name, body):
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.write(f"#!{sys.executable}\n{body}")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+def install_stand_ins(directory, args):
+    """Create fake ffmpeg / whisper-cli / espeak / player programs and put them first on PATH"""
+    _write_script(directory, "ffmpeg", _FAKE_FFMPEG.format(
+        source=os.path.abspath(args.audio), realtime=args.realtime_capture))
+    whisper = _write_script(directory, "whisper-cli", _FAKE_WHISPER.format(
+        delay=args.whisper_delay, transcript=args.transcript))
+    _write_script(directory, "espeak", _FAKE_ESPEAK.format(delay=args.tts_delay))
+    _write_script(directory, "aplay", _FAKE_PLAYER)
+    _write_script(directory, "ffplay", _FAKE_PLAYER)
+    os.environ["PATH"] = directory + os.pathsep + os.environ.get("PATH", "")
+    return whisper
+
+
+def run_benchmark(args):
+    import main
+
+    workdir = tempfile.mkdtemp(prefix="braincharge-bench-")
+    stub = None
+    try:
+        main.PERSISTENT_CAPTURE = False  # one-shot recording through the fake ffmpeg
+        if not args.real_whisper:
+            main.WHISPER_PATH = install_stand_ins(workdir, args)
+            main.WHISPER_SERVER = False
+        else:
+            install_stand_ins(workdir, args)
+        main._whisper_engine = None
+        main._transcriber = None
+        main.TTS_ENGINE = "espeak"
+        main.TTS_CACHE_DIR = os.path.join(workdir, "tts_cache")
+        main._tts = None
+        main.TEMP_TRANSCRIPT = os.path.join(workdir, "transcript")
+
+        if args.ollama_host:
+            host = args.ollama_host
+        else:
+            stub = StubOllamaServer(tokens_per_second=args.token_rate, prefill_delay=args.prefill_delay)
+            host = stub.start()
+        main._llm_client = OllamaClient(main.OLLAMA_MODEL, host=host, keep_alive=main.OLLAMA_KEEP_ALIVE)
+
+        context = main.ConversationContext(
+            os.path.join(workdir, "context.json"),
+            os.path.join(workdir, "summary.json"),
+        )
+        timings = {stage: [] for stage in STAGES + ["turn"]}
+        if args.stream:
+            timings["first_audio"] = []
+
+        for turn in range(args.warmup + args.turns):
+            stage_times = {}
+
+            start = time.perf_counter()
+            pcm = main.record_audio(args.record_seconds)
+            stage_times["record"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            user_input = main.transcribe_audio(pcm) or args.transcript
+            stage_times["transcribe"] = time.perf_counter() - start
+
+            if args.stream:
+                # Generation and speech overlap, so they are timed together
+                start = time.perf_counter()
+                first_audio = []
+                speak = main.speak_response
+                main.speak_response = lambda text: (first_audio.append(time.perf_counter()), speak(text))
+                try:
+                    response = main.stream_response(user_input, context)
+                finally:
+                    main.speak_response = speak
+                stage_times["llm"] = time.perf_counter() - start
+                stage_times["tts"] = 0.0
+                if first_audio:
+                    stage_times["first_audio"] = first_audio[0] - start
+            else:
+                start = time.perf_counter()
+                response = main.generate_response(user_input, context)
+                stage_times["llm"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                main.speak_response(response)
+                stage_times["tts"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            context.add_exchange(user_input, response)
+            stage_times["persist"] = time.perf_counter() - start
+
+            stage_times["turn"] = sum(stage_times[stage] for stage in STAGES)
+            if turn >= args.warmup:
+                for stage, value in stage_times.items():
+                    timings[stage].append(value)
+
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            "stages": {stage: summarize(values) for stage, values in timings.items() if values},
+        }
+    finally:
+        if stub:
+            stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(current, baseline, tolerance):
+    """Print per-stage p50/p95 changes; returns the list of regressions"""
+    regressions = []
+    print(f"\nCompared with {baseline.get('timestamp', 'baseline')}:")
+    for stage, stats in current["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if not before:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            old, new = before[key], stats[key]
+            change = (new - old) / old if old else 0.0
+            flag = ""
+            if change > tolerance and new - old > 1.0:
+                flag = "  <-- REGRESSION"
+                regressions.append(f"{stage} {key}")
+            print(f"  {stage:12s} {key}: {old:9.1f} -> {new:9.1f} ms ({change:+.0%}){flag}")
+    return regressions
+
+
+def print_report(result):
+    print(f"\n{'stage':12s} {'p50':>10s} {'p95':>10s} {'p99':>10s}   (ms, n={result['settings']['turns']})")
+    for stage, stats in result["stages"].items():
+        print(f"{stage:12s} {stats['p50_ms']:10.1f} {stats['p95_ms']:10.1f} {stats['p99_ms']:10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark for the voice pipeline")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--audio", default="input.wav", help="WAV replayed by the fake ffmpeg")
+    parser.add_argument("--record-seconds", type=float, default=5)
+    parser.add_argument("--realtime-capture", action="store_true", help="fake ffmpeg waits the full duration")
+    parser.add_argument("--transcript", default="I've been feeling really tired looking after my mother this week.")
+    parser.add_argument("--whisper-delay", type=float, default=0.0, help="seconds the fake whisper-cli takes")
+    parser.add_argument("--real-whisper", action="store_true", help="use the configured whisper.cpp instead")
+    parser.add_argument("--token-rate", type=float, default=40.0, help="stub LLM tokens per second")
+    parser.add_argument("--prefill-delay", type=float, default=0.0, help="stub LLM prefill seconds")
+    parser.add_argument("--ollama-host", help="benchmark a real Ollama server instead of the stub")
+    parser.add_argument("--tts-delay", type=float, default=0.0, help="seconds the fake espeak takes")
+    parser.add_argument("--stream", action="store_true", help="use streaming replies with pipelined TTS")
+    parser.add_argument("--output", help="results file (default bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    print_report(result)
+
+    output = args.output or os.path.join("bench_results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+import hashlib
+import json
 import os
 import platform
+import shutil
 import subprocess
 import re
 
@@ -53,7 +56,7 @@ def _default_whisper_model() -> str:
     )
 
 
-def _detect_windows_dshow_device() -> str | None:
+def _list_windows_dshow_devices() -> str:
     try:
         # ffmpeg prints device list to stderr; 'dummy' input is intentional
         proc = subprocess.run(
@@ -62,7 +65,13 @@ def _detect_windows_dshow_device() -> str | None:
             text=True,
             check=False,
         )
-        output = (proc.stderr or "") + "\n" + (proc.stdout or "")
+        return (proc.stderr or "") + "\n" + (proc.stdout or "")
+    except Exception:
+        return ""
+
+
+def _detect_windows_dshow_device(output: str) -> str | None:
+    try:
         # Look for quoted device names that include 'Microphone'
         candidates = re.findall(r'"([^"]*Microphone[^"]*)"', output, flags=re.IGNORECASE)
         if candidates:
@@ -76,6 +85,77 @@ def _detect_windows_dshow_device() -> str | None:
     return None
 
 
+def _probe_windows_device(dshow_listing: str):
+    # Prefer WASAPI default device which works on most modern Windows setups
+    # Users can override via FFMPEG_FORMAT/FFMPEG_DEVICE.
+    # If WASAPI isn't available in this ffmpeg build, fall back to dshow detection.
+    try:
+        proc = subprocess.run(
+            ["ffmpeg", "-f", "wasapi", "-i", "default", "-t", "0.1", "-f", "null", "-"],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if proc.returncode == 0 or "Input #0, wasapi" in (proc.stderr or ""):
+            return "wasapi", "default"
+    except Exception:
+        pass
+
+    detected = _detect_windows_dshow_device(dshow_listing)
+    return "dshow", (detected or "audio=default")
+
+
+DEVICE_CACHE_FILE = os.path.join(REPO_ROOT, ".device_cache.json")
+
+
+def _ffmpeg_fingerprint() -> str | None:
+    """Identifies the installed ffmpeg build (path, size, mtime) without running it"""
+    path = shutil.which("ffmpeg")
+    if not path:
+        return None
+    st = os.stat(path)
+    return f"{path}:{st.st_size}:{int(st.st_mtime)}"
+
+
+def _cached_windows_device():
+    """Windows device probe, cached on disk.
+
+    The WASAPI test recording is the slow part, so its result is reused
+    while the ffmpeg build and the dshow device list are unchanged.
+    invalidate_device_cache() forces a fresh probe (e.g. after the cached
+    device failed to open).
+    """
+    listing = _list_windows_dshow_devices()
+    key = hashlib.sha256(f"{_ffmpeg_fingerprint()}\n{listing}".encode("utf-8")).hexdigest()
+    try:
+        with open(DEVICE_CACHE_FILE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached["format"], cached["device"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    fmt, dev = _probe_windows_device(listing)
+    try:
+        tmp = DEVICE_CACHE_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "format": fmt, "device": dev}, f, indent=2)
+        os.replace(tmp, DEVICE_CACHE_FILE)
+    except OSError:
+        pass
+    return fmt, dev
+
+
+def invalidate_device_cache():
+    """Forget the detected device so the next lookup probes again"""
+    global _audio_device
+    _audio_device = None
+    try:
+        os.remove(DEVICE_CACHE_FILE)
+    except OSError:
+        pass
+
+
 def _default_ffmpeg_format_and_device():
     fmt = os.getenv("FFMPEG_FORMAT")
     dev = os.getenv("FFMPEG_DEVICE")
@@ -83,23 +163,7 @@ def _default_ffmpeg_format_and_device():
         return fmt, dev
 
     if SYSTEM == "Windows":
-        # Prefer WASAPI default device which works on most modern Windows setups
-        # Users can override via FFMPEG_FORMAT/FFMPEG_DEVICE.
-        # If WASAPI isn't available in this ffmpeg build, fall back to dshow detection.
-        try:
-            proc = subprocess.run(
-                ["ffmpeg", "-f", "wasapi", "-i", "default", "-t", "0.1", "-f", "null", "-"],
-                capture_output=True,
-                text=True,
-                check=False,
-            )
-            if proc.returncode == 0 or "Input #0, wasapi" in (proc.stderr or ""):
-                return "wasapi", "default"
-        except Exception:
-            pass
-
-        detected = _detect_windows_dshow_device()
-        return "dshow", (detected or "audio=default")
+        return _cached_windows_device()
     if SYSTEM == "Darwin":
         # avfoundation uses ":<audio_index>"; 0 is common default
         return "avfoundation", ":0"
@@ -110,23 +174,43 @@ def _default_ffmpeg_format_and_device():
 # Public config values
 WHISPER_PATH = _default_whisper_path()
 WHISPER_MODEL = _default_whisper_model()
-FFMPEG_FORMAT, FFMPEG_DEVICE = _default_ffmpeg_format_and_device()
 RECORD_SECONDS = int(os.getenv("RECORD_SECONDS", "5"))
 TEMP_AUDIO = os.getenv("TEMP_AUDIO", "input.wav")
 TEMP_TRANSCRIPT = os.getenv("TEMP_TRANSCRIPT", "transcript")
-TEMP_RESPONSE = os.getenv("TEMP_RESPONSE", "response.wav")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma3:4b")
 
 
-def ffmpeg_record_command(output_wav: str) -> list[str]:
+_audio_device = None
+
+
+def audio_device():
+    """(format, device) for ffmpeg, detected on first use rather than at import"""
+    global _audio_device
+    if _audio_device is None:
+        _audio_device = _default_ffmpeg_format_and_device()
+    return _audio_device
+
+
+def __getattr__(name):
+    # FFMPEG_FORMAT / FFMPEG_DEVICE are resolved lazily so importing config stays instant
+    if name == "FFMPEG_FORMAT":
+        return audio_device()[0]
+    if name == "FFMPEG_DEVICE":
+        return audio_device()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def ffmpeg_input_args() -> list[str]:
+    fmt, dev = audio_device()
+    return ["-f", fmt, "-i", dev]
+
+
+def ffmpeg_record_command(output_wav: str, seconds: float | None = None) -> list[str]:
     return [
         "ffmpeg",
-        "-f",
-        FFMPEG_FORMAT,
-        "-i",
-        FFMPEG_DEVICE,
+        *ffmpeg_input_args(),
         "-t",
-        str(RECORD_SECONDS),
+        str(seconds if seconds is not None else RECORD_SECONDS),
         output_wav,
         "-y",
     ]
@@ -0,0 +1,122 @@
+from datetime import datetime
+
+from prompt_cache import estimate_tokens
+
+
+# Fill order when the budget is tight: earlier sections are kept first.
+# (Prompt order is different: the summary comes first so it stays a stable prefix.)
+PRIORITY = ("recent", "voice", "action_items", "people", "dates", "overview", "topics", "emotional", "recalled")
+
+_HEADERS = {
+    "people": "People mentioned:\n",
+    "dates": "Important dates:\n",
+    "action_items": "Action items:\n",
+    "topics": "Key topics: \n\n",  # only counted; topics are joined on one line
+}
+
+
+def _person_line(person):
+    line = f"- {person.get('name', 'Unknown')}"
+    if person.get('relationship'):
+        line += f" ({person['relationship']})"
+    if person.get('context'):
+        line += f": {person['context']}"
+    return line + "\n"
+
+
+def _date_distance(date_info, today):
+    """Days between an item's date and today, or None if it isn't an ISO date"""
+    try:
+        return abs((datetime.fromisoformat(str(date_info.get("date", ""))[:10]) - today).days)
+    except ValueError:
+        return None
+
+
+def summary_items(summary, today=None):
+    """The summary's items as {section: [(rank, index, line), ...]}, best rank first.
+
+    Later list entries are treated as more recent, and dates closest to
+    today (past or upcoming) rank highest.
+    """
+    today = today or datetime.now()
+    items = {}
+    if summary.get("summary"):
+        items["overview"] = [(0, 0, f"Overall: {summary['summary']}\n\n")]
+    for section, render in (("people", _person_line), ("action_items", lambda item: f"- {item}\n")):
+        entries = summary.get(section) or []
+        items[section] = [(len(entries) - i, i, render(entry)) for i, entry in enumerate(entries)]
+    dates = summary.get("dates") or []
+    items["dates"] = []
+    for i, date_info in enumerate(dates):
+        distance = _date_distance(date_info, today)
+        rank = (0, distance) if distance is not None else (1, len(dates) - i)
+        items["dates"].append((rank, i, f"- {date_info.get('date', 'Unknown')}: {date_info.get('event', '')}\n"))
+    topics = summary.get("topics") or []
+    items["topics"] = [(len(topics) - i, i, topic) for i, topic in enumerate(topics)]
+    if "emotional_patterns" in summary:
+        items["emotional"] = [(0, 0, f"Emotional context: {summary['emotional_patterns']}\n\n")]
+    for entries in items.values():
+        entries.sort(key=lambda entry: entry[0])
+    return items
+
+
+def _render(selected):
+    """Summary prompt section from the chosen lines, in the usual section order"""
+    if not any(selected.values()):
+        return ""
+    text = "\n=== Conversation Summary ===\n"
+    text += "".join(selected.get("overview", []))
+    for section in ("people", "dates"):
+        if selected.get(section):
+            text += _HEADERS[section] + "".join(selected[section]) + "\n"
+    if selected.get("topics"):
+        text += f"Key topics: {', '.join(selected['topics'])}\n\n"
+    text += "".join(selected.get("emotional", []))
+    if selected.get("action_items"):
+        text += _HEADERS["action_items"] + "".join(selected["action_items"]) + "\n"
+    return text
+
+
+def select_summary(summary, available=None):
+    """Render the summary within `available` tokens (everything when None).
+
+    Sections are filled in PRIORITY order and items by rank, skipping any
+    that no longer fit; kept items appear in their original order.
+    Returns (text, {section: tokens}).
+    """
+    items = summary_items(summary) if summary else {}
+    chosen = {section: [] for section in items}
+    tokens = {}
+    used = 0
+    for section in PRIORITY:
+        for _, index, line in items.get(section, []):
+            cost = estimate_tokens(line) + (0 if chosen[section] else estimate_tokens(_HEADERS.get(section, "")))
+            if available is not None and used + cost > available:
+                continue
+            chosen[section].append((index, line))
+            tokens[section] = tokens.get(section, 0) + cost
+            used += cost
+    selected = {section: [line for _, line in sorted(lines)] for section, lines in chosen.items()}
+    return _render(selected), tokens
+
+
+def fit_exchanges(blocks, available, keep_newest=True):
+    """Keep the newest of `blocks` (rendered exchanges, oldest first) that fit in `available` tokens.
+
+    With `keep_newest` the newest block is kept even if it alone is over
+    budget. Returns (kept blocks in order, tokens).
+    """
+    kept, used = [], 0
+    for block in reversed(blocks):
+        cost = estimate_tokens(block)
+        if used + cost > available and not (keep_newest and not kept):
+            break
+        kept.append(block)
+        used += cost
+    return list(reversed(kept)), used
+
+
+def format_budget(report):
+    """One-line per-section token report, e.g. for the LLM stats line"""
+    sections = ", ".join(f"{name} {tokens}" for name, tokens in report["sections"].items() if tokens)
+    return f"context ~{report['total']}/{report['budget']} tokens ({sections or 'empty'})"
@@ -0,0 +1,292 @@
+import json
+import os
+import re
+import threading
+
+
+MANIFEST = "manifest.json"
+_SEGMENT_NAME = re.compile(r"segment-(\d+)\.jsonl(\.tmp)?$")
+
+
+def _atomic_write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_tail_lines(path, n, block_size=65536):
+    """Last `n` complete lines of a file, read backwards so big files aren't loaded"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = [line for line in data.split(b"\n") if line.strip()]
+    return lines[-n:] if n else []
+
+
+class ConversationLog:
+    """Append-only, line-delimited log of conversation exchanges.
+
+    Each exchange is one JSON line appended (and fsynced) to the active
+    segment, so a turn costs the same no matter how much history exists.
+    When the active segment fills up it is sealed and recorded in
+    manifest.json along with its count and timestamp range; small sealed
+    segments are merged in the background. Startup only reads the manifest
+    and the active segment, and a torn last line from a crash is dropped.
+
+    Behaves like a read-only list for callers: len(), indexing, slicing
+    (history[-5:] only reads the tail) and iteration.
+    """
+
+    def __init__(self, directory, segment_size=500, compact_target=20000, compact_after=4):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.compact_target = compact_target
+        self.compact_after = compact_after
+        self.lock = threading.RLock()
+        self.compactor = None
+        self.readers = 0
+        self.retired = []  # merged-away segment files still open by an iterator
+        os.makedirs(directory, exist_ok=True)
+
+        manifest_path = os.path.join(directory, MANIFEST)
+        manifest = {}
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, "r") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {}
+        self.segments = manifest.get("segments", [])
+        self.next_id = manifest.get("next_id", 1)
+        self.active_name = manifest.get("active")
+        if self.active_name is None:
+            self.active_name = self._new_segment_name()
+            self._save_manifest()
+        self._remove_orphans()
+
+        self.active = self._recover_active()
+        self.active_file = open(self._path(self.active_name), "ab")
+
+    # ---- persistence ---------------------------------------------------
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _new_segment_name(self):
+        name = f"segment-{self.next_id:06d}.jsonl"
+        self.next_id += 1
+        return name
+
+    def _save_manifest(self):
+        _atomic_write_json(self._path(MANIFEST), {
+            "segments": self.segments,
+            "active": self.active_name,
+            "next_id": self.next_id,
+        })
+
+    def _remove_orphans(self):
+        """Delete segment files left behind by an interrupted compaction"""
+        known = {s["file"] for s in self.segments} | {self.active_name}
+        for name in os.listdir(self.directory):
+            if _SEGMENT_NAME.match(name) and name not in known:
+                os.remove(self._path(name))
+
+    def _recover_active(self):
+        """Load the active segment, truncating a torn or corrupt final line"""
+        path = self._path(self.active_name)
+        if not os.path.exists(path):
+            return []
+        exchanges = []
+        good_bytes = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    exchanges.append(json.loads(line))
+                except ValueError:
+                    break
+                good_bytes += len(line)
+        if good_bytes != os.path.getsize(path):
+            print(f"Recovered conversation log: dropped a partial entry in {self.active_name}")
+            with open(path, "r+b") as f:
+                f.truncate(good_bytes)
+        return exchanges
+
+    def _read_segment(self, segment):
+        with open(self._path(segment["file"]), "rb") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    # ---- writes --------------------------------------------------------
+
+    def append(self, exchange):
+        line = json.dumps(exchange, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self.lock:
+            self.active_file.write(line)
+            self.active_file.flush()
+            os.fsync(self.active_file.fileno())
+            self.active.append(exchange)
+            if len(self.active) >= self.segment_size:
+                self._rotate()
+
+    def _rotate(self):
+        """Seal the active segment and start a new one"""
+        self.active_file.close()
+        self.segments.append({
+            "file": self.active_name,
+            "count": len(self.active),
+            "first": self.active[0].get("timestamp"),
+            "last": self.active[-1].get("timestamp"),
+        })
+        self.active_name = self._new_segment_name()
+        self.active = []
+        self.active_file = open(self._path(self.active_name), "ab")
+        self._save_manifest()
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        small = [s for s in self.segments if s["count"] < self.compact_target]
+        if len(small) < self.compact_after:
+            return
+        if self.compactor and self.compactor.is_alive():
+            return
+        self.compactor = threading.Thread(target=self.compact, daemon=True)
+        self.compactor.start()
+
+    def compact(self):
+        """Merge runs of adjacent small sealed segments into larger ones"""
+        with self.lock:
+            snapshot = list(self.segments)
+
+        groups, current = [], []
+        for segment in snapshot:
+            if current and sum(s["count"] for s in current) + segment["count"] > self.compact_target:
+                groups.append(current)
+                current = []
+            current.append(segment)
+        groups.append(current)
+
+        for group in groups:
+            if len(group) < 2:
+                continue
+            with self.lock:
+                name = self._new_segment_name()
+            tmp = self._path(name + ".tmp")
+            with open(tmp, "wb") as out:
+                for segment in group:
+                    with open(self._path(segment["file"]), "rb") as f:
+                        for line in f:
+                            if line.strip():
+                                out.write(line)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, self._path(name))
+
+            merged = {
+                "file": name,
+                "count": sum(s["count"] for s in group),
+                "first": group[0]["first"],
+                "last": group[-1]["last"],
+            }
+            with self.lock:
+                index = self.segments.index(group[0])
+                self.segments[index:index + len(group)] = [merged]
+                self._save_manifest()
+                self.retired.extend(segment["file"] for segment in group)
+                self._purge_retired()
+
+    def _purge_retired(self):
+        if self.readers:
+            return
+        for name in self.retired:
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self.retired = []
+
+    def clear(self):
+        if self.compactor and self.compactor.is_alive():
+            self.compactor.join()
+        with self.lock:
+            self.active_file.close()
+            for segment in self.segments:
+                os.remove(self._path(segment["file"]))
+            os.remove(self._path(self.active_name))
+            self.segments = []
+            self.active = []
+            self.active_name = self._new_segment_name()
+            self.active_file = open(self._path(self.active_name), "ab")
+            self._save_manifest()
+
+    def close(self):
+        with self.lock:
+            self.active_file.close()
+
+    # ---- reads ---------------------------------------------------------
+
+    def __len__(self):
+        with self.lock:
+            return sum(s["count"] for s in self.segments) + len(self.active)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def tail(self, n):
+        """The most recent `n` exchanges, reading only as far back as needed"""
+        if n <= 0:
+            return []
+        with self.lock:
+            result = self.active[-n:]
+            for segment in reversed(self.segments):
+                if len(result) >= n:
+                    break
+                lines = _read_tail_lines(self._path(segment["file"]), n - len(result))
+                result = [json.loads(line) for line in lines] + result
+        return result
+
+    def _iter_snapshot(self, keep_segment=None):
+        """Iterate a consistent snapshot; compaction won't delete files it is reading"""
+        with self.lock:
+            segments = [s for s in self.segments if keep_segment is None or keep_segment(s)]
+            active = list(self.active)
+            self.readers += 1
+        try:
+            for segment in segments:
+                yield from self._read_segment(segment)
+            yield from active
+        finally:
+            with self.lock:
+                self.readers -= 1
+                self._purge_retired()
+
+    def __iter__(self):
+        return self._iter_snapshot()
+
+    def since(self, timestamp):
+        """Exchanges with a timestamp after `timestamp`, skipping older segments"""
+        for exchange in self._iter_snapshot(lambda s: (s.get("last") or "") > timestamp):
+            if exchange["timestamp"] > timestamp:
+                yield exchange
+
+    def __getitem__(self, key):
+        length = len(self)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(length)
+            if step == 1 and stop == length:
+                return self.tail(length - start) if start < stop else []
+            return list(self)[key]
+        if key < 0:
+            key += length
+        if not 0 <= key < length:
+            raise IndexError("conversation log index out of range")
+        if key >= length - len(self.active):
+            return self.tail(length - key)[0]
+        return list(self)[key]
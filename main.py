@@ -3,15 +3,46 @@ import json
 import os
 import time
 import platform
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+LAUNCH_TIME = time.monotonic()
+
+from audio_capture import SAMPLE_RATE, AudioCapture, write_wav
+from context_budget import PRIORITY, fit_exchanges, format_budget, select_summary
+from conversation_log import ConversationLog
+from metrics import metrics
+from model_router import ModelRouter, format_route
+from ollama_client import OllamaClient, format_stats
+from prompt_cache import PrefixTracker, estimate_tokens, format_reuse
+from retrieval import MemoryIndex
+from speech_stream import SentenceSplitter, SpeechPipeline
+from summary_worker import SummaryWorker
+from tts import AudioCache, TextToSpeech, create_backend
+from whisper_engine import WhisperEngine
+
 # Try to import config.py utilities, fall back to config.json
 try:
-    from config import ffmpeg_record_command as get_config_ffmpeg_cmd
+    from config import ffmpeg_input_args as get_config_ffmpeg_input_args
+    from config import invalidate_device_cache
     USE_CONFIG_PY = True
 except ImportError:
     USE_CONFIG_PY = False
 
+# Voice-activity endpointing, wake-word spotting, chunked transcription and voice
+# (prosody) features need numpy; without it turns use fixed-length recordings,
+# every listening window goes to Whisper, each turn is transcribed in one pass
+# and the prompt says nothing about how the user sounds
+try:
+    from parallel_transcribe import ParallelTranscriber, create_engines
+    from prosody import ProsodyTracker, analyze as analyze_prosody, format_features
+    from vad import BargeInMonitor, capture_utterance
+    from wake_word import KeywordSpotter, SlidingWindowDetector
+    HAVE_VAD = True
+except ImportError:
+    HAVE_VAD = False
+
 CONFIG_PATH = "config.json"
 
 if not os.path.exists(CONFIG_PATH):
@@ -31,30 +62,112 @@ else:  # Linux
 
 WHISPER_MODEL = config["whisper_model"]
 PIPER_MODEL = config.get("piper_model", "")
+PIPER_PATH = config.get("piper_path", "piper")
+TTS_ENGINE = config.get("tts_engine", "auto")  # "auto" (Piper if configured), "piper" or "espeak"
+TTS_CACHE_DIR = config.get("tts_cache_dir", "tts_cache")
+TTS_CACHE_ITEMS = config.get("tts_cache_items", 64)  # synthesized lines kept in memory
+
+WHISPER_SERVER = config.get("whisper_server", True)
+WHISPER_SERVER_PATH = config.get("whisper_server_path")  # defaults to whisper-server next to whisper-cli
+WHISPER_SERVER_PORT = config.get("whisper_server_port", 8178)
+# Transcripts Whisper is this sure contain no speech (noise, a cough) are treated as empty
+WHISPER_NO_SPEECH_THRESHOLD = config.get("whisper_no_speech_threshold", 0.6)
+# Utterances longer than WHISPER_PARALLEL_MIN_SECONDS are split at pauses and transcribed on
+# this many Whisper engines at once (0 = off, "auto" = half the cores)
+WHISPER_PARALLEL_WORKERS = config.get("whisper_parallel_workers", 0)
+WHISPER_PARALLEL_MIN_SECONDS = config.get("whisper_parallel_min_seconds", 10)
+WHISPER_CHUNK_SECONDS = config.get("whisper_chunk_seconds", 6)
 
+# Audio goes from capture to Whisper in memory; these files are only used by
+# whisper_engine.py's latency comparison and whisper-cli's file mode
 TEMP_AUDIO = config["temp_audio"]
 TEMP_TRANSCRIPT = config["temp_transcript"]
-TEMP_RESPONSE = config.get("temp_response", "response.wav")
+# When set, every captured utterance and its transcript are saved here for debugging
+DEBUG_DUMP_DIR = config.get("debug_dump_dir", "")
+
+# .env / environment (loaded by config.py) wins over config.json
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", config.get("ollama_model", "gemma3:4b"))
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", config.get("ollama_host", "http://127.0.0.1:11434"))
+OLLAMA_KEEP_ALIVE = config.get("ollama_keep_alive", "30m")
+# Smaller model for short inputs and for hedging a slow primary ("" = primary only)
+OLLAMA_FAST_MODEL = os.getenv("OLLAMA_FAST_MODEL", config.get("ollama_fast_model", ""))
+# Target seconds to the reply's first token; the fast model is also asked after LLM_HEDGE_AFTER_SECONDS
+LLM_LATENCY_SLO_SECONDS = config.get("llm_latency_slo_seconds", 3.0)
+LLM_HEDGE_AFTER_SECONDS = config.get("llm_hedge_after_seconds", 1.5)
+LLM_FAST_MAX_WORDS = config.get("llm_fast_max_words", 4)
+STREAM_RESPONSES = config.get("stream_responses", True)
 
 CONTEXT_FILE = config.get("context_file", "conversation_context.json")
 SUMMARY_FILE = config.get("summary_file", "conversation_summary.json")
+# Exchanges per conversation log segment before it is sealed and a new one started
+CONTEXT_SEGMENT_EXCHANGES = config.get("context_segment_exchanges", 500)
+# Exchanges of recent conversation kept verbatim in the prompt (up to twice this between window jumps)
+RECENT_EXCHANGES = config.get("recent_exchanges", 5)
+# Older exchanges recalled from the search index into each prompt
+RECALL_EXCHANGES = config.get("recall_exchanges", 3)
+# Estimated tokens of summary, recent and recalled conversation per prompt (bounds LLM prefill time)
+CONTEXT_TOKEN_BUDGET = config.get("context_token_budget", 1200)
+# Backlogs larger than this are summarized in chunks and merged
+SUMMARY_CHUNK_EXCHANGES = config.get("summary_chunk_exchanges", 30)
+SUMMARY_MERGE_FAN_IN = 4
+# Earlier exchanges whose voice features make up the user's usual-voice baseline
+PROSODY_BASELINE_EXCHANGES = 200
+# Seconds after a conversation ends before the background summary runs (a new conversation postpones it)
+SUMMARY_DEBOUNCE_SECONDS = config.get("summary_debounce_seconds", 20)
+
+SUMMARY_FORMAT = (
+    "Respond ONLY with valid JSON in this exact format:\n"
+    "{\n"
+    '  "people": [{"name": "...", "relationship": "...", "context": "..."}],\n'
+    '  "dates": [{"date": "...", "event": "..."}],\n'
+    '  "topics": ["topic1", "topic2"],\n'
+    '  "emotional_patterns": "brief description",\n'
+    '  "action_items": ["item1", "item2"],\n'
+    '  "summary": "brief overall summary"\n'
+    "}\n\n"
+)
 
 WAKE_WORD = config.get("wake_word", "companion").lower()
 SLEEP_WORD = config.get("sleep_word", "bye companion").lower()
+# Enrolled recordings for the cheap keyword spotter (python wake_word.py enroll)
+WAKE_WORD_TEMPLATES = config.get("wake_word_templates", "wake_word_templates")
+WAKE_WORD_THRESHOLD = config.get("wake_word_threshold")  # None = calibrate from the templates
 
-
-#need to look into how not not limit conversation duration and base it on when the user stops talking
 LISTEN_DURATION = config.get("listen_duration", 3)
+# With the keyword spotter, a LISTEN_DURATION window is checked every this many seconds
+WAKE_HOP_SECONDS = config.get("wake_hop_seconds", 1.0)
+# Only used when voice-activity endpointing is unavailable
 CONVERSATION_DURATION = config.get("conversation_duration", 5)
 
+# End conversation turns when the user stops talking instead of after a fixed time
+VAD_ENDPOINTING = config.get("vad_endpointing", True)
+VAD_TRAILING_SILENCE = config.get("vad_trailing_silence", 0.8)
+VAD_MAX_SECONDS = config.get("vad_max_seconds", 20)
+VAD_NO_SPEECH_TIMEOUT = config.get("vad_no_speech_timeout", 8)
+
+# One ffmpeg process feeding an in-memory ring buffer instead of one per recording
+PERSISTENT_CAPTURE = config.get("persistent_capture", True)
+CAPTURE_BUFFER_SECONDS = config.get("capture_buffer_seconds", 60)
+
+# Keep listening while the bot talks and stop speaking when the user cuts in
+# (needs the persistent capture and numpy)
+BARGE_IN = config.get("barge_in", True)
+# How far (dB) the user must be above the bot's own voice as heard by the mic
+BARGE_IN_MARGIN_DB = config.get("barge_in_margin_db", 10)
+
+# Per-turn stage timings and event counters (toggle at runtime with SIGUSR1 on Linux/macOS)
+METRICS_ENABLED = config.get("metrics_enabled", True)
+METRICS_TRACE_FILE = config.get("metrics_trace_file", "metrics/trace.jsonl")
+METRICS_PROMETHEUS_FILE = config.get("metrics_prometheus_file", "metrics/braincharge.prom")
 
-def get_audio_input_command(duration, output_file):
-    """Get OS-specific ffmpeg audio recording command with improved device detection."""
+
+def get_audio_input_args():
+    """Get OS-specific ffmpeg input arguments (-f <format> -i <device>)."""
     
     # If config.py is available, try to use its enhanced detection
     if USE_CONFIG_PY:
         try:
-            return get_config_ffmpeg_cmd(output_file)
+            return get_config_ffmpeg_input_args()
         except Exception:
             pass  # Fall back to basic detection below
     
@@ -63,25 +176,14 @@ def get_audio_input_command(duration, output_file):
    #mac
    #mac testing comamnd to figure out mic ffmpeg -f avfoundation -list_devices true -i ""
     if system == "Darwin":
-        return [
-            "ffmpeg",
-            "-f", "avfoundation",
-            "-i", ":1",      
-            "-t", str(duration),
-            output_file,
-            "-y"
-        ]
+        return ["-f", "avfoundation", "-i", ":1"]
 
     #windows
     #ffmpeg -list_devices true -f dshow -i dummy
     elif system == "Windows":
         return [
-            "ffmpeg",
             "-f", "dshow",
             "-i", "audio=Microphone (Realtek Audio)",  # ur windows mic can be diff check using comamnd
-            "-t", str(duration),
-            output_file,
-            "-y"
         ]
 
     #linux need to test pluse audio vs alsa and check if the extra latency is fine as alsa
@@ -91,43 +193,64 @@ def get_audio_input_command(duration, output_file):
     else:
         if os.path.exists("/usr/bin/pulseaudio") or os.path.exists("/usr/bin/pactl"):
             #pulse
-            return [
-                "ffmpeg",
-                "-f", "pulse",
-                "-i", "default",
-                "-t", str(duration),
-                output_file,
-                "-y"
-            ]
+            return ["-f", "pulse", "-i", "default"]
         else:
             #ALSA
-            return [
-                "ffmpeg",
-                "-f", "alsa",
-                "-i", "default",
-                "-t", str(duration),
-                output_file,
-                "-y"
-            ]
+            return ["-f", "alsa", "-i", "default"]
+
+
+def get_audio_input_command(duration):
+    """Get OS-specific ffmpeg command that records `duration` seconds as 16 kHz mono PCM on stdout."""
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        *get_audio_input_args(),
+        "-t", str(duration),
+        "-ac", "1",
+        "-ar", str(SAMPLE_RATE),
+        "-f", "s16le",
+        "pipe:1",
+    ]
 
 
 class ConversationContext:
     """Manages conversation history and context with AI summarization"""
-    def __init__(self, context_file, summary_file):
+    def __init__(self, context_file, summary_file, summary_chunk_size=None, llm=None):
         self.context_file = context_file
         self.summary_file = summary_file
+        self.summary_chunk_size = summary_chunk_size or SUMMARY_CHUNK_EXCHANGES
+        # Callable(prompt, timeout) -> text for summary requests; defaults to the shared Ollama client
+        self.llm = llm
+        self.recent_start = None
         self.history = self.load_context()
         self.summary = self.load_summary()
+        # Opened lazily on the first search or new exchange
+        self.memory = MemoryIndex(os.path.splitext(context_file)[0] + "_index.sqlite", self.history)
+        self.last_context_report = None
+        # How the user sounds this conversation (None without numpy)
+        self.prosody = ProsodyTracker() if HAVE_VAD else None
     
     def load_context(self):
-        """Load full conversation history from file"""
-        if os.path.exists(self.context_file):
+        """Open the append-only conversation log (history is read lazily).
+
+        The log lives in a folder next to context_file. A legacy
+        context_file holding the whole history as one JSON list is imported
+        once and renamed to *.migrated.
+        """
+        log = ConversationLog(
+            os.path.splitext(self.context_file)[0] + "_log",
+            segment_size=CONTEXT_SEGMENT_EXCHANGES,
+        )
+        if os.path.exists(self.context_file) and not log:
             try:
                 with open(self.context_file, "r") as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
+                    legacy = json.load(f)
+                for exchange in legacy:
+                    log.append(exchange)
+                os.replace(self.context_file, self.context_file + ".migrated")
+                print(f"Migrated {len(legacy)} exchanges from {self.context_file} to the conversation log")
+            except Exception as e:
+                print(f"Could not migrate {self.context_file}: {e}")
+        return log
     
     def load_summary(self):
         """Load AI-generated summary from file"""
@@ -140,38 +263,81 @@ class ConversationContext:
         return {}
     
     def save_context(self):
-        """Save full conversation history to file"""
-        with open(self.context_file, "w") as f:
-            json.dump(self.history, f, indent=2)
+        """Nothing to do: every exchange is fsynced to the log as it is added"""
     
     def save_summary(self):
-        """Save AI-generated summary to file"""
-        with open(self.summary_file, "w") as f:
+        """Save AI-generated summary to file (atomically, so a crash can't lose the old one)"""
+        tmp_file = self.summary_file + ".tmp"
+        with open(tmp_file, "w") as f:
             json.dump(self.summary, f, indent=2)
+        os.replace(tmp_file, self.summary_file)
     
-    def add_exchange(self, user_input, assistant_response):
-        """Add a conversation exchange to history"""
-        self.history.append({
+    def start_session(self):
+        """Begin a conversation: reset the voice aggregate and take the baseline from recent exchanges"""
+        if self.prosody is not None:
+            self.prosody.start_session(self.history.tail(PROSODY_BASELINE_EXCHANGES))
+
+    def add_exchange(self, user_input, assistant_response, truncated=False, source=None, prosody=None):
+        """Add a conversation exchange to history and the recall index.
+
+        `truncated` marks a reply the user interrupted; `assistant_response`
+        is then only the part that was spoken. `source` names the recording
+        an archived session was transcribed from (it has no reply).
+        `prosody` holds the voice features of the user's utterance.
+        """
+        exchange = {
             "timestamp": datetime.now().isoformat(),
             "user": user_input,
             "assistant": assistant_response
-        })
-        self.save_context()
+        }
+        if truncated:
+            exchange["truncated"] = True
+        if source:
+            exchange["source"] = source
+        if prosody:
+            exchange["prosody"] = prosody
+        position = len(self.history)
+        self.history.append(exchange)
+        try:
+            self.memory.add(position, exchange)
+        except Exception as e:
+            # The index catches up from the log next time it is opened
+            print(f"Error indexing exchange: {e}")
     
-    def generate_summary(self):
-        """Use Ollama to summarize the conversation and extract key information"""
+    def unsummarized_exchanges(self):
+        """Exchanges added since the summary was last updated"""
+        cutoff = self.summary.get("summarized_through", self.summary.get("last_updated"))
+        if not cutoff:
+            return list(self.history)
+        return list(self.history.since(cutoff))
 
-        if os.path.exists(self.summary_file):
-            os.remove(self.summary_file)
-
-        if not self.history:
-            return
+    def _request_summary(self, prompt):
+        """Send a summary prompt to Ollama and parse the JSON it returns"""
+        if self.llm is not None:
+            summary_text = self.llm(prompt, 60)
+        else:
+            summary_text, _ = get_llm_client().generate(prompt, timeout=60)
+        summary_text = summary_text.strip()
         
+        if "```json" in summary_text:
+            summary_text = summary_text.split("```json")[1].split("```")[0].strip()
+        elif "```" in summary_text:
+            summary_text = summary_text.split("```")[1].split("```")[0].strip()
+        
+        summary = json.loads(summary_text)
+        if not isinstance(summary, dict):
+            raise json.JSONDecodeError("summary is not a JSON object", summary_text, 0)
+        return summary
+
+    def _summarize_exchanges(self, exchanges, previous=None):
+        """Summarize a chunk of exchanges, folding them into `previous` if given"""
         conversation_text = "Conversation history:\n\n"
-        for exchange in self.history:
+        for exchange in exchanges:
             conversation_text += f"[{exchange['timestamp']}]\n"
             conversation_text += f"User: {exchange['user']}\n"
-            conversation_text += f"Assistant: {exchange['assistant']}\n\n"
+            if exchange['assistant']:
+                conversation_text += f"Assistant: {exchange['assistant']}\n"
+            conversation_text += "\n"
         
         summary_prompt = (
             "You are analyzing a conversation between a caregiver and an AI companion bot. "
@@ -181,178 +347,607 @@ class ConversationContext:
             "3. Key concerns or topics discussed\n"
             "4. Emotional state patterns (stress levels, concerns)\n"
             "5. Action items or follow-ups needed\n\n"
-            "Respond ONLY with valid JSON in this exact format:\n"
-            "{\n"
-            '  "people": [{"name": "...", "relationship": "...", "context": "..."}],\n'
-            '  "dates": [{"date": "...", "event": "..."}],\n'
-            '  "topics": ["topic1", "topic2"],\n'
-            '  "emotional_patterns": "brief description",\n'
-            '  "action_items": ["item1", "item2"],\n'
-            '  "summary": "brief overall summary"\n'
-            "}\n\n"
-            f"Conversation to analyze:\n{conversation_text}"
         )
+        if previous:
+            summary_prompt += (
+                "You already have this summary of their earlier conversations:\n"
+                f"{json.dumps(previous, indent=2)}\n\n"
+                "Update it with the new conversation below: keep earlier people, dates and open "
+                "action items, add new information, and prefer newer information when they disagree.\n\n"
+            )
+        summary_prompt += SUMMARY_FORMAT + f"Conversation to analyze:\n{conversation_text}"
+        return self._request_summary(summary_prompt)
+
+    def _merge_summaries(self, summaries):
+        """Combine several summaries into one (the reduce step)"""
+        summaries_text = "\n\n".join(
+            f"Summary {i + 1}:\n{json.dumps(summary, indent=2)}" for i, summary in enumerate(summaries)
+        )
+        merge_prompt = (
+            "You are maintaining long-term notes about a caregiver who talks with an AI companion bot. "
+            "Below are several summaries of their conversations, oldest first. "
+            "Merge them into a single summary: keep every important person, date and open action item, "
+            "drop duplicates and completed items, and prefer newer information when summaries disagree.\n\n"
+            + SUMMARY_FORMAT +
+            f"Summaries to merge:\n{summaries_text}"
+        )
+        return self._request_summary(merge_prompt)
+
+    def generate_summary(self):
+        """Use Ollama to fold new exchanges into the existing summary.
+
+        Only exchanges since the last summary are sent. A large backlog is
+        summarized in chunks which are then merged (map-reduce), so prompt
+        size stays bounded. The previous summary is kept until the new one
+        has been parsed successfully, then swapped in whole, so this can
+        run on a background thread while turns read the summary.
+        Returns True if the summary is up to date, False on failure.
+        """
+        new_exchanges = self.unsummarized_exchanges()
+        if not new_exchanges:
+            return True  # already up to date
         
+        previous = {k: v for k, v in self.summary.items() if k not in ("last_updated", "summarized_through")}
+        chunk_size = self.summary_chunk_size
+        chunks = [new_exchanges[i:i + chunk_size] for i in range(0, len(new_exchanges), chunk_size)]
+
         try:
-            result = subprocess.run(
-                ["ollama", "run", "gemma3:4b", summary_prompt],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            
-            summary_text = result.stdout.strip()
-            
-            if "```json" in summary_text:
-                summary_text = summary_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in summary_text:
-                summary_text = summary_text.split("```")[1].split("```")[0].strip()
-            
-            
-            self.summary = json.loads(summary_text)
-            self.summary["last_updated"] = datetime.now().isoformat()
+            if len(chunks) == 1:
+                summary = self._summarize_exchanges(chunks[0], previous)
+            else:
+                # Map: summarize each chunk on its own. Reduce: merge a few at a time until one is left.
+                pending = ([previous] if previous else []) + [self._summarize_exchanges(c) for c in chunks]
+                while len(pending) > 1:
+                    groups = [pending[i:i + SUMMARY_MERGE_FAN_IN] for i in range(0, len(pending), SUMMARY_MERGE_FAN_IN)]
+                    pending = [self._merge_summaries(g) if len(g) > 1 else g[0] for g in groups]
+                summary = pending[0]
+
+            summary["last_updated"] = datetime.now().isoformat()
+            summary["summarized_through"] = new_exchanges[-1]["timestamp"]
+            self.summary = summary
             self.save_summary()
             
-            print("Summary generated successfully!")
+            print(f"Summary updated with {len(new_exchanges)} new exchanges!")
             print(f"   People: {len(self.summary.get('people', []))}")
             print(f"   Topics: {len(self.summary.get('topics', []))}")
             print(f"   Action items: {len(self.summary.get('action_items', []))}")
+            return True
             
-        except subprocess.TimeoutExpired:
-            print("Summary generation timed out")
+        except TimeoutError:
+            print("Summary generation timed out, keeping the previous summary")
         except json.JSONDecodeError as e:
-            print(f"Failed to parse summary JSON: {e}")
+            print(f"Failed to parse summary JSON, keeping the previous summary: {e}")
         except Exception as e:
             print(f"Error generating summary: {e}")
+        return False
     
-    def get_context_prompt(self):
-        """Build context string using AI summary and recent exchanges"""
-        context_str = ""
-        
-        if self.summary:
-            context_str += "\n=== Conversation Summary ===\n"
-            
-            if "summary" in self.summary:
-                context_str += f"Overall: {self.summary['summary']}\n\n"
-            
-            if "people" in self.summary and self.summary["people"]:
-                context_str += "People mentioned:\n"
-                for person in self.summary["people"]:
-                    context_str += f"- {person.get('name', 'Unknown')}"
-                    if person.get('relationship'):
-                        context_str += f" ({person['relationship']})"
-                    if person.get('context'):
-                        context_str += f": {person['context']}"
-                    context_str += "\n"
-                context_str += "\n"
-            
-            if "dates" in self.summary and self.summary["dates"]:
-                context_str += "Important dates:\n"
-                for date_info in self.summary["dates"]:
-                    context_str += f"- {date_info.get('date', 'Unknown')}: {date_info.get('event', '')}\n"
-                context_str += "\n"
-            
-            if "topics" in self.summary and self.summary["topics"]:
-                context_str += f"Key topics: {', '.join(self.summary['topics'])}\n\n"
-            
-            if "emotional_patterns" in self.summary:
-                context_str += f"Emotional context: {self.summary['emotional_patterns']}\n\n"
-            
-            if "action_items" in self.summary and self.summary["action_items"]:
-                context_str += "Action items:\n"
-                for item in self.summary["action_items"]:
-                    context_str += f"- {item}\n"
-                context_str += "\n"
-        
-        
-        if self.history:
-            context_str += "=== Recent conversation ===\n"
-            for exchange in self.history[-5:]:
-                context_str += f"User: {exchange['user']}\n"
-                context_str += f"Assistant: {exchange['assistant']}\n"
-        
+    @property
+    def summary(self):
+        return self._summary[0]
+
+    @summary.setter
+    def summary(self, value):
+        # Replace the summary as a whole (don't mutate it in place). The summary and its
+        # cached rendering live in one tuple so a reader never pairs one with the other's text.
+        self._summary = (value, None, None)
+
+    def render_summary(self, available=None):
+        """Summary section of the prompt, fitted to `available` tokens.
+
+        The rendering is reused until the summary changes or no longer fits,
+        so it stays byte-identical (a reusable prefix) from turn to turn.
+        Returns (text, {section: tokens}).
+        """
+        state = self._summary
+        summary, text, tokens = state
+        if text is not None and (available is None or sum(tokens.values()) <= available):
+            return text, tokens
+        text, tokens = select_summary(summary, available)
+        if self._summary is state:
+            self._summary = (summary, text, tokens)
+        return text, tokens
+
+    def recent_exchanges(self):
+        """Recent exchanges for the prompt.
+
+        The window start only moves in jumps (once it holds twice
+        RECENT_EXCHANGES), so between jumps each prompt extends the previous
+        one and the LLM can reuse its cached prefix.
+        """
+        total = len(self.history)
+        if self.recent_start is None or total - self.recent_start > 2 * RECENT_EXCHANGES:
+            self.recent_start = max(0, total - RECENT_EXCHANGES)
+        return self.history[self.recent_start:]
+
+    def recall(self, query):
+        """Older exchanges (outside the recent window) relevant to `query`"""
+        if not query or RECALL_EXCHANGES <= 0 or not self.recent_start:
+            return []
+        try:
+            return self.memory.search(query, RECALL_EXCHANGES, before=self.recent_start)
+        except Exception as e:
+            print(f"Error searching past conversations: {e}")
+            return []
+
+    def get_context_prompt(self, query=None):
+        """Build context string using AI summary, recent exchanges and recalled memories.
+
+        The summary comes first and is byte-identical between turns, so
+        system instruction + summary form a stable prefix. Exchanges
+        recalled for `query` change every turn, so they go last.
+
+        Everything is fitted into CONTEXT_TOKEN_BUDGET, filled in priority
+        order: recent turns, how the user sounds, then summary items (action
+        items, people, dates, ...), then recalled exchanges. The tokens used
+        per section are left in `last_context_report`.
+        """
+        budget = CONTEXT_TOKEN_BUDGET
+        recent, recent_tokens = fit_exchanges(
+            [_render_exchange(exchange) for exchange in self.recent_exchanges()], budget
+        )
+        voice = self.prosody.describe() if self.prosody is not None else ""
+        voice_tokens = estimate_tokens(voice) if voice else 0
+        summary_text, summary_tokens = self.render_summary(max(0, budget - recent_tokens - voice_tokens))
+        context_str = summary_text
+
+        if recent:
+            context_str += "=== Recent conversation ===\n" + "".join(recent)
+
+        remaining = budget - recent_tokens - voice_tokens - sum(summary_tokens.values())
+        # Best match first: reversed, so the best are the ones kept
+        recalled, recalled_tokens = fit_exchanges(
+            [_render_exchange(exchange, dated=True) for exchange in reversed(self.recall(query))],
+            remaining, keep_newest=False,
+        )
+        if recalled:
+            context_str += "\n=== Related past conversations ===\n" + "".join(reversed(recalled))
+        # Changes turn to turn, so it goes last with the recalled exchanges
+        context_str += voice
+
+        sections = {"recent": recent_tokens, "voice": voice_tokens, **summary_tokens, "recalled": recalled_tokens}
+        self.last_context_report = {
+            "budget": budget,
+            "total": sum(sections.values()),
+            "sections": {name: sections[name] for name in PRIORITY if sections.get(name)},
+        }
         return context_str
     
     def clear_context(self):
         """Clear all conversation data"""
-        self.history = []
+        self.history.clear()
+        self.memory.clear()
         self.summary = {}
-        self.save_context()
         self.save_summary()
 
-def record_audio(duration, output_file):
-    """Record audio using ffmpeg with OS detection."""
+
+def _render_exchange(exchange, dated=False):
+    """An exchange as prompt lines"""
+    prefix = f"[{exchange['timestamp'][:10]}] " if dated else ""
+    text = f"{prefix}User: {exchange['user']}\n"
+    if exchange['assistant']:
+        text += f"Assistant: {exchange['assistant']}\n"
+    if exchange.get("truncated") and not dated:
+        text += "(The user interrupted the assistant here.)\n"
+    return text
+
+
+_audio_capture = None
+_capture_retry_at = 0
+
+
+def get_audio_capture():
+    """Get the shared long-lived capture process, or None if it isn't available"""
+    global _audio_capture, _capture_retry_at
+    if not PERSISTENT_CAPTURE or time.monotonic() < _capture_retry_at:
+        return None
+    if _audio_capture is None:
+        _audio_capture = AudioCapture(get_audio_input_args(), buffer_seconds=CAPTURE_BUFFER_SECONDS)
+    if not _audio_capture.start():
+        # Use one-shot ffmpeg recordings for a while before trying again, with a fresh device probe
+        _capture_retry_at = time.monotonic() + 30
+        _audio_capture = None
+        if USE_CONFIG_PY:
+            invalidate_device_cache()
+        return None
+    return _audio_capture
+
+
+def record_audio(duration, continuous=False):
+    """Record 16 kHz mono PCM, from the persistent capture buffer when available.
+
+    Returns the PCM bytes, or None if recording failed. With `continuous`,
+    consecutive calls return back-to-back windows so no audio is missed
+    between them (used while listening for the wake word).
+    """
+    capture = get_audio_capture()
+    if capture is not None:
+        if not continuous:
+            capture.cursor = None
+        pcm = capture.record(duration, continuous=continuous)
+        if pcm is not None:
+            return pcm
+        print("Audio capture stalled, falling back to one-shot ffmpeg")
+        metrics.incr("fallbacks", kind="one_shot_ffmpeg")
+
     try:
-        cmd = get_audio_input_command(duration, output_file)
-        subprocess.run(cmd, check=True, capture_output=True)
-        return True
+        cmd = get_audio_input_command(duration)
+        return subprocess.run(cmd, check=True, capture_output=True).stdout
 
     except subprocess.CalledProcessError as e:
         print(f"FFmpeg recording error:\n{e.stderr.decode() if e.stderr else e}")
-        return False
+        if USE_CONFIG_PY:
+            invalidate_device_cache()
+        return None
 
     except Exception as e:
         print(f"Unexpected audio recording error: {e}")
-        return False
+        return None
 
 
-def transcribe_audio(audio_file):
-    """Transcribe audio using Whisper"""
-    try:
-        subprocess.run([
+def record_utterance(barge_in=None):
+    """Record one user turn, stopping once they finish talking. Returns PCM, or None.
+
+    After a barge-in, pass its monitor to start from where the user cut in.
+    """
+    capture = get_audio_capture() if VAD_ENDPOINTING and HAVE_VAD else None
+    if capture is None:
+        with metrics.span("capture"):
+            return record_audio(CONVERSATION_DURATION)
+
+    with metrics.span("capture", endpointing=True):
+        pcm = capture_utterance(
+            capture,
+            trailing_silence=VAD_TRAILING_SILENCE,
+            max_seconds=VAD_MAX_SECONDS,
+            no_speech_timeout=VAD_NO_SPEECH_TIMEOUT,
+            start=barge_in.speech_start if barge_in else None,
+            noise_floor=barge_in.noise_floor if barge_in else None,
+        )
+    if pcm is None:
+        metrics.incr("timeouts", kind="no_speech")
+    return pcm
+
+
+_whisper_engine = None
+
+
+def get_whisper_engine():
+    """Get the shared Whisper engine, created on first use"""
+    global _whisper_engine
+    if _whisper_engine is None:
+        _whisper_engine = WhisperEngine(
             WHISPER_PATH,
-            "-m", WHISPER_MODEL,
-            "-f", audio_file,
-            "-of", TEMP_TRANSCRIPT,
-            "-otxt"
-        ], check=True, capture_output=True)
-        
-        transcript_file = TEMP_TRANSCRIPT + ".txt"
-        if os.path.exists(transcript_file):
-            with open(transcript_file, "r") as f:
-                return f.read().strip()
-        return ""
-    except subprocess.CalledProcessError as e:
-        print(f"Error transcribing: {e}")
+            WHISPER_MODEL,
+            transcript_base=TEMP_TRANSCRIPT,
+            server_path=WHISPER_SERVER_PATH,
+            port=WHISPER_SERVER_PORT,
+            use_server=WHISPER_SERVER,
+            no_speech_threshold=WHISPER_NO_SPEECH_THRESHOLD,
+        )
+    return _whisper_engine
+
+
+_transcriber = None
+
+
+def get_transcriber():
+    """The Whisper engine, or a pool of them for chunked transcription when configured"""
+    global _transcriber
+    if _transcriber is None:
+        workers = WHISPER_PARALLEL_WORKERS
+        if workers == "auto":
+            workers = max(2, (os.cpu_count() or 1) // 2)
+        if workers and workers >= 2 and HAVE_VAD:
+            engines = create_engines(workers, WHISPER_SERVER_PORT + 30, WHISPER_PATH, WHISPER_MODEL,
+                                     WHISPER_SERVER_PATH, WHISPER_SERVER, first=get_whisper_engine(),
+                                     no_speech_threshold=WHISPER_NO_SPEECH_THRESHOLD)
+            _transcriber = ParallelTranscriber(engines, WHISPER_PARALLEL_MIN_SECONDS, WHISPER_CHUNK_SECONDS)
+        else:
+            _transcriber = get_whisper_engine()
+    return _transcriber
+
+
+_debug_dumps = 0
+
+
+def debug_dump(pcm, transcript):
+    """Save an utterance and Whisper's result to DEBUG_DUMP_DIR (when configured)"""
+    global _debug_dumps
+    if not DEBUG_DUMP_DIR:
+        return
+    _debug_dumps += 1
+    base = os.path.join(DEBUG_DUMP_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{_debug_dumps:04d}")
+    try:
+        os.makedirs(DEBUG_DUMP_DIR, exist_ok=True)
+        write_wav(pcm, base + ".wav")
+        with open(base + ".json", "w") as f:
+            json.dump(transcript, f, indent=2)
+    except OSError as e:
+        print(f"Could not write debug dump: {e}")
+
+
+def transcribe_audio(pcm):
+    """Transcribe captured PCM with the resident Whisper engine (whisper-cli fallback), in memory.
+
+    Returns "" when Whisper is confident the audio holds no speech.
+    """
+    with metrics.span("transcribe"):
+        transcript = get_transcriber().transcribe_pcm(pcm)
+    debug_dump(pcm, transcript)
+    no_speech = transcript.get("no_speech_prob")
+    if transcript["text"] and no_speech is not None and no_speech > WHISPER_NO_SPEECH_THRESHOLD:
+        metrics.incr("no_speech_rejects")
         return ""
+    return transcript["text"]
+
+_llm_client = None
+
+
+def get_llm_client():
+    """Get the shared Ollama HTTP client, created on first use"""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = OllamaClient(OLLAMA_MODEL, host=OLLAMA_HOST, keep_alive=OLLAMA_KEEP_ALIVE)
+    return _llm_client
+
+
+_model_router = None
+
+
+def get_model_router():
+    """Get the shared reply router (primary model plus the optional fast model), created on first use"""
+    global _model_router
+    if _model_router is None:
+        fast = None
+        if OLLAMA_FAST_MODEL:
+            fast = OllamaClient(OLLAMA_FAST_MODEL, host=OLLAMA_HOST, keep_alive=OLLAMA_KEEP_ALIVE)
+        _model_router = ModelRouter(get_llm_client(), fast, slo=LLM_LATENCY_SLO_SECONDS,
+                                    hedge_after=LLM_HEDGE_AFTER_SECONDS, fast_max_words=LLM_FAST_MAX_WORDS)
+    return _model_router
+
+
+SYSTEM_PROMPT = (
+    "You are the Caregiver Compassion Bot, a gentle, empathetic robotic companion "
+    "designed by BrainCharge to support family caregivers who face high stress and emotional fatigue. "
+    "Keep your replies conversational, brief, "
+    "and naturally worded so they sound good when spoken aloud. Avoid technical or robotic phrasing. "
+    "If the user seems stressed, respond with compassion and offer small words of comfort. "
+    "Keep responses under 3 sentences for natural conversation flow. "
+    "Use the conversation context below to provide personalized, relevant responses.\n"
+)
+
+_prefix_tracker = PrefixTracker()
+
+
+def build_prompt(user_input, context):
+    """Assemble the full LLM prompt for a user turn.
+
+    Layout is system instruction, summary, recent conversation, new input:
+    most stable first, so consecutive prompts share the longest prefix.
+    """
+    context_prompt = context.get_context_prompt(user_input)
+    return SYSTEM_PROMPT + context_prompt + f"\n\nUser: {user_input}\n\nAssistant:"
+
 
 def generate_response(user_input, context):
     """Generate response using Ollama with context"""
-    prompt_instruction = (
-        "You are the Caregiver Compassion Bot, a gentle, empathetic robotic companion "
-        "designed by BrainCharge to support family caregivers who face high stress and emotional fatigue. "
-        "Keep your replies conversational, brief, "
-        "and naturally worded so they sound good when spoken aloud. Avoid technical or robotic phrasing. "
-        "If the user seems stressed, respond with compassion and offer small words of comfort. "
-        "Keep responses under 3 sentences for natural conversation flow. "
-        "Use the conversation context below to provide personalized, relevant responses."
-    )
-    
-    context_prompt = context.get_context_prompt()
-    full_prompt = prompt_instruction + context_prompt + f"\n\nUser: {user_input}\n\nAssistant:"
+    full_prompt = build_prompt(user_input, context)
+    reuse = _prefix_tracker.observe(full_prompt)
     
     try:
-        result = subprocess.run(
-            ["ollama", "run", "gemma3:4b", full_prompt],
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            timeout=30
-        )
-        return result.stdout.strip()
-    except subprocess.TimeoutExpired:
+        with metrics.span("llm", prompt_tokens=reuse["prompt_tokens"], reused_tokens=reuse["reused_tokens"],
+                          context_tokens=context.last_context_report["total"]):
+            response, stats = get_model_router().generate(full_prompt, user_input, timeout=30)
+        print(f"   (LLM: {format_route(get_model_router().last_route)}; {format_stats(stats)}; "
+              f"{format_reuse(reuse)}; {format_budget(context.last_context_report)})")
+        return response.strip()
+    except TimeoutError:
+        metrics.incr("timeouts", kind="llm")
         return "I apologize, I'm having trouble responding right now."
     except Exception as e:
         print(f"Error generating response: {e}")
+        metrics.incr("fallbacks", kind="llm_error")
         return "I'm sorry, I encountered an error."
 
+
+def stream_response(user_input, context, barge_in=None, speech=None):
+    """Stream the response from Ollama and speak each sentence as soon as it's complete.
+
+    If the `barge_in` monitor fires, generation is cancelled and only the
+    part of the reply that was actually spoken is returned. Pass an unstarted
+    `speech` pipeline to inspect afterwards whether playback was cut off.
+    """
+    full_prompt = build_prompt(user_input, context)
+    reuse = _prefix_tracker.observe(full_prompt)
+    splitter = SentenceSplitter()
+    if speech is None:
+        speech = SpeechPipeline(speak_response)
+    speech.start()
+    pieces = []
+
+    try:
+        with metrics.span("llm", prompt_tokens=reuse["prompt_tokens"], reused_tokens=reuse["reused_tokens"],
+                          context_tokens=context.last_context_report["total"]):
+            stream = get_model_router().stream(full_prompt, user_input, timeout=30)
+            try:
+                for piece in stream:
+                    pieces.append(piece)
+                    for sentence in splitter.feed(piece):
+                        speech.say(sentence)
+                    if barge_in is not None and barge_in.triggered.is_set():
+                        break
+            finally:
+                stream.close()  # drops the connection if we stopped early
+        speech.say(splitter.flush())
+        ttfa = speech.time_to_first_audio()
+        metrics.observe("first_audio", ttfa)
+        ttfa_text = f", first audio after {ttfa * 1000:.0f} ms" if ttfa is not None else ""
+        router = get_model_router()
+        print(f"   (LLM: {format_route(router.last_route)}; {format_stats(router.last_stats)}{ttfa_text}; "
+              f"{format_reuse(reuse)}; {format_budget(context.last_context_report)})")
+    except TimeoutError:
+        metrics.incr("timeouts", kind="llm")
+        if pieces:
+            speech.say(splitter.flush())
+        else:
+            pieces = ["I apologize, I'm having trouble responding right now."]
+            speech.say(pieces[0])
+    except Exception as e:
+        print(f"Error generating response: {e}")
+        metrics.incr("fallbacks", kind="llm_error")
+        if pieces:
+            speech.say(splitter.flush())
+        else:
+            pieces = ["I'm sorry, I encountered an error."]
+            speech.say(pieces[0])
+    finally:
+        speech.finish()
+
+    if speech.interrupted is not None:
+        return speech.spoken_text()
+    return "".join(pieces).strip()
+
+
+# Fixed lines, synthesized once and played from the cache
+GREETING = "Yes, I'm here. How can I help you?"
+DIDNT_HEAR = "I didn't hear you clearly. Could you repeat that?"
+DIDNT_CATCH = "I didn't catch that. Please say that again."
+FAREWELL = "Goodbye! I'll be here when you need me. Just say the wake word to talk again."
+SHUTDOWN = "Goodbye, take care!"
+FIXED_PHRASES = [GREETING, DIDNT_HEAR, DIDNT_CATCH, FAREWELL, SHUTDOWN]
+
+_tts = None
+
+
+def get_tts():
+    """Get the shared text-to-speech engine, created on first use"""
+    global _tts
+    if _tts is None:
+        backend = create_backend(TTS_ENGINE, PIPER_MODEL, PIPER_PATH)
+        _tts = TextToSpeech(backend, AudioCache(TTS_CACHE_DIR, TTS_CACHE_ITEMS), dump_dir=DEBUG_DUMP_DIR)
+    return _tts
+
+
 def speak_response(text):
-    """Speak the response using eSpeak"""
+    """Speak the response with the configured TTS engine. Returns False if stop_speaking() cut it off."""
     try:
-        subprocess.run(["espeak", text], check=True, capture_output=True)
+        with metrics.span("tts", chars=len(text)):
+            return get_tts().speak(text)
     except Exception as e:
         print(f"Error speaking response: {e}")
+        return True
+
+
+def stop_speaking():
+    """Stop the current speech at once; further speak_response() calls are skipped until resumed"""
+    get_tts().stop()
+
+
+def start_barge_in_monitor():
+    """Start watching the microphone for the user talking over the reply (None if unavailable)"""
+    if not BARGE_IN or not HAVE_VAD:
+        return None
+    capture = get_audio_capture()
+    if capture is None:
+        return None
+    tts = get_tts()
+    tts.resume()
+    monitor = BargeInMonitor(capture, on_speech=stop_speaking, margin_db=BARGE_IN_MARGIN_DB)
+    monitor.start()
+    # Calibrate on the bot's voice once it plays, not on the room during generation
+    tts.on_playback = monitor.playback_started
+    return monitor
+
+
+def stop_barge_in_monitor(monitor):
+    tts = get_tts()
+    tts.on_playback = None
+    if monitor is not None:
+        monitor.stop()
+    tts.resume()
+
+def warm_up(context):
+    """Load Whisper, the LLM and TTS in parallel, in the background.
+
+    The LLM gets a one-token request with the stable prompt prefix (system
+    instruction + summary), so the model is loaded and that prefix is
+    already in its cache when the first turn arrives. The bot listens for
+    the wake word meanwhile; a report is printed when everything is warm.
+    """
+    def llm():
+        prompt = SYSTEM_PROMPT + context.render_summary(CONTEXT_TOKEN_BUDGET)[0]
+        _prefix_tracker.observe(prompt)
+        get_model_router().preload(prompt)
+
+    tasks = {
+        "whisper": get_transcriber().warm_up,
+        "llm": llm,
+        "tts": lambda: get_tts().prewarm(FIXED_PHRASES).join(),
+    }
+
+    def timed(task):
+        start = time.monotonic()
+        try:
+            task()
+            return time.monotonic() - start, None
+        except Exception as e:
+            return time.monotonic() - start, e
+
+    def run():
+        with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="warm-up") as pool:
+            futures = {name: pool.submit(timed, task) for name, task in tasks.items()}
+            results = {name: future.result() for name, future in futures.items()}
+        ready = time.monotonic() - LAUNCH_TIME
+        metrics.observe("startup", ready)
+        parts = []
+        for name, (seconds, error) in results.items():
+            parts.append(f"{name} {seconds:.1f}s" + (" failed" if error else ""))
+            if error:
+                print(f" Could not warm up {name}: {error}")
+        print(f"\n Warm-up done: ready for fast responses {ready:.1f}s after launch ({', '.join(parts)})")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def load_wake_word_spotter():
+    """Load the keyword spotter if numpy is available and templates are enrolled"""
+    if not HAVE_VAD:
+        return None
+    try:
+        return KeywordSpotter.from_directory(WAKE_WORD_TEMPLATES, WAKE_WORD_THRESHOLD)
+    except Exception as e:
+        print(f"Could not load wake-word templates: {e}")
+        return None
+
+
+def listen_window(detector):
+    """Record the next wake-word window.
+
+    With the keyword spotter (`detector`, a SlidingWindowDetector) windows
+    overlap by LISTEN_DURATION - WAKE_HOP_SECONDS; without it they are
+    back-to-back, as each one goes to Whisper. Returns the window's PCM, or
+    None if nothing needs transcribing: recording failed, or the spotter
+    didn't fire on this window.
+    """
+    capture = get_audio_capture() if detector is not None else None
+    if capture is None:
+        metrics.incr("wake_checks")  # every window goes to Whisper
+        return record_audio(LISTEN_DURATION, continuous=True)
+
+    pcm = detector.read(capture)
+    if pcm is None:
+        return None
+    metrics.incr("wake_checks")
+    with metrics.span("wake_check"):
+        detected = detector.check(pcm)
+    if not detected:
+        return None
+    metrics.incr("wake_spotter_hits")
+    # Spotter fired; Whisper confirms before waking up
+    return pcm
+
 
 def check_for_wake_word(text):
     """Check if wake word is in transcribed text"""
@@ -362,25 +957,37 @@ def check_for_sleep_word(text):
     """Check if sleep word is in transcribed text"""
     return SLEEP_WORD in text.lower()
 
-def continuous_conversation(context):
-    """Handle continuous back-and-forth conversation until sleep word"""
+def continuous_conversation(context, summaries=None):
+    """Handle continuous back-and-forth conversation until sleep word.
+
+    `summaries` is the SummaryWorker that updates the summary afterwards;
+    without one the summary is generated before returning.
+    """
     print("\n Starting conversation mode...")
-    speak_response("Yes, I'm here. How can I help you?")
+    context.start_session()
+    speak_response(GREETING)
     
     conversation_active = True
+    barge_in = None  # monitor of the last reply, if the user cut in on it
     
     while conversation_active:
-        print("\n Listening for your message...")
-        
+        metrics.report_toggle()
+        if barge_in is None:
+            print("\n Listening for your message...")
+        metrics.start_turn()
         
-        if not record_audio(CONVERSATION_DURATION, TEMP_AUDIO):
-            speak_response("I didn't hear you clearly. Could you repeat that?")
+        utterance = record_utterance(barge_in)
+        barge_in = None
+        if not utterance:
+            speak_response(DIDNT_HEAR)
+            metrics.end_turn(outcome="no_speech")
             continue
         
         
-        user_input = transcribe_audio(TEMP_AUDIO)
+        user_input = transcribe_audio(utterance)
         if not user_input:
-            speak_response("I didn't catch that. Please say that again.")
+            speak_response(DIDNT_CATCH)
+            metrics.end_turn(outcome="empty_transcript")
             continue
         
         print(f"You said: {user_input}")
@@ -389,26 +996,57 @@ def continuous_conversation(context):
         if check_for_sleep_word(user_input):
             print(f"\n Sleep word '{SLEEP_WORD}' detected!")
 
-            print("\n Generating final conversation summary before sleep...")
-            context.generate_summary()
-
-            farewell_message = "Goodbye! I'll be here when you need me. Just say the wake word to talk again."
-            print(f"Assistant: {farewell_message}\n")
-            speak_response(farewell_message)
+            if summaries is not None:
+                summaries.request()  # summarized in the background, so the farewell plays now
+            print(f"Assistant: {FAREWELL}\n")
+            speak_response(FAREWELL)
+            if summaries is None:
+                with metrics.span("summary"):
+                    context.generate_summary()
+            metrics.end_turn(outcome="sleep")
             conversation_active = False
             break
         
         
-        response = generate_response(user_input, context)
-        print(f"Assistant: {response}\n")
-        
-       
-        context.add_exchange(user_input, response)
+        prosody = None
+        if context.prosody is not None:
+            with metrics.span("prosody"):
+                prosody = analyze_prosody(utterance)
+            context.prosody.add(prosody)
+            print(f" (voice: {format_features(prosody)})")
         
+        monitor = start_barge_in_monitor()
+        speech = SpeechPipeline(speak_response)
+        try:
+            if STREAM_RESPONSES:
+                # Sentences are spoken while the rest of the reply is still generating
+                response = stream_response(user_input, context, monitor, speech)
+            else:
+                response = generate_response(user_input, context)
+                speech.start()
+                speech.say(response)
+                speech.finish()
+                if speech.interrupted is not None:
+                    response = speech.spoken_text()
+        finally:
+            stop_barge_in_monitor(monitor)
+        # Speech after the reply finished playing is just the next turn, not a barge-in
+        truncated = monitor is not None and speech.interrupted is not None
+        print(f"Assistant: {response}\n")
         
-        speak_response(response)
+        with metrics.span("persist"):
+            context.add_exchange(user_input, response, truncated=truncated, prosody=prosody)
         
+        if truncated:
+            # Straight back to listening: the user is already talking
+            print(f" (interrupted - stopped speaking {monitor.stop_latency * 1000:.0f} ms after you started)")
+            metrics.incr("barge_ins")
+            metrics.observe("barge_in_stop", monitor.stop_latency)
+            metrics.end_turn(outcome="barge_in", llm_route=get_model_router().last_route)
+            barge_in = monitor
+            continue
         
+        metrics.end_turn(outcome="reply", llm_route=get_model_router().last_route)
         time.sleep(0.5)
 
 def main():
@@ -420,6 +1058,12 @@ def main():
     
     
     context = ConversationContext(CONTEXT_FILE, SUMMARY_FILE)
+
+    metrics.configure(METRICS_TRACE_FILE, METRICS_PROMETHEUS_FILE)
+    if not METRICS_ENABLED:
+        metrics.disable()
+    if metrics.install_signal_toggle():
+        print(f" Metrics {'on' if metrics.enabled else 'off'} (kill -USR1 {os.getpid()} to toggle)")
     
     
     if context.history:
@@ -430,18 +1074,41 @@ def main():
             print(f"   - {len(context.summary['people'])} people tracked")
         if context.summary.get('topics'):
             print(f"   - Topics: {', '.join(context.summary['topics'][:3])}...")
+
+    models = OLLAMA_MODEL + (f" + {OLLAMA_FAST_MODEL}" if OLLAMA_FAST_MODEL else "")
+    print(f"\n Warming up Whisper, {models} (kept in memory for {OLLAMA_KEEP_ALIVE}) "
+          f"and {get_tts().backend.name} text-to-speech in the background...")
+    warm_up(context)
+    summaries = SummaryWorker(context, debounce=SUMMARY_DEBOUNCE_SECONDS).start()
+    if summaries.pending():
+        print(" A summary update left over from the last run will finish in the background")
     
+    spotter = load_wake_word_spotter()
+    if spotter is not None:
+        print(f" Wake-word spotter ready ({len(spotter.templates)} templates, threshold {spotter.threshold:.2f})")
+    else:
+        print(" No wake-word spotter (run 'python wake_word.py enroll'); using Whisper for every window")
+    detector = SlidingWindowDetector(spotter.detect, LISTEN_DURATION, WAKE_HOP_SECONDS) if spotter else None
+
+    announce = True
     try:
         while True:
-            print("\n Sleeping mode - Listening for wake word...")
+            metrics.report_toggle()
+            if announce or spotter is None:
+                print("\n Sleeping mode - Listening for wake word...")
+                announce = False
             
            
-            if not record_audio(LISTEN_DURATION, TEMP_AUDIO):
-                time.sleep(1)
+            window = listen_window(detector)
+            if not window:
+                metrics.maybe_export()
+                capture_running = _audio_capture is not None and _audio_capture.running
+                if spotter is None or not capture_running:
+                    time.sleep(1)
                 continue
             
            
-            transcription = transcribe_audio(TEMP_AUDIO)
+            transcription = transcribe_audio(window)
             
             if transcription:
                 print(f"Heard: {transcription}")
@@ -449,17 +1116,34 @@ def main():
                 
                 if check_for_wake_word(transcription):
                     print(f"\n Wake word detected! Entering conversation mode...\n")
-                    continuous_conversation(context)
+                    metrics.incr("wakes")
+                    summaries.postpone()
+                    continuous_conversation(context, summaries)
                    
                     print("\n Returning to sleep mode...")
-                    time.sleep(1)
-            
+                    announce = True
+                    if detector is not None:
+                        detector.reset()  # don't scan audio from the conversation
+                    if _audio_capture is None or not _audio_capture.running:
+                        time.sleep(1)
+                elif spotter is not None:
+                    print(f" (spotter score {spotter.last_score:.2f} was a false wake)")
+                    metrics.incr("false_wakes")
+                    detector.release()  # the next overlapping window may hold the whole word
+            elif spotter is not None:
+                metrics.incr("false_wakes")
+                detector.release()
             
-            time.sleep(0.5)
+            metrics.maybe_export()
+            # The capture buffer keeps recording, so only pause for one-shot recordings
+            if _audio_capture is None or not _audio_capture.running:
+                time.sleep(0.5)
     
     except KeyboardInterrupt:
+        summaries.stop()  # an unfinished summary request stays queued on disk
+        metrics.export()
         print("\n\nhutting down. Goodbye!")
-        speak_response("Goodbye, take care!")
+        speak_response(SHUTDOWN)
     except Exception as e:
         print(f"\n Error: {e}")
 
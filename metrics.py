@@ -0,0 +1,342 @@
+import bisect
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = "braincharge_"
+
+
+class Histogram:
+    """Cumulative bucket counts plus a rolling window of recent values for percentiles"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=500):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentile(self, pct):
+        """Nearest-rank percentile over the rolling window"""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+        return ordered[min(rank, len(ordered)) - 1]
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "turn", "attrs", "start", "wall")
+
+    def __init__(self, metrics, name, turn, attrs):
+        self.metrics = metrics
+        self.name = name
+        self.turn = turn
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.metrics._finish_span(self, duration)
+        return False
+
+
+class _NullSpan:
+    """Returned while metrics are disabled, so an instrumented block costs one call"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Metrics:
+    """Per-turn spans, latency histograms and event counters.
+
+    Each pipeline stage runs inside span(), which times it, adds it to the
+    stage's histogram and appends one JSON line (tagged with the current
+    turn ID) to a size-rotated trace file. Counters and histograms are
+    periodically written to a Prometheus text file (node_exporter textfile
+    format) for a local scraper. Everything can be switched off at runtime;
+    a disabled span is a shared no-op object.
+    """
+
+    def __init__(self, enabled=True, trace_file=None, prometheus_file=None,
+                 trace_max_bytes=5 * 1024 * 1024, trace_backups=3, export_interval=10.0):
+        self.enabled = enabled
+        self.toggled = False  # flipped by a signal, not yet reported
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.turn_id = None
+        self.turn_started = None
+        self.turn_wall = None
+        self.turn_stages = {}
+        self.prometheus_file = None
+        self.export_interval = export_interval
+        self.last_export = 0.0
+        self.trace = None
+        self.configure(trace_file, prometheus_file, trace_max_bytes, trace_backups)
+
+    def configure(self, trace_file=None, prometheus_file=None,
+                  trace_max_bytes=5 * 1024 * 1024, trace_backups=3):
+        """Set (or change) where traces and the Prometheus file are written"""
+        if self.trace is not None:
+            for handler in list(self.trace.handlers):
+                self.trace.removeHandler(handler)
+                handler.close()
+            self.trace = None
+        if trace_file:
+            os.makedirs(os.path.dirname(trace_file) or ".", exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                trace_file, maxBytes=trace_max_bytes, backupCount=trace_backups, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.trace = logging.getLogger(f"braincharge.trace.{id(self)}")
+            self.trace.setLevel(logging.INFO)
+            self.trace.propagate = False
+            self.trace.addHandler(handler)
+        if prometheus_file:
+            os.makedirs(os.path.dirname(prometheus_file) or ".", exist_ok=True)
+        self.prometheus_file = prometheus_file
+
+    # ---- runtime switch ------------------------------------------------
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def install_signal_toggle(self):
+        """Flip metrics on/off with `kill -USR1 <pid>` (POSIX, main thread only).
+
+        The handler only flips flags; report_toggle() prints the change from
+        the main loop, so it can't land in the middle of other console output.
+        """
+        if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+            return False
+
+        def handle(signum, frame):
+            self.toggle()
+            self.toggled = True
+
+        signal.signal(signal.SIGUSR1, handle)
+        return True
+
+    def report_toggle(self):
+        """Print a pending signal toggle, once"""
+        if self.toggled:
+            self.toggled = False
+            print(f" Metrics {'enabled' if self.enabled else 'disabled'}")
+
+    # ---- recording -----------------------------------------------------
+
+    def start_turn(self):
+        """Begin a new conversation turn; spans until end_turn() carry its ID"""
+        if not self.enabled:
+            return None
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.turn_started = time.perf_counter()
+        self.turn_wall = time.time()
+        self.turn_stages = {}
+        return self.turn_id
+
+    def end_turn(self, **attrs):
+        """Close the current turn: record its total latency and a per-stage breakdown"""
+        turn_id, started = self.turn_id, self.turn_started
+        self.turn_id = None
+        self.turn_started = None
+        if not self.enabled or started is None:
+            return
+        duration = time.perf_counter() - started
+        with self.lock:
+            self._histogram("turn").observe(duration)
+            stages = {name: round(ms, 2) for name, ms in self.turn_stages.items()}
+        self.incr("turns")
+        self._write_trace({"ts": self.turn_wall, "turn": turn_id, "event": "turn",
+                           "ms": round(duration * 1000, 2), "stages": stages, **attrs})
+        self.maybe_export()
+
+    def span(self, name, turn=None, **attrs):
+        """Context manager timing one stage, e.g. `with metrics.span("transcribe"):`"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, turn or self.turn_id, attrs)
+
+    def _finish_span(self, span, duration):
+        with self.lock:
+            self._histogram(span.name).observe(duration)
+            if span.turn is not None and span.turn == self.turn_id:
+                self.turn_stages[span.name] = self.turn_stages.get(span.name, 0.0) + duration * 1000
+        self._write_trace({"ts": span.wall, "turn": span.turn, "span": span.name,
+                           "ms": round(duration * 1000, 2), **span.attrs})
+
+    def observe(self, name, seconds):
+        """Add a latency measured elsewhere (e.g. time to first audio) to a histogram"""
+        if not self.enabled or seconds is None:
+            return
+        with self.lock:
+            self._histogram(name).observe(seconds)
+
+    def incr(self, name, amount=1, **labels):
+        """Count an event, e.g. incr("fallbacks", kind="whisper_cli")"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def _histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def _write_trace(self, record):
+        if self.trace is not None:
+            self.trace.info(json.dumps(record, default=str))
+
+    # ---- export --------------------------------------------------------
+
+    def snapshot(self):
+        """Counters and per-stage p50/p95/p99 (ms) over the rolling window"""
+        with self.lock:
+            stages = {
+                name: {
+                    "count": h.count,
+                    **{f"p{p}_ms": round(h.percentile(p) * 1000, 2) for p in (50, 95, 99) if h.recent},
+                }
+                for name, h in self.histograms.items()
+            }
+            counters = {name + _label_text(labels): value for (name, labels), value in self.counters.items()}
+        return {"enabled": self.enabled, "stages": stages, "counters": counters}
+
+    def prometheus_text(self):
+        lines = [
+            f"# HELP {PREFIX}metrics_enabled Whether instrumentation is currently on",
+            f"# TYPE {PREFIX}metrics_enabled gauge",
+            f"{PREFIX}metrics_enabled {int(self.enabled)}",
+        ]
+        with self.lock:
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f"# TYPE {PREFIX}{name}_total counter")
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f"{PREFIX}{name}_total{_label_text(labels)} {value}")
+
+            metric = f"{PREFIX}stage_seconds"
+            lines.append(f"# HELP {metric} Latency of each pipeline stage")
+            lines.append(f"# TYPE {metric} histogram")
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(h.buckets + ("+Inf",), h.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {h.count}')
+
+            metric = f"{PREFIX}stage_recent_seconds"
+            lines.append(f"# HELP {metric} Stage latency percentiles over the last {Histogram().recent.maxlen} samples")
+            lines.append(f"# TYPE {metric} gauge")
+            for stage, h in sorted(self.histograms.items()):
+                for pct in (50, 95, 99):
+                    value = h.percentile(pct)
+                    if value is not None:
+                        lines.append(f'{metric}{{stage="{stage}",quantile="{pct / 100}"}} {value:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Write the Prometheus text file (atomically, so a scraper never sees half of it)"""
+        self.last_export = time.monotonic()
+        if not self.prometheus_file:
+            return
+        tmp = self.prometheus_file + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp, self.prometheus_file)
+        except OSError as e:
+            print(f"Could not write metrics to {self.prometheus_file}: {e}")
+
+    def maybe_export(self):
+        """export() at most once per export_interval; cheap enough to call every loop"""
+        if self.enabled and time.monotonic() - self.last_export >= self.export_interval:
+            self.export()
+
+
+# Shared instance used by the pipeline; main.py configures its output files
+metrics = Metrics()
+
+
+def slowest_turns(trace_file, count=10):
+    """The slowest turns recorded in a trace file (and its rotated backups)"""
+    turns = []
+    for path in sorted(glob.glob(trace_file + "*")):
+        if path.endswith(".tmp"):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("event") == "turn":
+                    turns.append(record)
+    return sorted(turns, key=lambda r: r["ms"], reverse=True)[:count]
+
+
+def main():
+    trace_file = sys.argv[1] if len(sys.argv) > 1 else "metrics/trace.jsonl"
+    turns = slowest_turns(trace_file)
+    if not turns:
+        print(f"No turns recorded in {trace_file}")
+        return
+    print(f"Slowest turns in {trace_file}:")
+    for turn in turns:
+        stages = ", ".join(f"{name} {ms:.0f}" for name, ms in
+                           sorted(turn.get("stages", {}).items(), key=lambda item: -item[1]))
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(turn["ts"]))
+        print(f"  {started}  turn {turn['turn']}  {turn['ms']:8.0f} ms  ({stages})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+from ollama_client import OllamaError
+
+
+PRIMARY = "primary"
+FAST = "fast"
+
+
+class _Leg(threading.Thread):
+    """One streaming request to one model, reporting (leg, kind, value) events to a queue"""
+
+    def __init__(self, name, client, prompt, timeout, options, events):
+        super().__init__(name=f"llm-{name}", daemon=True)
+        self.route = name
+        self.client = client
+        self.prompt = prompt
+        self.timeout = timeout
+        self.options = options
+        self.events = events
+        self.started = time.perf_counter()
+        self.first_token = None  # seconds from start, set by the router
+        self.cancelled = threading.Event()
+        self.conn = None
+
+    def _connected(self, conn):
+        if self.cancelled.is_set():
+            raise OllamaError("request cancelled")
+        self.conn = conn
+
+    def run(self):
+        stream = self.client.generate_stream(self.prompt, self.timeout, self.options,
+                                             on_connection=self._connected)
+        try:
+            for piece in stream:
+                if self.cancelled.is_set():
+                    return
+                self.events.put((self, "piece", piece))
+            if not self.cancelled.is_set():
+                self.events.put((self, "done", dict(self.client.last_stats)))
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self.events.put((self, "error", e))
+        finally:
+            stream.close()
+
+    def cancel(self):
+        """Stop the request, even while it is still waiting for its first token"""
+        self.cancelled.set()
+        conn = self.conn
+        sock = conn.sock if conn is not None else None
+        if sock is not None:
+            try:
+                # Unblocks the reader; Ollama drops the request when the client goes away
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class ModelRouter:
+    """Chooses the model for each turn and hedges against a slow one.
+
+    Short inputs (up to `fast_max_words` words) go straight to the fast
+    model. Everything else goes to the primary model; if it has produced no
+    token `hedge_after` seconds in, or fails before its first token, the
+    same prompt goes to the fast model as well and whichever answers first
+    is used. The other request is cancelled. Without a fast model every
+    turn simply goes to the primary.
+
+    The route taken is in `last_route` after each request, and counted in
+    metrics against the `slo`: seconds to the first token when streaming,
+    to the whole reply otherwise.
+    """
+
+    def __init__(self, primary, fast=None, slo=3.0, hedge_after=1.5, fast_max_words=4):
+        self.clients = {PRIMARY: primary}
+        if fast is not None:
+            self.clients[FAST] = fast
+        self.slo = slo
+        self.hedge_after = hedge_after
+        self.fast_max_words = fast_max_words
+        self.last_route = {}
+        self.last_stats = {}
+
+    def choose(self, user_input):
+        """Route for `user_input`: FAST for short, simple turns when a fast model is set"""
+        if FAST in self.clients and user_input and len(user_input.split()) <= self.fast_max_words:
+            return FAST
+        return PRIMARY
+
+    def stream(self, prompt, user_input, timeout=30, options=None):
+        """Yield reply pieces; the first model to produce a token wins"""
+        return self._race(prompt, user_input, timeout, options, commit_on="piece")
+
+    def generate(self, prompt, user_input, timeout=30, options=None):
+        """Return (text, stats); the first model to finish its reply wins"""
+        text = "".join(self._race(prompt, user_input, timeout, options, commit_on="done"))
+        return text, self.last_stats
+
+    def _race(self, prompt, user_input, timeout, options, commit_on):
+        route = self.choose(user_input)
+        started = time.perf_counter()
+        events = queue.Queue()
+        legs = []
+        buffered = {}
+        winner = None
+        answering = False  # some model has produced a token
+        hedge = None  # why the second model was asked: "slow" or "failed"
+        finished = False
+        self.last_route = {"route": route, "winner": None}
+
+        def launch(name):
+            leg = _Leg(name, self.clients[name], prompt, timeout, options, events)
+            legs.append(leg)
+            buffered[leg] = []
+            leg.start()
+
+        def untried():
+            return next((name for name in self.clients if name not in [leg.route for leg in legs]), None)
+
+        launch(route)
+        try:
+            while True:
+                wait = None
+                if not answering and hedge is None and route == PRIMARY and untried():
+                    wait = max(0.0, self.hedge_after - (time.perf_counter() - started))
+                try:
+                    leg, kind, value = events.get(timeout=wait)
+                except queue.Empty:
+                    hedge = "slow"
+                    launch(untried())
+                    continue
+
+                if winner is not None and leg is not winner:
+                    continue
+                if kind == "error":
+                    leg.cancel()
+                    if winner is leg:
+                        raise value
+                    if hedge is None and untried():
+                        hedge = "failed"
+                        launch(untried())
+                    if all(other.cancelled.is_set() for other in legs):
+                        raise value
+                    continue
+
+                if kind == "piece":
+                    answering = True
+                    if leg.first_token is None:
+                        leg.first_token = time.perf_counter() - leg.started
+                        metrics.observe(f"llm_first_token_{leg.route}", leg.first_token)
+                    buffered[leg].append(value)
+                if winner is None and kind == commit_on:
+                    winner = leg
+                    for other in legs:
+                        if other is not leg:
+                            other.cancel()
+                    self._record(route, hedge, leg, time.perf_counter() - started)
+                if winner is leg:
+                    pieces, buffered[leg] = buffered[leg], []
+                    yield from pieces
+                    if kind == "done":
+                        self.last_stats = value
+                        finished = True
+                        return
+        finally:
+            for leg in legs:
+                leg.cancel()
+            if not finished:
+                self.last_stats = {}  # closed early or failed: no stats, rather than the last turn's
+
+    def _record(self, route, hedge, winner, latency):
+        met = latency <= self.slo
+        self.last_route = {
+            "route": route,
+            "model": winner.client.model,
+            "winner": winner.route,
+            "hedged": hedge,
+            "latency_ms": round(latency * 1000, 1),
+            "slo_met": met,
+        }
+        metrics.incr("llm_route", route=route, winner=winner.route)
+        metrics.incr("llm_slo", result="met" if met else "missed")
+        if hedge:
+            metrics.incr("llm_hedges", reason=hedge, winner=winner.route)
+
+    def preload(self, prompt, timeout=120):
+        """Load every model at once, with the stable prompt prefix already in its cache"""
+        def load(client):
+            client.generate(prompt, timeout=timeout, options={"num_predict": 1})
+
+        with ThreadPoolExecutor(len(self.clients), thread_name_prefix="llm-preload") as pool:
+            list(pool.map(load, self.clients.values()))
+
+    def close(self):
+        for client in self.clients.values():
+            client.close()
+
+
+def format_route(route):
+    """One-line summary of which model answered a turn"""
+    if not route.get("winner"):
+        return "no model answered"
+    text = f"{route['winner']} {route['model']} in {route['latency_ms']:.0f} ms"
+    if route["hedged"]:
+        text += f" (hedged: {route['route']} {route['hedged']})"
+    elif route["route"] == FAST:
+        text += " (short input)"
+    if not route["slo_met"]:
+        text += ", over SLO"
+    return text
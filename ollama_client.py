@@ -0,0 +1,210 @@
+import http.client
+import json
+import os
+import queue
+import threading
+from urllib.parse import urlsplit
+
+
+DEFAULT_HOST = "http://127.0.0.1:11434"
+
+
+class OllamaError(Exception):
+    """Raised when the Ollama API returns an error or can't be reached"""
+
+
+def _ns_to_ms(value):
+    return round((value or 0) / 1_000_000, 1)
+
+
+class OllamaClient:
+    """Small pooled HTTP client for the local Ollama API.
+
+    Connections are kept alive and reused between turns instead of starting
+    an `ollama run` process each time, and every request asks Ollama to keep
+    the model resident for `keep_alive` so it isn't evicted between
+    conversations.
+    """
+
+    def __init__(self, model, host=None, keep_alive="30m", pool_size=2, timeout=30):
+        host = host or os.getenv("OLLAMA_HOST") or DEFAULT_HOST
+        if "://" not in host:
+            host = "http://" + host
+        url = urlsplit(host)
+        self.model = model
+        self.host = url.hostname or "127.0.0.1"
+        self.port = url.port or 11434
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        self.last_stats = {}
+        self.stats_lock = threading.Lock()
+
+    def _acquire(self, timeout):
+        try:
+            conn = self.pool.get_nowait()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=timeout), False
+
+    def _release(self, conn):
+        try:
+            self.pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _post(self, path, payload, timeout=None, on_connection=None):
+        """POST JSON and return the open response plus its connection.
+
+        `on_connection` sees each connection before the request is sent; it
+        may raise to abandon the request.
+        """
+        timeout = timeout or self.timeout
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+
+        for attempt in range(2):
+            conn, reused = self._acquire(timeout)
+            if on_connection is not None:
+                try:
+                    on_connection(conn)
+                except Exception:
+                    conn.close()
+                    raise
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                # A pooled socket may have been closed by the server; retry on a fresh one
+                if reused and attempt == 0:
+                    continue
+                raise OllamaError(f"Ollama closed the connection at {self.host}:{self.port}")
+            except TimeoutError:
+                conn.close()
+                raise
+            except OSError as e:
+                conn.close()
+                raise OllamaError(f"Could not reach Ollama at {self.host}:{self.port}: {e}")
+
+            if response.status != 200:
+                detail = response.read().decode("utf-8", errors="replace")
+                self._release(conn)
+                raise OllamaError(f"Ollama returned HTTP {response.status}: {detail[:200]}")
+            return response, conn
+        raise OllamaError("Ollama request failed")
+
+    def _record_stats(self, data):
+        stats = {
+            "load_ms": _ns_to_ms(data.get("load_duration")),
+            "prefill_ms": _ns_to_ms(data.get("prompt_eval_duration")),
+            "eval_ms": _ns_to_ms(data.get("eval_duration")),
+            "total_ms": _ns_to_ms(data.get("total_duration")),
+            "prompt_tokens": data.get("prompt_eval_count", 0),
+            "eval_tokens": data.get("eval_count", 0),
+        }
+        with self.stats_lock:
+            self.last_stats = stats
+        return stats
+
+    def generate(self, prompt, timeout=None, options=None):
+        """Run a completion and return (text, stats)"""
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+
+        response, conn = self._post("/api/generate", payload, timeout)
+        try:
+            data = json.loads(response.read().decode("utf-8", errors="replace"))
+        except TimeoutError:
+            conn.close()
+            raise
+        except (OSError, ValueError) as e:
+            conn.close()
+            raise OllamaError(f"Bad response from Ollama: {e}")
+        self._release(conn)
+
+        if "error" in data:
+            raise OllamaError(data["error"])
+        return data.get("response", ""), self._record_stats(data)
+
+    def generate_stream(self, prompt, timeout=None, options=None, on_connection=None):
+        """Yield response text pieces as Ollama produces them.
+
+        `timeout` applies to each read, so it bounds time-to-first-token and
+        stalls between tokens rather than the whole generation. Stats are in
+        `last_stats` once the stream is exhausted. `on_connection` is called
+        with the open connection, so another thread can shut its socket to
+        cancel the request even while it waits for the first token.
+        """
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+
+        response, conn = self._post("/api/generate", payload, timeout, on_connection)
+        finished = False
+        try:
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line.decode("utf-8", errors="replace"))
+                except ValueError as e:
+                    raise OllamaError(f"Bad stream chunk from Ollama: {e}")
+                if "error" in data:
+                    raise OllamaError(data["error"])
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    self._record_stats(data)
+                    finished = True
+                    break
+        finally:
+            if finished:
+                # Drain the chunked terminator so the socket can be reused
+                response.read()
+                self._release(conn)
+            else:
+                # Cancelled or failed mid-stream; the socket is in an unknown state
+                conn.close()
+
+    def preload(self, timeout=120):
+        """Load the model into memory and pin it for keep_alive"""
+        payload = {"model": self.model, "keep_alive": self.keep_alive}
+        response, conn = self._post("/api/generate", payload, timeout)
+        response.read()
+        self._release(conn)
+
+    def close(self):
+        """Close all pooled connections"""
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def format_stats(stats):
+    """One-line summary of an Ollama request's timings"""
+    return (
+        f"load {stats.get('load_ms', 0):.0f} ms, "
+        f"prefill {stats.get('prefill_ms', 0):.0f} ms ({stats.get('prompt_tokens', 0)} tok), "
+        f"eval {stats.get('eval_ms', 0):.0f} ms ({stats.get('eval_tokens', 0)} tok)"
+    )
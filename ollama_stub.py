@@ -0,0 +1,195 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_REPLY = "That sounds like a lot to carry. I'm here with you, and we can take it one step at a time."
+# Summary prompts ask for JSON in main.SUMMARY_FORMAT
+SUMMARY_MARKER = "Respond ONLY with valid JSON"
+SUMMARY_REPLY = json.dumps({
+    "people": [{"name": "Mom", "relationship": "mother", "context": "Being cared for at home"}],
+    "dates": [],
+    "topics": ["caregiving", "tiredness"],
+    "emotional_patterns": "Tired but coping.",
+    "action_items": [],
+    "summary": "A caregiver looking after their mother.",
+})
+
+
+class StubOllamaServer:
+    """Stand-in for the Ollama HTTP API, for tests and benchmarks.
+
+    Answers /api/generate with a canned reply at a configurable token rate
+    and reports the same duration fields the real server does. Summary
+    prompts get a canned summary JSON instead.
+    """
+
+    def __init__(self, reply=DEFAULT_REPLY, tokens_per_second=40.0, load_delay=0.0,
+                 prefill_delay=0.0, host="127.0.0.1", port=0, summary_reply=SUMMARY_REPLY):
+        self.reply = reply
+        self.summary_reply = summary_reply
+        self.tokens_per_second = tokens_per_second
+        self.load_delay = load_delay
+        self.prefill_delay = prefill_delay
+        self.requests = []
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread and return the base URL"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reply_for(self, payload):
+        """Reply text for a request; override or replace for custom behaviour"""
+        if SUMMARY_MARKER in (payload.get("prompt") or ""):
+            return self.summary_reply
+        return self.reply
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, data, status=200):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": [{"name": "stub"}]})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json({"error": "invalid JSON"}, 400)
+                    return
+                if self.path != "/api/generate":
+                    self._send_json({"error": "not found"}, 404)
+                    return
+                with stub.lock:
+                    stub.requests.append(payload)
+                stub._generate(self, payload)
+
+        return Handler
+
+    def _generate(self, handler, payload):
+        start = time.perf_counter()
+        load_ns = 0
+        with self.lock:
+            needs_load = not self.loaded
+            self.loaded = True
+        if needs_load and self.load_delay:
+            time.sleep(self.load_delay)
+            load_ns = int(self.load_delay * 1e9)
+
+        prompt = payload.get("prompt")
+        if not prompt:
+            # Bare model load request
+            handler._send_json({"model": payload.get("model"), "response": "", "done": True,
+                                "load_duration": load_ns})
+            return
+
+        time.sleep(self.prefill_delay)
+        prompt_tokens = max(1, len(prompt) // 4)
+        reply = self.reply_for(payload)
+        tokens = _split_tokens(reply)
+        num_predict = (payload.get("options") or {}).get("num_predict")
+        if num_predict:
+            tokens = tokens[:num_predict]
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        eval_start = time.perf_counter()
+
+        def final_fields():
+            now = time.perf_counter()
+            return {
+                "model": payload.get("model"),
+                "done": True,
+                "total_duration": int((now - start) * 1e9),
+                "load_duration": load_ns,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(self.prefill_delay * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int((now - eval_start) * 1e9),
+            }
+
+        if not payload.get("stream", True):
+            time.sleep(delay * len(tokens))
+            data = final_fields()
+            data["response"] = "".join(tokens)
+            handler._send_json(data)
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send_chunk(data):
+            line = json.dumps(data).encode("utf-8") + b"\n"
+            handler.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            handler.wfile.flush()
+
+        try:
+            for token in tokens:
+                time.sleep(delay)
+                send_chunk({"model": payload.get("model"), "response": token, "done": False})
+            data = final_fields()
+            data["response"] = ""
+            send_chunk(data)
+            handler.wfile.write(b"0\r\n\r\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the stream
+            handler.close_connection = True
+
+
+def _split_tokens(text):
+    """Rough word-piece split so streaming looks like real token output"""
+    tokens = []
+    for i, word in enumerate(text.split(" ")):
+        tokens.append(word if i == 0 else " " + word)
+    return tokens
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 11435
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 40.0
+    server = StubOllamaServer(tokens_per_second=rate, port=port)
+    print(f"Stub Ollama listening on {server.url} ({rate} tokens/s)")
+    print(f"Point the bot at it with: OLLAMA_HOST={server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import queue
+import re
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from metrics import metrics
+from vad import frame_features
+
+
+def find_silences(pcm, sample_rate=16000, frame_ms=20, margin_db=8.0, min_silence=0.2):
+    """(start, end) seconds of pauses: runs of frames within `margin_db` of the quietest tenth"""
+    energy, _ = frame_features(pcm, sample_rate, frame_ms)
+    if not len(energy):
+        return []
+    quiet = energy < np.percentile(energy, 10) + margin_db
+    edges = np.diff(np.concatenate(([0], quiet.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    frame = frame_ms / 1000.0
+    long_enough = (ends - starts) * frame >= min_silence
+    return [(float(start * frame), float(end * frame)) for start, end in zip(starts[long_enough], ends[long_enough])]
+
+
+def plan_chunks(duration, silences, chunk_seconds=6.0, min_chunk=2.0, overlap=0.3):
+    """(start, end) seconds of each chunk, cut in the pause nearest every `chunk_seconds`.
+
+    Where there is no pause to cut in, the cut falls mid-speech; each chunk
+    reaches `overlap` seconds past its cuts so the word there is heard
+    whole by at least one side (stitch() drops the repeat).
+    """
+    cuts = []
+    position = 0.0
+    while duration - position > chunk_seconds + min_chunk:
+        target = position + chunk_seconds
+        latest = min(duration - min_chunk, target + chunk_seconds / 2)
+        pauses = [(start + end) / 2 for start, end in silences if position + min_chunk <= (start + end) / 2 <= latest]
+        cut = min(pauses, key=lambda middle: abs(middle - target)) if pauses else target
+        cuts.append(cut)
+        position = cut
+    bounds = [0.0] + cuts + [duration]
+    return [
+        (max(0.0, start - overlap), min(duration, end + overlap))
+        for start, end in zip(bounds, bounds[1:])
+    ]
+
+
+def _normalize(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def _seam_overlap(left, right, limit):
+    """How many leading words of `right` repeat the end of `left`"""
+    tail = [_normalize(word) for word in left[-limit:]]
+    head = [_normalize(word) for word in right[:limit]]
+    for count in range(min(len(tail), len(head)), 0, -1):
+        if tail[-count:] == head[:count]:
+            # A lone short word ("no no", "I I") is as likely to be real speech
+            if count > 1 or len(head[0]) >= 3:
+                return count
+    return 0
+
+
+def stitch(texts, max_overlap_words=8):
+    """Join chunk transcripts, dropping words repeated across each seam"""
+    words = []
+    for text in texts:
+        new = text.split()
+        if words and new:
+            new = new[_seam_overlap(words, new, max_overlap_words):]
+        words.extend(new)
+    return " ".join(words)
+
+
+class ParallelTranscriber:
+    """Transcribes long utterances in pieces on several Whisper engines at once.
+
+    Audio longer than `min_seconds` is split at pauses into chunks of about
+    `chunk_seconds` with a little overlap. Each chunk goes to whichever
+    engine is free, and the texts are stitched back together. Shorter audio
+    goes to one engine as before. Results have the same shape as
+    WhisperEngine.transcribe_pcm(), with segment times for the whole clip.
+    """
+
+    def __init__(self, engines, min_seconds=10.0, chunk_seconds=6.0, overlap=0.3):
+        self.all_engines = list(engines)
+        self.engines = queue.Queue()  # the idle ones
+        for engine in engines:
+            self.engines.put(engine)
+        self.workers = len(engines)
+        self.min_seconds = min_seconds
+        self.chunk_seconds = chunk_seconds
+        self.overlap = overlap
+        self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="whisper-chunk")
+
+    def _with_engine(self, task):
+        engine = self.engines.get()
+        try:
+            return task(engine)
+        finally:
+            self.engines.put(engine)
+
+    def warm_up(self):
+        """Start and warm every engine at once; True if all of them are ready"""
+        return all(list(self.pool.map(lambda engine: engine.warm_up(), self.all_engines)))
+
+    def transcribe_pcm(self, pcm, sample_rate=16000):
+        duration = len(pcm) / (2.0 * sample_rate)
+        if self.workers < 2 or duration < self.min_seconds:
+            return self._with_engine(lambda engine: engine.transcribe_pcm(pcm, sample_rate))
+
+        spans = plan_chunks(duration, find_silences(pcm, sample_rate), self.chunk_seconds, overlap=self.overlap)
+        metrics.incr("whisper_chunks", len(spans))
+
+        def transcribe_span(span):
+            start, end = (int(seconds * sample_rate) * 2 for seconds in span)
+            return self._with_engine(lambda engine: engine.transcribe_pcm(pcm[start:end], sample_rate))
+
+        results = list(self.pool.map(transcribe_span, spans))
+        segments = []
+        for (offset, _), result in zip(spans, results):
+            for segment in result["segments"]:
+                if segment.get("start") is not None:
+                    segment = dict(segment, start=segment["start"] + offset, end=segment["end"] + offset)
+                segments.append(segment)
+        probabilities = [result["no_speech_prob"] for result in results if result["no_speech_prob"] is not None]
+        return {
+            "text": stitch([result["text"] for result in results]),
+            "segments": segments,
+            "no_speech_prob": min(probabilities) if probabilities else None,
+            "chunks": len(spans),
+        }
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+        for engine in self.all_engines:
+            engine.stop()
+
+
+def create_engines(workers, port, cli_path, model, server_path=None, use_server=True, first=None,
+                   no_speech_threshold=None):
+    """`workers` Whisper engines splitting the host's cores; `first` (e.g. the bot's engine) is reused"""
+    from whisper_engine import WhisperEngine
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    engines = [first] if first is not None else []
+    while len(engines) < workers:
+        engines.append(WhisperEngine(
+            cli_path, model,
+            transcript_base=os.path.join(tempfile.gettempdir(), f"braincharge-chunk-{len(engines)}"),
+            server_path=server_path,
+            port=port + len(engines),
+            use_server=use_server,
+            threads=threads,
+            no_speech_threshold=no_speech_threshold,
+        ))
+    return engines
+
+
+def _clip(pcm, seconds, sample_rate=16000):
+    """The first `seconds` of `pcm`, looping the recording if it is shorter"""
+    size = int(seconds * sample_rate) * 2
+    repeats = -(-size // len(pcm))
+    return (pcm * repeats)[:size]
+
+
+def benchmark(single, parallel, pcm, lengths, runs):
+    """Median latency of the single-pass and chunked paths for each utterance length"""
+    rows = []
+    for seconds in lengths:
+        clip = _clip(pcm, seconds)
+        row = {"seconds": seconds}
+        for name, transcriber in (("single", single), ("parallel", parallel)):
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                transcriber.transcribe_pcm(clip)
+                timings.append(time.perf_counter() - start)
+            row[f"{name}_ms"] = round(statistics.median(timings) * 1000, 1)
+        row["speedup"] = round(row["single_ms"] / row["parallel_ms"], 2) if row["parallel_ms"] else None
+        rows.append(row)
+        print(f"  {seconds:6.1f}s audio: single {row['single_ms']:8.0f} ms   "
+              f"parallel {row['parallel_ms']:8.0f} ms   x{row['speedup']}")
+    return rows
+
+
+def main():
+    from main import (WHISPER_MODEL, WHISPER_PATH, WHISPER_SERVER, WHISPER_SERVER_PATH,
+                      WHISPER_SERVER_PORT)
+    from service import load_pcm
+    from whisper_engine import WhisperEngine
+
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(
+        description="Benchmark chunked parallel transcription against a single Whisper pass")
+    parser.add_argument("audio", nargs="?", default="input.wav", help="WAV looped to each length")
+    parser.add_argument("--lengths", type=float, nargs="+", default=[5, 10, 20, 40, 60], help="utterance seconds")
+    parser.add_argument("--workers", type=int, default=max(2, cores // 2))
+    parser.add_argument("--chunk-seconds", type=float, default=6.0)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--cli", action="store_true", help="spawn whisper-cli instead of resident servers")
+    parser.add_argument("--output", help="results file (default bench_results/parallel-<timestamp>.json)")
+    args = parser.parse_args()
+
+    pcm = load_pcm(args.audio)
+    use_server = WHISPER_SERVER and not args.cli
+    # Whisper's default thread count for the single pass, as the bot runs it. The workers
+    # take the ports after it, so no worker count can collide with it.
+    port = WHISPER_SERVER_PORT + 30
+    single = WhisperEngine(WHISPER_PATH, WHISPER_MODEL, server_path=WHISPER_SERVER_PATH,
+                           port=port, use_server=use_server)
+    engines = create_engines(args.workers, port + 1, WHISPER_PATH, WHISPER_MODEL,
+                             WHISPER_SERVER_PATH, use_server)
+    parallel = ParallelTranscriber(engines, min_seconds=0, chunk_seconds=args.chunk_seconds)
+    print(f"Warming up 1 + {args.workers} Whisper engines...")
+    single.warm_up()
+    parallel.warm_up()
+
+    print(f"Single pass vs {args.workers} workers x {max(1, cores // args.workers)} threads, "
+          f"{args.chunk_seconds:g}s chunks (median of {args.runs}):")
+    try:
+        rows = benchmark(single, parallel, pcm, args.lengths, args.runs)
+    finally:
+        single.stop()
+        parallel.close()
+
+    output = args.output or os.path.join("bench_results", "parallel-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"timestamp": datetime.now().isoformat(), "settings": vars(args), "results": rows}, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
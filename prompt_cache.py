@@ -0,0 +1,60 @@
+import os
+import re
+import threading
+
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """Cheap token count estimate (roughly what SentencePiece/BPE tokenizers produce).
+
+    Words and punctuation marks are counted, with long words counted as
+    several pieces. Good to within ~15% for English prose, which is enough
+    for budgeting and reuse metrics.
+    """
+    count = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        count += 1 + len(piece) // 8
+    return count
+
+
+class PrefixTracker:
+    """Measures how much of each prompt repeats the previous prompt's prefix.
+
+    Ollama keeps the KV cache of the last prompt and only needs to prefill
+    the part after the longest shared prefix, so this is the number of
+    prompt tokens the LLM can reuse on the turn.
+    """
+
+    def __init__(self):
+        self.previous = ""
+        self.lock = threading.Lock()
+        self.turns = 0
+        self.total_reused = 0
+        self.total_tokens = 0
+
+    def observe(self, prompt):
+        """Record a prompt about to be sent and return reuse stats for it"""
+        with self.lock:
+            shared = len(os.path.commonprefix([self.previous, prompt]))
+            self.previous = prompt
+        reused = estimate_tokens(prompt[:shared])
+        total = estimate_tokens(prompt)
+        self.turns += 1
+        self.total_reused += reused
+        self.total_tokens += total
+        return {
+            "prompt_tokens": total,
+            "reused_tokens": reused,
+            "new_tokens": total - reused,
+            "reused_ratio": reused / total if total else 0.0,
+        }
+
+
+def format_reuse(reuse):
+    """One-line summary of prompt prefix reuse"""
+    return (
+        f"~{reuse['reused_tokens']}/{reuse['prompt_tokens']} prompt tokens reused "
+        f"({reuse['reused_ratio']:.0%})"
+    )
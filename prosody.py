@@ -0,0 +1,162 @@
+import statistics
+
+import numpy as np
+
+from audio_capture import SAMPLE_RATE
+from vad import pcm_to_float
+
+
+FRAME_MS = 32
+HOP_MS = 10
+MIN_PITCH_HZ = 75
+MAX_PITCH_HZ = 400
+FEATURES = ("pitch_hz", "pitch_range_st", "energy_var_db", "rate_sps", "pause_ratio")
+
+
+def _frames(samples, frame_len, hop):
+    count = 1 + (len(samples) - frame_len) // hop
+    return np.lib.stride_tricks.sliding_window_view(samples, frame_len)[::hop][:count]
+
+
+def analyze(pcm, sample_rate=SAMPLE_RATE):
+    """Prosody of one utterance, or None if it holds too little speech.
+
+    All frames are processed at once (a few ms for a long turn):
+    - pitch_hz: median pitch of voiced frames, by autocorrelation
+    - pitch_range_st: spread of that pitch, in semitones
+    - energy_var_db: standard deviation of loudness while speaking
+    - rate_sps: syllables per second of speech, counted as loudness peaks
+    - pause_ratio: share of the time between first and last word spent silent
+    """
+    samples = pcm_to_float(pcm)
+    frame_len = sample_rate * FRAME_MS // 1000
+    hop = sample_rate * HOP_MS // 1000
+    if len(samples) < frame_len * 10:
+        return None
+    frames = _frames(samples, frame_len, hop) * np.hanning(frame_len).astype(np.float32)
+
+    energy = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    speech = (energy > np.percentile(energy, 10) + 10.0) & (energy > -55.0)
+    voiced_at = np.flatnonzero(speech)
+    if len(voiced_at) < 10:
+        return None
+    first, last = voiced_at[0], voiced_at[-1]
+    speech_seconds = len(voiced_at) * HOP_MS / 1000.0
+
+    # Autocorrelation via one batched FFT, on every third speech frame (30 ms apart is plenty)
+    spectrum = np.fft.rfft(frames[voiced_at[::3]], n=2 * frame_len, axis=1)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum), axis=1)[:, :frame_len]
+    low, high = sample_rate // MAX_PITCH_HZ, sample_rate // MIN_PITCH_HZ
+    lags = low + np.argmax(autocorr[:, low:high], axis=1)
+    strength = autocorr[np.arange(len(lags)), lags] / (autocorr[:, 0] + 1e-10)
+    pitch = sample_rate / lags[strength > 0.4]
+
+    # Syllable nuclei: peaks of the smoothed loudness contour while speaking
+    contour = np.convolve(energy, np.ones(5) / 5, mode="same")
+    peaks = (contour[1:-1] > contour[:-2]) & (contour[1:-1] >= contour[2:]) & speech[1:-1]
+    peaks &= contour[1:-1] > np.percentile(contour[speech], 25)
+
+    semitones = 12 * np.log2(pitch / np.median(pitch)) if len(pitch) else np.empty(0)
+    return {
+        "pitch_hz": round(float(np.median(pitch)), 1) if len(pitch) >= 5 else None,
+        "pitch_range_st": round(float(np.std(semitones)), 2) if len(pitch) >= 5 else None,
+        "energy_var_db": round(float(np.std(energy[speech])), 2),
+        "rate_sps": round(float(np.count_nonzero(peaks)) / speech_seconds, 2),
+        "pause_ratio": round(1.0 - len(voiced_at) / float(last - first + 1), 3),
+        "speech_seconds": round(speech_seconds, 2),
+    }
+
+
+def _mean(values):
+    values = [value for value in values if value is not None]
+    return statistics.fmean(values) if values else None
+
+
+class ProsodyTracker:
+    """How the user sounds this conversation compared with how they usually sound.
+
+    The baseline is the median of each feature over earlier exchanges,
+    fixed when a conversation starts; the session aggregate is a rolling
+    mean of the last `window` turns.
+    """
+
+    def __init__(self, window=5, min_baseline=5):
+        self.window = window
+        self.min_baseline = min_baseline
+        self.baseline = None
+        self.turns = []
+
+    def start_session(self, past_exchanges=()):
+        """Begin a conversation; `past_exchanges` (with stored prosody) set the baseline"""
+        self.turns = []
+        past = [exchange["prosody"] for exchange in past_exchanges if exchange.get("prosody")]
+        self.baseline = None
+        if len(past) >= self.min_baseline:
+            self.baseline = {}
+            for name in FEATURES:
+                values = [features[name] for features in past if features.get(name) is not None]
+                self.baseline[name] = statistics.median(values) if values else None
+
+    def add(self, features):
+        if features:
+            self.turns = (self.turns + [features])[-self.window:]
+
+    def aggregate(self):
+        """Mean of each feature over this session's recent turns"""
+        if not self.turns:
+            return None
+        return {name: _mean(features.get(name) for features in self.turns) for name in FEATURES}
+
+    def _changes(self, current):
+        """Relative change of each feature against the baseline (absolute for pause_ratio)"""
+        changes = {}
+        for name in FEATURES:
+            now, usual = current.get(name), self.baseline.get(name)
+            if now is None or usual is None:
+                continue
+            changes[name] = now - usual if name == "pause_ratio" else (now - usual) / usual if usual else 0.0
+        return changes
+
+    def describe(self):
+        """A prompt section when the user sounds different from usual, else an empty string"""
+        current = self.aggregate()
+        if current is None or self.baseline is None:
+            return ""
+        changes = self._changes(current)
+        cues = []
+        if changes.get("rate_sps", 0) >= 0.15:
+            cues.append("faster")
+        elif changes.get("rate_sps", 0) <= -0.15:
+            cues.append("slower")
+        if changes.get("pitch_hz", 0) >= 0.08:
+            cues.append("higher-pitched")
+        elif changes.get("pitch_hz", 0) <= -0.08:
+            cues.append("lower-pitched")
+        if changes.get("energy_var_db", 0) >= 0.25:
+            cues.append("with more uneven loudness")
+        elif changes.get("pitch_range_st", 0) <= -0.3:
+            cues.append("flatter")
+        if changes.get("pause_ratio", 0) <= -0.1:
+            cues.append("with fewer pauses")
+        elif changes.get("pause_ratio", 0) >= 0.1:
+            cues.append("with more pauses")
+        if not cues:
+            return ""
+
+        tense = {"faster", "higher-pitched", "with more uneven loudness", "with fewer pauses"}
+        low = {"slower", "lower-pitched", "flatter", "with more pauses"}
+        listed = cues[0] if len(cues) == 1 else ", ".join(cues[:-1]) + " and " + cues[-1]
+        text = f"The user sounds {listed} than usual"
+        if len(tense.intersection(cues)) >= 2:
+            text += ", which may mean they are stressed or anxious. Be calm, slow and reassuring"
+        elif len(low.intersection(cues)) >= 2:
+            text += ", which may mean they are tired or low. Be gentle and ask how they are doing"
+        return "\n=== How the user sounds ===\n" + text + ".\n"
+
+
+def format_features(features):
+    """Short form for the console, e.g. "183 Hz, 4.6 syll/s, 21% pauses" """
+    if not features:
+        return "too little speech"
+    pitch = f"{features['pitch_hz']:.0f} Hz, " if features.get("pitch_hz") else ""
+    return f"{pitch}{features['rate_sps']:.1f} syll/s, {features['pause_ratio']:.0%} pauses"
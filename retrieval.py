@@ -0,0 +1,119 @@
+import re
+import sqlite3
+import threading
+
+
+_WORD = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset("""
+a about all also am an and any are as at be because been but by can could did do does
+doing don't for from get got had has have having he her here hers him his how i i'm if
+in into is it it's its just know like me more my no not now of on one or our out really
+she so some than that that's the their them then there these they this to too up us
+very was we were what when where which who why will with would yeah yes you your
+""".split())
+
+
+def query_terms(text, limit=16):
+    """Content words from `text`, quoted for an FTS5 MATCH expression"""
+    terms = []
+    for word in _WORD.findall(text.lower()):
+        word = word.strip("'")
+        if len(word) < 2 or word in _STOPWORDS or word in terms:
+            continue
+        terms.append(word)
+    return terms[:limit]
+
+
+class MemoryIndex:
+    """Persistent BM25 index over past exchanges, for recalling old memories.
+
+    Backed by SQLite's FTS5 full-text index, which is updated one exchange
+    at a time and ranks with BM25 without loading the index into memory.
+    The database is opened on first use; exchanges missing from it (first
+    run, or a crash between logging and indexing) are caught up then.
+    Rowids are positions in the conversation history.
+    """
+
+    def __init__(self, path, history=None):
+        self.path = path
+        self.history = history
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def _connect(self, upto=None):
+        if self.conn is not None:
+            return self.conn
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS exchanges USING fts5("
+            "user, assistant, timestamp UNINDEXED, tokenize='porter unicode61')"
+        )
+        self.conn = conn
+        if self.history is not None:
+            self._catch_up(len(self.history) if upto is None else upto)
+        return conn
+
+    def _catch_up(self, total):
+        indexed = self.conn.execute("SELECT COALESCE(MAX(rowid) + 1, 0) FROM exchanges").fetchone()[0]
+        if indexed >= total:
+            return
+        print(f"Indexing {total - indexed} past exchanges for recall...")
+        rows = (
+            (position, exchange.get("user", ""), exchange.get("assistant", ""), exchange.get("timestamp", ""))
+            for position, exchange in enumerate(self.history[indexed:total], start=indexed)
+        )
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO exchanges(rowid, user, assistant, timestamp) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def add(self, position, exchange):
+        """Index one exchange stored at `position` in the history"""
+        with self.lock:
+            conn = self._connect(upto=position)
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO exchanges(rowid, user, assistant, timestamp) VALUES (?, ?, ?, ?)",
+                    (position, exchange.get("user", ""), exchange.get("assistant", ""), exchange.get("timestamp", "")),
+                )
+
+    def search(self, query, k=3, before=None):
+        """Top-k past exchanges most relevant to `query`, best first.
+
+        `before` limits results to history positions below it, e.g. to skip
+        exchanges that are already in the prompt verbatim.
+        """
+        terms = query_terms(query)
+        if not terms or k <= 0:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        sql = (
+            "SELECT rowid, timestamp, user, assistant, bm25(exchanges) AS score "
+            "FROM exchanges WHERE exchanges MATCH ?"
+        )
+        params = [match]
+        if before is not None:
+            sql += " AND rowid < ?"
+            params.append(before)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(k)
+        with self.lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [
+            {"position": rowid, "timestamp": timestamp, "user": user, "assistant": assistant, "score": -score}
+            for rowid, timestamp, user, assistant, score in rows
+        ]
+
+    def clear(self):
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM exchanges")
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
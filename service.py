@@ -0,0 +1,591 @@
+import argparse
+import heapq
+import itertools
+import json
+import os
+import re
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import main
+from audio_capture import SAMPLE_RATE, SAMPLE_WIDTH
+from benchmark import percentile
+from metrics import metrics
+from ollama_client import OllamaClient
+from summary_worker import SummaryWorker
+from whisper_engine import WhisperEngine
+
+
+LIVE = 0        # a user is waiting for this
+BACKGROUND = 1  # summaries and other housekeeping
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+MAX_MESSAGE_BYTES = 1 << 20  # payload of one client message
+MAX_TURN_SECONDS = 60        # audio buffered for one turn
+MAX_TURN_BYTES = MAX_TURN_SECONDS * SAMPLE_RATE * SAMPLE_WIDTH
+
+
+class ServiceBusy(Exception):
+    """A work queue is full; the client should retry later"""
+
+
+class MessageTooLarge(ValueError):
+    """A message announced a payload over the limit; the payload was skipped"""
+
+    def __init__(self, message, size):
+        super().__init__(f"message payload of {size} bytes exceeds {MAX_MESSAGE_BYTES}")
+        self.message = message
+
+
+class Scheduler:
+    """Bounded priority queue served by a fixed pool of worker threads.
+
+    Lower priority values run first, so live turns overtake queued
+    background work, and with more than one worker one is always kept free
+    for live work. A worker takes up to `batch_size` waiting jobs of the
+    same priority at once and passes them to `handler(worker_index,
+    payloads)`, which returns one result per payload.
+    """
+
+    def __init__(self, name, handler, workers=1, batch_size=1, max_queue=64):
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.reserve_live = 1 if workers > 1 else 0
+        self.heap = []
+        self.sequence = itertools.count()
+        self.cond = threading.Condition()
+        self.busy = 0
+        self.closed = False
+        self.threads = [
+            threading.Thread(target=self._work, args=(i,), name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, payload, priority=LIVE):
+        """Queue a job and return a Future for its result"""
+        future = Future()
+        with self.cond:
+            if self.closed:
+                raise ServiceBusy(f"{self.name} queue is shut down")
+            if len(self.heap) >= self.max_queue:
+                metrics.incr("rejected", queue=self.name)
+                raise ServiceBusy(f"{self.name} queue is full")
+            heapq.heappush(self.heap, (priority, next(self.sequence), time.monotonic(), payload, future))
+            self.cond.notify()
+        return future
+
+    def _runnable(self):
+        if not self.heap:
+            return False
+        if self.heap[0][0] == LIVE:
+            return True
+        return self.busy < len(self.threads) - self.reserve_live
+
+    def _work(self, index):
+        while True:
+            with self.cond:
+                while not self.closed and not self._runnable():
+                    self.cond.wait()
+                if self.closed:
+                    return
+                batch = [heapq.heappop(self.heap)]
+                while self.heap and len(batch) < self.batch_size and self.heap[0][0] == batch[0][0]:
+                    batch.append(heapq.heappop(self.heap))
+                self.busy += 1
+
+            started = time.monotonic()
+            for _, _, queued, _, _ in batch:
+                metrics.observe(f"{self.name}_queue", started - queued)
+            futures = [item[4] for item in batch]
+            try:
+                results = self.handler(index, [item[3] for item in batch])
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            finally:
+                with self.cond:
+                    self.busy -= 1
+                    self.cond.notify_all()
+
+    def pending(self):
+        with self.cond:
+            return len(self.heap)
+
+    def close(self):
+        """Stop the workers; jobs still queued fail with ServiceBusy"""
+        with self.cond:
+            self.closed = True
+            queued, self.heap = self.heap, []
+            self.cond.notify_all()
+        for _, _, _, _, future in queued:
+            future.set_exception(ServiceBusy(f"{self.name} queue was shut down"))
+        for thread in self.threads:
+            thread.join(timeout=5)
+
+
+class Session:
+    """One room/client: its own conversation history and summary on disk"""
+
+    def __init__(self, session_id, directory, summary_llm, summary_debounce):
+        os.makedirs(directory, exist_ok=True)
+        self.id = session_id
+        self.context = main.ConversationContext(
+            os.path.join(directory, "conversation_context.json"),
+            os.path.join(directory, "conversation_summary.json"),
+            llm=summary_llm,
+        )
+        self.lock = threading.Lock()  # one turn at a time per session
+        self.context.start_session()
+        # Also picks up a summary left pending by a previous run
+        self.summaries = SummaryWorker(self.context, debounce=summary_debounce).start()
+
+
+class StubTranscriber:
+    """Stands in for Whisper in simulations: a fixed transcript after a delay per audio second"""
+
+    def __init__(self, text="I've been feeling really tired looking after my mother this week.",
+                 seconds_per_audio_second=0.05):
+        self.text = text
+        self.seconds_per_audio_second = seconds_per_audio_second
+
+    def transcribe_pcm(self, pcm, sample_rate=SAMPLE_RATE):
+        time.sleep(len(pcm) / (sample_rate * SAMPLE_WIDTH) * self.seconds_per_audio_second)
+        return {"text": self.text, "segments": [], "no_speech_prob": None}
+
+    def stop(self):
+        pass
+
+
+class CompanionService:
+    """Serves many conversations from one set of models.
+
+    Each session ID gets its own ConversationContext under `sessions_dir`.
+    Transcription, LLM and TTS work from all sessions goes through shared
+    schedulers with bounded worker pools: `transcribe_workers` resident
+    Whisper servers (one model copy each), `llm_workers` x `batch_size`
+    concurrent Ollama requests (set OLLAMA_NUM_PARALLEL to match so Ollama
+    decodes a batch together) and one TTS worker.
+    """
+
+    def __init__(self, sessions_dir="sessions", transcribe_workers=1, llm_workers=2, batch_size=4,
+                 max_queue=64, llm_client=None, transcriber_factory=None, summary_debounce=None):
+        self.sessions_dir = sessions_dir
+        self.summary_debounce = main.SUMMARY_DEBOUNCE_SECONDS if summary_debounce is None else summary_debounce
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.llm_client = llm_client or OllamaClient(
+            main.OLLAMA_MODEL, host=main.OLLAMA_HOST, keep_alive=main.OLLAMA_KEEP_ALIVE,
+            pool_size=llm_workers * batch_size,
+        )
+        self.scratch = tempfile.mkdtemp(prefix="braincharge-service-")
+        factory = transcriber_factory or self._whisper_engine
+        self.transcribers = [factory(i) for i in range(transcribe_workers)]
+        self.llm_requests = ThreadPoolExecutor(llm_workers * batch_size, thread_name_prefix="llm-request")
+
+        self.transcription = Scheduler("transcribe", self._transcribe_batch, transcribe_workers,
+                                       batch_size=1, max_queue=max_queue)
+        self.llm = Scheduler("llm", self._generate_batch, llm_workers,
+                             batch_size=batch_size, max_queue=max_queue)
+        self.tts = Scheduler("tts", self._synthesize_batch, 1, batch_size=1, max_queue=max_queue)
+
+    def _whisper_engine(self, index):
+        directory = os.path.join(self.scratch, f"whisper-{index}")
+        os.makedirs(directory, exist_ok=True)
+        return WhisperEngine(
+            main.WHISPER_PATH,
+            main.WHISPER_MODEL,
+            transcript_base=os.path.join(directory, "transcript"),
+            server_path=main.WHISPER_SERVER_PATH,
+            port=main.WHISPER_SERVER_PORT + 1 + index,
+            use_server=main.WHISPER_SERVER,
+            no_speech_threshold=main.WHISPER_NO_SPEECH_THRESHOLD,
+        )
+
+    # ---- worker handlers -----------------------------------------------
+
+    def _transcribe_batch(self, index, buffers):
+        engine = self.transcribers[index]
+        results = []
+        for pcm in buffers:
+            with metrics.span("transcribe"):
+                results.append(engine.transcribe_pcm(pcm)["text"])
+        return results
+
+    def _generate_batch(self, index, requests):
+        # Sent concurrently so Ollama can decode them in one batch
+        def generate(request):
+            text, _ = self.llm_client.generate(request["prompt"], timeout=request.get("timeout", 30))
+            return text.strip()
+
+        with metrics.span("llm", batch=len(requests)):
+            futures = [self.llm_requests.submit(generate, request) for request in requests]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+        return results
+
+    def _synthesize_batch(self, index, texts):
+        with metrics.span("tts"):
+            return [main.get_tts().audio_for(text) for text in texts]
+
+    # ---- sessions and turns --------------------------------------------
+
+    def session(self, session_id):
+        if not _SESSION_ID.match(session_id or ""):
+            raise ValueError(f"invalid session id {session_id!r}")
+        with self.sessions_lock:
+            if session_id not in self.sessions:
+                self.sessions[session_id] = Session(
+                    session_id, os.path.join(self.sessions_dir, session_id), self._summary_llm,
+                    self.summary_debounce,
+                )
+            return self.sessions[session_id]
+
+    def _summary_llm(self, prompt, timeout):
+        result = self.llm.submit({"prompt": prompt, "timeout": timeout}, BACKGROUND).result()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _generate(self, prompt):
+        result = self.llm.submit({"prompt": prompt, "timeout": 30}).result()
+        if isinstance(result, TimeoutError):
+            metrics.incr("timeouts", kind="llm")
+            return "I apologize, I'm having trouble responding right now."
+        if isinstance(result, Exception):
+            print(f"Error generating response: {result}")
+            metrics.incr("fallbacks", kind="llm_error")
+            return "I'm sorry, I encountered an error."
+        return result
+
+    def summarize(self, session):
+        """Queue a background summary of the session's new exchanges (debounced per session)"""
+        session.summaries.request()
+
+    def handle_turn(self, session, pcm, want_audio=False):
+        """Transcribe one utterance, reply in the session's context; returns the reply message"""
+        started = time.monotonic()
+        with session.lock:
+            transcript = self.transcription.submit(bytes(pcm)).result()
+            transcribed = time.monotonic()
+            end = False
+            if not transcript:
+                reply = main.DIDNT_CATCH
+            elif main.check_for_sleep_word(transcript):
+                reply, end = main.FAREWELL, True
+                session.context.start_session()  # the next conversation gets a fresh voice aggregate
+            else:
+                prosody = None
+                if session.context.prosody is not None:
+                    prosody = main.analyze_prosody(bytes(pcm))
+                    session.context.prosody.add(prosody)
+                reply = self._generate(main.build_prompt(transcript, session.context))
+                session.context.add_exchange(transcript, reply, prosody=prosody)
+            generated = time.monotonic()
+        if end:
+            self.summarize(session)
+
+        message = {
+            "type": "reply",
+            "session": session.id,
+            "transcript": transcript,
+            "reply": reply,
+            "end": end,
+            "transcribe_ms": round((transcribed - started) * 1000, 1),
+            "llm_ms": round((generated - transcribed) * 1000, 1),
+        }
+        audio = b""
+        if want_audio:
+            audio, rate = self.tts.submit(reply).result()
+            message["sample_rate"] = rate
+        message["total_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return message, audio
+
+    def close(self, finish_summaries=False):
+        """Shut down. Unfinished summaries stay queued on disk unless `finish_summaries`.
+
+        Returns the number of sessions whose summary is still pending (failed
+        or timed out) when finishing them.
+        """
+        unfinished = 0
+        for session in list(self.sessions.values()):
+            if finish_summaries and not session.summaries.flush(timeout=120):  # still needs the LLM scheduler
+                unfinished += 1
+            session.summaries.stop()
+        for scheduler in (self.transcription, self.llm, self.tts):
+            scheduler.close()
+        self.llm_requests.shutdown(wait=False)
+        for transcriber in self.transcribers:
+            transcriber.stop()
+        for session in self.sessions.values():
+            session.context.history.close()
+            session.context.memory.close()
+        shutil.rmtree(self.scratch, ignore_errors=True)
+        return unfinished
+
+
+# ---- socket protocol ----------------------------------------------------
+#
+# Every message is one JSON line, followed by `bytes` bytes of payload when
+# that field is present. Client -> server:
+#   {"type": "hello", "session": "room-12"}
+#   {"type": "audio", "bytes": n} + 16 kHz mono s16le PCM   (any number of chunks)
+#   {"type": "end_turn", "tts": false}                       -> "reply" (+ PCM if tts)
+#   {"type": "bye"}                                          -> "ok", summary queued
+# Server -> client: "ok", "reply" or {"type": "error", "message": ...}.
+
+def send_message(stream, message, payload=b""):
+    if payload:
+        message = dict(message, bytes=len(payload))
+    stream.write(json.dumps(message).encode("utf-8") + b"\n")
+    if payload:
+        stream.write(payload)
+    stream.flush()
+
+
+def read_message(stream, limit=None):
+    """(message, payload), or (None, b"") when the peer closed the connection.
+
+    A payload larger than `limit` is read and thrown away in chunks, then
+    MessageTooLarge is raised, so the stream stays in step with the peer.
+    """
+    line = stream.readline(MAX_MESSAGE_BYTES)
+    if not line:
+        return None, b""
+    message = json.loads(line)
+    size = message.get("bytes", 0)
+    if not isinstance(size, int) or size < 0:
+        raise ValueError(f"invalid payload size {size!r}")
+    if limit is not None and size > limit:
+        remaining = size
+        while remaining:
+            skipped = stream.read(min(remaining, 1 << 16))
+            if not skipped:
+                return None, b""
+            remaining -= len(skipped)
+        raise MessageTooLarge(message, size)
+    payload = stream.read(size) if size else b""
+    if len(payload) < size:
+        return None, b""
+    return message, payload
+
+
+class _ServiceHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        service = self.server.service
+        session = None
+        audio = bytearray()
+        overflow = False  # this turn's audio went over MAX_TURN_BYTES and was dropped
+        while True:
+            try:
+                message, payload = read_message(self.rfile, MAX_MESSAGE_BYTES)
+            except MessageTooLarge as e:
+                if e.message.get("type") == "audio":
+                    overflow = True  # reported with the end_turn reply
+                    audio.clear()
+                else:
+                    send_message(self.wfile, {"type": "error", "message": str(e)})
+                continue
+            except (OSError, ValueError):
+                return
+            if message is None:
+                return
+            kind = message.get("type")
+            try:
+                if kind == "hello":
+                    session = service.session(message.get("session"))
+                    send_message(self.wfile, {"type": "ok", "session": session.id})
+                elif session is None:
+                    send_message(self.wfile, {"type": "error", "message": "send hello first"})
+                elif kind == "audio":
+                    if overflow or len(audio) + len(payload) > MAX_TURN_BYTES:
+                        overflow = True
+                        audio.clear()
+                    else:
+                        audio += payload
+                elif kind == "end_turn":
+                    if overflow:
+                        overflow = False
+                        send_message(self.wfile, {
+                            "type": "error",
+                            "message": f"turn audio over the {MAX_TURN_SECONDS} s limit; the turn was dropped",
+                        })
+                        continue
+                    reply, pcm = service.handle_turn(session, audio, message.get("tts", False))
+                    audio.clear()
+                    send_message(self.wfile, reply, pcm)
+                elif kind == "bye":
+                    service.summarize(session)
+                    send_message(self.wfile, {"type": "ok"})
+                    return
+                else:
+                    send_message(self.wfile, {"type": "error", "message": f"unknown message type {kind!r}"})
+            except ServiceBusy as e:
+                audio.clear()
+                send_message(self.wfile, {"type": "error", "message": str(e), "busy": True})
+            except ValueError as e:
+                send_message(self.wfile, {"type": "error", "message": str(e)})
+
+
+class ServiceServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, service, host="127.0.0.1", port=8765):
+        self.service = service
+        super().__init__((host, port), _ServiceHandler)
+
+
+# ---- simulated clients --------------------------------------------------
+
+def load_pcm(path):
+    """16 kHz mono 16-bit PCM from a WAV file (other formats are converted with numpy)"""
+    with wave.open(path, "rb") as wav:
+        if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) == (SAMPLE_RATE, 1, SAMPLE_WIDTH):
+            return wav.readframes(wav.getnframes())
+    import numpy as np
+    from wake_word import load_wav
+    return (np.clip(load_wav(path), -1, 1) * 32767).astype("<i2").tobytes()
+
+
+def run_client(host, port, session_id, recordings, turns, speed, results, want_audio=False):
+    """Replay recordings as one session's turns; appends one result dict per turn"""
+    chunk = SAMPLE_RATE * SAMPLE_WIDTH // 10  # 100 ms
+    with socket.create_connection((host, port)) as sock:
+        stream = sock.makefile("rwb")
+        send_message(stream, {"type": "hello", "session": session_id})
+        read_message(stream)
+        for turn in range(turns):
+            pcm = recordings[turn % len(recordings)]
+            for start in range(0, len(pcm), chunk):
+                send_message(stream, {"type": "audio"}, pcm[start:start + chunk])
+                if speed:
+                    time.sleep(0.1 / speed)
+            spoken = time.perf_counter()
+            send_message(stream, {"type": "end_turn", "tts": want_audio})
+            reply, _ = read_message(stream)
+            results.append({
+                "session": session_id,
+                "turn": turn,
+                "latency": time.perf_counter() - spoken,
+                "reply": reply,
+            })
+        send_message(stream, {"type": "bye"})
+        read_message(stream)
+
+
+def simulate(args):
+    """Run many simulated clients against a service and report reply latency"""
+    recordings = [load_pcm(path) for path in args.wav]
+    service = server = stub = None
+    host, port = args.host, args.port
+    if not args.connect:
+        llm_client = transcriber_factory = None
+        if args.stub:
+            from ollama_stub import StubOllamaServer
+            stub = StubOllamaServer(tokens_per_second=args.token_rate)
+            llm_client = OllamaClient("stub", host=stub.start(), pool_size=args.llm_workers * args.batch)
+            transcriber_factory = lambda index: StubTranscriber()
+        service = CompanionService(
+            sessions_dir=args.sessions_dir, transcribe_workers=args.transcribe_workers,
+            llm_workers=args.llm_workers, batch_size=args.batch,
+            llm_client=llm_client, transcriber_factory=transcriber_factory,
+        )
+        server = ServiceServer(service, host, 0)
+        host, port = server.server_address[:2]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = []
+    started = time.perf_counter()
+    clients = [
+        threading.Thread(target=run_client, args=(host, port, f"sim-{i:03d}", recordings,
+                                                  args.turns, args.speed, results))
+        for i in range(args.clients)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r["reply"] and r["reply"].get("type") == "reply"]
+    errors = len(results) - len(ok)
+    print(f"{args.clients} clients x {args.turns} turns in {elapsed:.1f}s ({errors} errors)")
+    if ok:
+        latencies = [r["latency"] * 1000 for r in ok]
+        print(f"Reply latency after end of speech: p50 {percentile(latencies, 50):.0f} ms, "
+              f"p95 {percentile(latencies, 95):.0f} ms, max {max(latencies):.0f} ms")
+        for stage in ("transcribe_ms", "llm_ms"):
+            values = [r["reply"][stage] for r in ok]
+            print(f"  {stage[:-3]:10s} p50 {percentile(values, 50):7.0f} ms  p95 {percentile(values, 95):7.0f} ms")
+
+    failed_summaries = 0
+    if service is not None:
+        failed_summaries = service.close(finish_summaries=True)
+        server.shutdown()
+        server.server_close()
+        print(f"Summaries: {len(service.sessions) - failed_summaries} updated, {failed_summaries} failed")
+    if stub is not None:
+        stub.stop()
+    return 1 if errors or failed_summaries else 0
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Multi-session companion service")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("serve", "simulate"):
+        p = sub.add_parser(name)
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=8765)
+        p.add_argument("--sessions-dir", default="sessions")
+        p.add_argument("--transcribe-workers", type=int, default=1)
+        p.add_argument("--llm-workers", type=int, default=2)
+        p.add_argument("--batch", type=int, default=4, help="LLM requests sent together per worker")
+        if name == "simulate":
+            p.add_argument("wav", nargs="+", help="recordings replayed as user turns")
+            p.add_argument("--clients", type=int, default=4)
+            p.add_argument("--turns", type=int, default=3)
+            p.add_argument("--speed", type=float, default=1.0, help="audio upload speed (0 = as fast as possible)")
+            p.add_argument("--connect", action="store_true", help="use a running service at --host/--port")
+            p.add_argument("--stub", action="store_true", help="stub Whisper and LLM (no models needed)")
+            p.add_argument("--token-rate", type=float, default=40.0, help="stub LLM tokens per second")
+    args = parser.parse_args()
+
+    if args.command == "simulate":
+        sys.exit(simulate(args))
+
+    service = CompanionService(
+        sessions_dir=args.sessions_dir, transcribe_workers=args.transcribe_workers,
+        llm_workers=args.llm_workers, batch_size=args.batch,
+    )
+    server = ServiceServer(service, args.host, args.port)
+    print(f"Companion service listening on {args.host}:{args.port} "
+          f"({args.transcribe_workers} Whisper, {args.llm_workers}x{args.batch} LLM workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,329 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import math
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmark import percentile
+from prompt_cache import estimate_tokens
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    HAVE_MATPLOTLIB = True
+except ImportError:
+    HAVE_MATPLOTLIB = False
+
+
+PEOPLE = [
+    ("Mom", "mother"), ("Dad", "father"), ("Anna", "sister"), ("Dr. Patel", "neurologist"),
+    ("Maria", "home aide"), ("James", "brother"), ("Mrs. Okafor", "neighbour"), ("Leo", "grandson"),
+]
+TOPICS = [
+    "medication schedule", "sleep", "physical therapy", "memory lapses", "insurance paperwork",
+    "meal planning", "falls", "respite care", "doctor's appointment", "mood swings",
+]
+FEELINGS = ["exhausted", "a bit better", "overwhelmed", "hopeful", "frustrated", "calm", "worried", "guilty"]
+USER_TEMPLATES = [
+    "{person} had a rough night, I'm {feeling} and worried about {topic}.",
+    "I talked to {person} about {topic} today.",
+    "Can you remind me to call {person} about the {topic} on {date}?",
+    "Honestly I feel {feeling}. {person} keeps asking about {topic} and I don't know what to say.",
+    "Good news, {topic} went well this week and {person} seemed happier.",
+    "I keep forgetting things myself. Was it {person} who mentioned {topic}?",
+]
+REPLIES = [
+    "That sounds really hard. You're doing more than you realise, and it's okay to feel {feeling}.",
+    "I'm glad you told me. Would it help to write down a plan for the {topic} together?",
+    "I'll remember that. Take a moment for yourself tonight if you can.",
+    "It makes sense that {person} would need reassurance. How are you holding up?",
+]
+
+METRICS = [
+    # (column, label, floor): values below the floor count as flat (timer and allocator noise)
+    ("write_p95_ms", "per-turn write p95 (ms)", 1.0),
+    ("prompt_p95_ms", "per-turn prompt build p95 (ms)", 1.0),
+    ("startup_ms", "startup load (ms)", 20.0),
+    ("startup_rss_kb", "startup memory growth (KiB)", 1024),
+    ("disk_kb", "files on disk (KiB)", 64),
+    ("summary_prompt_tokens", "summary prompt (~tokens)", 100),
+    ("context_tokens", "prompt context (~tokens)", 100),
+]
+
+# Run in a fresh interpreter: how long a restart takes to load the history, and the memory it adds
+_STARTUP_PROBE = '''
+import json, os, resource, sys, time
+sys.path.insert(0, {root!r})
+import main
+
+def rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1 if sys.platform.startswith("linux") else 1024)
+
+before = rss_kb()
+start = time.perf_counter()
+context = main.ConversationContext({context_file!r}, {summary_file!r})
+context.get_context_prompt("How is Mom sleeping after the appointment?")
+print(json.dumps({{"seconds": time.perf_counter() - start, "rss_kb": rss_kb() - before}}))
+'''
+
+
+class SimulatedClock:
+    """Stands in for main.datetime so exchanges are stamped across months, not seconds"""
+
+    def __init__(self, start):
+        self.current = start
+
+    def advance(self, **delta):
+        self.current += timedelta(**delta)
+
+    def install(self, module):
+        clock = self
+
+        class SimulatedDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.current
+
+        module.datetime = SimulatedDatetime
+
+
+def synthesize_exchange(rng, day):
+    """A caregiver turn and reply, drawn from a small vocabulary like a real household's"""
+    name, _ = rng.choice(PEOPLE)
+    fields = {
+        "person": name,
+        "topic": rng.choice(TOPICS),
+        "feeling": rng.choice(FEELINGS),
+        "date": (day + timedelta(days=rng.randint(1, 14))).strftime("%B %d"),
+    }
+    return rng.choice(USER_TEMPLATES).format(**fields), rng.choice(REPLIES).format(**fields)
+
+
+class StubSummarizer:
+    """Summary LLM stand-in: a plausible JSON summary of the people and topics in the prompt.
+
+    It keeps what a good model would keep (everyone mentioned, recent
+    action items), so the summary grows the way a real one should, and
+    records the size of every prompt it is sent.
+    """
+
+    def __init__(self):
+        self.prompt_tokens = []
+
+    def __call__(self, prompt, timeout):
+        self.prompt_tokens.append(estimate_tokens(prompt))
+        people = [{"name": name, "relationship": relationship, "context": f"Mentioned as the {relationship}"}
+                  for name, relationship in PEOPLE if name in prompt]
+        topics = [topic for topic in TOPICS if topic in prompt]
+        reminders = re.findall(r"remind me to call ([\w. ]+?) about the ([\w' ]+?) on (\w+ \d+)", prompt)
+        action_items = [f"Call {who} about the {what} on {when}" for who, what, when in reminders][-8:]
+        return json.dumps({
+            "people": people,
+            "dates": [{"date": when, "event": f"Call {who}"} for who, _, when in reminders][-5:],
+            "topics": topics,
+            "emotional_patterns": "Tired and stretched thin, with better days after good news.",
+            "action_items": action_items,
+            "summary": "A caregiver looking after a parent with memory problems, supported by family.",
+        })
+
+
+def _disk_kb(paths):
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(directory, name)) for name in names)
+        elif os.path.exists(path):
+            total += os.path.getsize(path)
+    return total // 1024
+
+
+def probe_startup(context_file, summary_file):
+    """(seconds, KiB) a fresh process needs to load the history and build one prompt"""
+    script = _STARTUP_PROBE.format(root=os.path.dirname(os.path.abspath(__file__)),
+                                   context_file=context_file, summary_file=summary_file)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    return data["seconds"], max(0, data["rss_kb"])
+
+
+def checkpoints(total, count, first=100):
+    """History lengths to measure at, spaced evenly on a log scale (for the slope fit)"""
+    first = min(first, total)
+    if count <= 1 or first >= total:
+        return [total]
+    ratio = (total / first) ** (1.0 / (count - 1))
+    return sorted({int(round(first * ratio ** i)) for i in range(count)} | {total})
+
+
+def run_soak(args, workdir):
+    import main
+
+    rng = random.Random(args.seed)
+    clock = SimulatedClock(datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+                           - timedelta(days=args.days))
+    clock.install(main)
+    summarizer = StubSummarizer()
+    context_file = os.path.join(workdir, "conversation_context.json")
+    summary_file = os.path.join(workdir, "conversation_summary.json")
+    context = main.ConversationContext(context_file, summary_file, llm=summarizer)
+    stem = os.path.splitext(context_file)[0]
+    files = [stem + "_log", stem + "_index.sqlite", summary_file]
+
+    total = args.days * args.exchanges_per_day
+    marks = checkpoints(total, args.checkpoints)
+    rows = []
+    writes, prompts = [], []
+    context_tokens = 0
+    done = 0
+    for day in range(args.days):
+        # A few conversations a day, each summarized afterwards as the summary worker would
+        conversations = rng.randint(1, 3)
+        for i in range(args.exchanges_per_day):
+            user, reply = synthesize_exchange(rng, clock.current)
+            start = time.perf_counter()
+            context.get_context_prompt(user)
+            prompts.append(time.perf_counter() - start)
+            context_tokens = context.last_context_report["total"]
+
+            start = time.perf_counter()
+            context.add_exchange(user, reply)
+            writes.append(time.perf_counter() - start)
+            done += 1
+            clock.advance(minutes=rng.randint(1, 4))
+            if (i + 1) % max(1, args.exchanges_per_day // conversations) == 0:
+                summarizer.prompt_tokens.clear()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    context.generate_summary()
+                clock.advance(hours=rng.randint(1, 5))
+
+            if done in marks:
+                startup, rss = probe_startup(context_file, summary_file)
+                row = {
+                    "exchanges": done,
+                    "days": day + 1,
+                    "write_p95_ms": round(percentile(writes, 95) * 1000, 3),
+                    "prompt_p95_ms": round(percentile(prompts, 95) * 1000, 3),
+                    "startup_ms": round(startup * 1000, 1),
+                    "startup_rss_kb": rss,
+                    "disk_kb": _disk_kb(files),
+                    "summary_prompt_tokens": max(summarizer.prompt_tokens, default=0),
+                    "context_tokens": context_tokens,
+                }
+                rows.append(row)
+                writes, prompts = [], []
+                print(f"  {done:7d} exchanges ({day + 1} days): write p95 {row['write_p95_ms']:.2f} ms, "
+                      f"startup {row['startup_ms']:.0f} ms (+{row['startup_rss_kb']} KiB), "
+                      f"disk {row['disk_kb']} KiB, summary prompt ~{row['summary_prompt_tokens']} tok")
+        clock.current = clock.current.replace(hour=9, minute=0) + timedelta(days=1)
+    context.history.close()
+    context.memory.close()
+    return rows
+
+
+def growth_slope(xs, ys, floor):
+    """Least-squares slope of log(y) against log(x): ~0 flat, 1 linear, >1 super-linear"""
+    points = [(math.log(x), math.log(max(y, floor))) for x, y in zip(xs, ys) if x > 0]
+    if len(points) < 3:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if spread == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def check_growth(rows, max_slope):
+    """Print each metric's growth slope; returns the metrics growing faster than `max_slope`"""
+    xs = [row["exchanges"] for row in rows]
+    failures = []
+    print(f"\n{'metric':34s} {'first':>10s} {'last':>10s} {'slope':>7s}   (log-log vs history length)")
+    for column, label, floor in METRICS:
+        ys = [row[column] for row in rows]
+        slope = growth_slope(xs, ys, floor)
+        flag = ""
+        if slope is not None and slope > max_slope:
+            flag = "  <-- SUPER-LINEAR"
+            failures.append(column)
+        slope_text = "n/a" if slope is None else f"{slope:.2f}"
+        print(f"{label:34s} {ys[0]:10} {ys[-1]:10} {slope_text:>7s}{flag}")
+    return failures
+
+
+def write_csv(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_chart(rows, path):
+    """One log-log panel per metric against history length"""
+    xs = [row["exchanges"] for row in rows]
+    fig, axes = plt.subplots(len(METRICS), 1, figsize=(7, 2.2 * len(METRICS)), sharex=True)
+    for ax, (column, label, floor) in zip(axes, METRICS):
+        ax.loglog(xs, [max(row[column], floor) for row in rows], marker="o")
+        ax.set_ylabel(label, fontsize=8)
+        ax.grid(True, which="both", alpha=0.3)
+    axes[-1].set_xlabel("exchanges in history")
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Soak-test ConversationContext with months of synthetic history and check its growth")
+    parser.add_argument("--days", type=int, default=180, help="simulated days of use")
+    parser.add_argument("--exchanges-per-day", type=int, default=20)
+    parser.add_argument("--checkpoints", type=int, default=10, help="measurements, log-spaced over the run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-slope", type=float, default=1.1,
+                        help="fail if a metric grows faster than history^max-slope")
+    parser.add_argument("--output-dir", default="soak_results")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic history directory")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="braincharge-soak-")
+    print(f"Simulating {args.days} days x {args.exchanges_per_day} exchanges in {workdir}")
+    try:
+        rows = run_soak(args, workdir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    failures = check_growth(rows, args.max_slope)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stem = os.path.join(args.output_dir, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    write_csv(rows, stem + ".csv")
+    print(f"\nSaved measurements to {stem}.csv")
+    if HAVE_MATPLOTLIB:
+        write_chart(rows, stem + ".png")
+        print(f"Saved chart to {stem}.png")
+    else:
+        print("Install matplotlib for a chart (pip install matplotlib)")
+
+    if failures:
+        print(f"\n{len(failures)} metric(s) growing super-linearly: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import queue
+import re
+import threading
+import time
+
+
+# Sentence end: terminal punctuation (plus closing quotes/brackets) followed by whitespace
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+_ABBREVIATIONS = frozenset(("dr.", "mr.", "mrs.", "ms.", "st.", "e.g.", "i.e.", "etc.", "vs."))
+
+
+class SentenceSplitter:
+    """Accumulates streamed LLM text and hands back complete sentences.
+
+    Very short sentences ("Oh.") are held and joined with the next one so
+    TTS isn't started for a single word.
+    """
+
+    def __init__(self, min_chars=12):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        """Add streamed text and return any sentences that are now complete"""
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            words = candidate.split()
+            if words and words[-1].lower() in _ABBREVIATIONS:
+                continue
+            if len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Return whatever text is left once the stream has ended"""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return rest
+
+
+class SpeechPipeline:
+    """Speaks sentences on a worker thread while generation continues"""
+
+    def __init__(self, speak):
+        self.speak = speak
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.started_at = None
+        self.first_audio_at = None
+        self.spoken = []
+        self.interrupted = None  # (sentence, seconds played) if playback was cut off
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.thread.start()
+
+    def say(self, sentence):
+        if sentence:
+            self.queue.put(sentence)
+
+    def finish(self):
+        """Wait until every queued sentence has been spoken"""
+        self.queue.put(None)
+        self.thread.join()
+
+    def time_to_first_audio(self):
+        """Seconds from start() until the first sentence began playing"""
+        if self.first_audio_at is None:
+            return None
+        return self.first_audio_at - self.started_at
+
+    def spoken_text(self, words_per_second=2.9):
+        """What the listener heard: an interrupted sentence is cut to the words
+        that had time to play (espeak talks at about 175 words a minute)"""
+        text = " ".join(self.spoken)
+        if self.interrupted is not None:
+            sentence, seconds = self.interrupted
+            heard = " ".join(sentence.split()[:int(seconds * words_per_second)])
+            text = f"{text} {heard}".strip() + "..."
+        return text
+
+    def _run(self):
+        while True:
+            sentence = self.queue.get()
+            if sentence is None:
+                break
+            if self.interrupted is not None:
+                continue  # the user cut in; drop the rest of the reply
+            if self.first_audio_at is None:
+                self.first_audio_at = time.perf_counter()
+            started = time.perf_counter()
+            if self.speak(sentence) is False:
+                self.interrupted = (sentence, time.perf_counter() - started)
+                continue
+            self.spoken.append(sentence)
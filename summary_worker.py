@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from metrics import metrics
+
+
+class SummaryWorker:
+    """Runs ConversationContext.generate_summary() on a background thread.
+
+    request() marks a summary as due after `debounce` seconds; requests
+    that arrive in the meantime (back-to-back conversations) push the run
+    back and are coalesced into one, up to `max_delay` after the first.
+    The pending request is kept in a small file next to the summary, so
+    work left over from a crash or restart runs once the worker starts
+    again. A failed run is retried after `retry_delay`.
+    """
+
+    def __init__(self, context, debounce=20.0, max_delay=300.0, retry_delay=300.0, pending_file=None):
+        self.context = context
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.pending_file = pending_file or context.summary_file + ".pending"
+        self.cond = threading.Condition()
+        self.requests = 0       # bumped by each request(), so one made mid-run isn't lost
+        self.due = None         # monotonic time the next run may start
+        self.deadline = None    # latest start time, however often it is postponed
+        self.running = False
+        self.runs = 0
+        self.stopping = False
+        self.thread = None
+        if os.path.exists(self.pending_file):
+            self.requests = 1
+            self.due = self.deadline = time.monotonic() + debounce
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="summary-worker", daemon=True)
+            self.thread.start()
+        return self
+
+    def request(self):
+        """Schedule a summary update (returns at once)"""
+        with self.cond:
+            now = time.monotonic()
+            if self.requests == 0 or self.deadline is None:
+                self.deadline = now + self.max_delay
+                self._save_pending()
+            self.requests += 1
+            self.due = min(now + self.debounce, self.deadline)
+            self.cond.notify_all()
+
+    def postpone(self):
+        """Hold a pending run back while the user is talking (bounded by max_delay)"""
+        with self.cond:
+            if self.requests and self.due is not None:
+                self.due = min(max(self.due, time.monotonic() + self.debounce), self.deadline)
+
+    def pending(self):
+        with self.cond:
+            return self.requests > 0 or self.running
+
+    def _save_pending(self):
+        tmp = self.pending_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"requested": datetime.now().isoformat()}, f)
+        os.replace(tmp, self.pending_file)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.stopping and (self.requests == 0 or time.monotonic() < self.due):
+                    self.cond.wait(None if self.requests == 0 else self.due - time.monotonic())
+                if self.stopping:
+                    return
+                handled = self.requests
+                self.running = True
+
+            started = time.perf_counter()
+            ok = self.context.generate_summary()
+            # Not a span: it would be charged to whichever turn is in progress
+            metrics.observe("summary", time.perf_counter() - started)
+
+            with self.cond:
+                self.running = False
+                self.runs += 1
+                if not ok:
+                    self.due = time.monotonic() + self.retry_delay
+                    self.deadline = self.due
+                elif self.requests == handled:
+                    self.requests = 0
+                    self.due = self.deadline = None
+                    if os.path.exists(self.pending_file):
+                        os.remove(self.pending_file)
+                else:
+                    # More exchanges came in during the run: a fresh debounce
+                    # window for them, rather than the deadline that just passed
+                    self.requests -= handled
+                    now = time.monotonic()
+                    self.deadline = now + self.max_delay
+                    self.due = min(now + self.debounce, self.deadline)
+                self.cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Run any pending summary now and wait for one attempt; False if it failed or timed out"""
+        self.start()
+        end = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            if self.requests:
+                self.due = time.monotonic()
+                self.cond.notify_all()
+            runs = self.runs
+            while self.running or (self.requests and self.runs == runs):
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+            return not self.requests
+
+    def stop(self):
+        """Stop the worker; a pending request stays on disk for the next start"""
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        if self.thread is not None and not self.running:
+            self.thread.join(timeout=1)
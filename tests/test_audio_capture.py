@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from audio_capture import AudioCapture, RingBuffer
+
+
+def written(ring, start, end):
+    return bytes(ring.view(start, end))
+
+
+def test_views_are_contiguous_across_the_wrap():
+    ring = RingBuffer(8)
+    ring.write(b"abcdef")
+    ring.write(b"ghij")  # wraps: positions 8 and 9 land at the front
+    assert ring.total == 10
+    assert ring.oldest() == 2
+    assert written(ring, 2, 10) == b"cdefghij"
+    assert written(ring, 5, 9) == b"fghi"
+
+
+def test_view_is_zero_copy():
+    ring = RingBuffer(8)
+    ring.write(b"abcd")
+    view = ring.view(0, 4)
+    assert isinstance(view, memoryview)
+    assert view.obj is ring.data
+
+
+def test_oversized_write_keeps_only_the_newest_bytes():
+    ring = RingBuffer(4)
+    ring.write(b"ab")
+    ring.write(b"0123456789")
+    assert ring.total == 12
+    assert written(ring, 8, 12) == b"6789"
+
+
+def test_overwritten_or_future_ranges_raise():
+    ring = RingBuffer(4)
+    ring.write(b"abcdef")
+    with pytest.raises(ValueError):
+        ring.view(1, 4)
+    with pytest.raises(ValueError):
+        ring.view(4, 7)
+    with pytest.raises(ValueError):
+        ring.view(5, 4)
+
+
+def test_many_wraps_match_the_stream():
+    ring = RingBuffer(10)
+    stream = bytes(range(256)) * 3
+    for i in range(0, len(stream), 7):
+        ring.write(stream[i:i + 7])
+        assert written(ring, ring.oldest(), ring.total) == stream[ring.oldest():ring.total]
+
+
+def test_wait_for_wakes_on_write_and_times_out():
+    ring = RingBuffer(16)
+    assert ring.wait_for(4, timeout=0.01) is False
+    timer = threading.Timer(0.05, ring.write, args=(b"abcd",))
+    timer.start()
+    assert ring.wait_for(4, timeout=2) is True
+    timer.join()
+
+
+def test_continuous_records_leave_no_gap():
+    capture = AudioCapture([], buffer_seconds=1, sample_rate=100)  # 200 bytes a second
+    capture.ring.write(bytes(range(60)))
+    capture.cursor = 0
+    first = bytes(capture.record(0.1, continuous=True))
+    second = bytes(capture.record(0.1, continuous=True))
+    assert first + second == bytes(range(40))
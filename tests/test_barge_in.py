@@ -0,0 +1,117 @@
+import time
+
+import numpy as np
+
+from audio_capture import AudioCapture
+from tts import EspeakBackend, TextToSpeech
+from vad import BargeInMonitor
+
+RATE = 16000
+
+
+class FeedCapture(AudioCapture):
+    """AudioCapture without ffmpeg: the test writes PCM into the ring itself"""
+
+    def __init__(self):
+        super().__init__([], buffer_seconds=10)
+
+    @property
+    def running(self):
+        return True
+
+    def feed(self, samples, chunk_seconds=0.02):
+        pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes()
+        step = self.seconds_to_bytes(chunk_seconds)
+        for i in range(0, len(pcm), step):
+            self.ring.write(pcm[i:i + step])
+
+
+def noise(seconds, level=0.0005, seed=0):
+    return np.random.default_rng(seed).normal(0, level, int(seconds * RATE))
+
+
+def tone(seconds, amplitude, hz=220.0):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return amplitude * np.sin(2 * np.pi * hz * t) + noise(seconds, seed=1)
+
+
+def monitor_for(capture):
+    calls = []
+    monitor = BargeInMonitor(capture, on_speech=lambda: calls.append(time.perf_counter()))
+    monitor.start()
+    return monitor, calls
+
+
+def settle(monitor, capture, timeout=2.0):
+    """Wait until the monitor has read everything written so far"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline and not monitor.triggered.is_set():
+        if monitor.origin is not None and monitor.detector.frames_seen * monitor.detector.frame_bytes \
+                >= capture.position() - monitor.origin:
+            return
+        time.sleep(0.01)
+
+
+def test_generation_delay_before_playback_is_not_a_barge_in():
+    capture = FeedCapture()
+    capture.feed(noise(1.0))
+    monitor, calls = monitor_for(capture)
+    try:
+        capture.feed(noise(0.6, seed=2))  # the reply is still being generated: a silent room
+        time.sleep(0.1)
+        assert not monitor.triggered.is_set()
+
+        monitor.playback_started()
+        capture.feed(tone(1.5, 0.3))  # the bot's own voice through the mic
+        settle(monitor, capture)
+        assert not monitor.triggered.is_set()
+        assert calls == []
+    finally:
+        monitor.stop()
+
+
+def test_user_talking_over_playback_is_detected_where_they_started():
+    capture = FeedCapture()
+    capture.feed(noise(1.0))
+    monitor, calls = monitor_for(capture)
+    try:
+        capture.feed(noise(0.6, seed=2))
+        monitor.playback_started()
+        played_from = capture.position()
+        capture.feed(tone(1.0, 0.03))
+        user_from = capture.position()
+        capture.feed(tone(0.5, 0.03) + tone(0.5, 0.6, hz=150.0))
+        assert monitor.triggered.wait(2)
+        assert len(calls) == 1
+        assert monitor.origin == played_from
+        assert abs(monitor.speech_start - user_from) <= capture.seconds_to_bytes(0.04)
+    finally:
+        monitor.stop()
+
+
+def test_only_the_first_playback_sets_the_origin():
+    capture = FeedCapture()
+    capture.feed(noise(0.5))
+    monitor, _ = monitor_for(capture)
+    try:
+        monitor.playback_started()
+        origin = monitor.origin
+        capture.feed(tone(0.5, 0.05))
+        monitor.playback_started()  # the next sentence
+        assert monitor.origin == origin
+    finally:
+        monitor.stop()
+
+
+def test_playback_hook_runs_before_audio_reaches_the_player():
+    tts = TextToSpeech(EspeakBackend(), cache=None)
+    events = []
+
+    def chunks():
+        events.append("synthesized")
+        yield b"\0" * 64
+        events.append("written")
+
+    tts.on_playback = lambda: events.append("playing")
+    assert tts._play(["cat"], chunks()) is True
+    assert events == ["synthesized", "playing", "written"]
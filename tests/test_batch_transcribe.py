@@ -0,0 +1,91 @@
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+
+import pytest
+
+import main
+from batch_transcribe import Manifest, transcribe_all
+from whisper_engine import pcm_to_wav
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="needs an executable script as the whisper-server binary")
+
+# Answers /inference like whisper-server and leaves its pid behind, so the
+# test can check that nothing outlives the batch
+FAKE_SERVER = '''
+import json, os, sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+port = int(sys.argv[sys.argv.index("--port") + 1])
+open(os.path.join(PID_DIR, str(os.getpid())), "w").close()
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({"text": " hello"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *args):
+        pass
+HTTPServer(("127.0.0.1", port), Handler).serve_forever()
+'''
+
+
+def free_port_pair():
+    """A base port whose next port is free as well"""
+    for _ in range(20):
+        with socket.socket() as first:
+            first.bind(("127.0.0.1", 0))
+            port = first.getsockname()[1]
+            with socket.socket() as second:
+                try:
+                    second.bind(("127.0.0.1", port + 1))
+                except OSError:
+                    continue
+            return port
+    pytest.skip("no free pair of ports")
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_workers_leave_no_server_or_scratch_directory_behind(tmp_path, monkeypatch):
+    pids = tmp_path / "pids"
+    pids.mkdir()
+    server = tmp_path / "whisper-server"
+    server.write_text(f"#!{sys.executable}\nPID_DIR = {str(pids)!r}\n" + FAKE_SERVER)
+    server.chmod(server.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(main, "WHISPER_SERVER_PATH", str(server))
+    monkeypatch.setattr(main, "WHISPER_SERVER_PORT", free_port_pair() - 50)
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(scratch))  # inherited by the forked workers
+
+    files = []
+    for i in range(4):
+        path = tmp_path / f"clip-{i}.wav"
+        path.write_bytes(pcm_to_wav(bytes(32000)))
+        files.append(str(path))
+    output = str(tmp_path / "transcripts.jsonl")
+    manifest = Manifest(output + ".manifest")
+    try:
+        done, _, _, failed = transcribe_all(files, output, manifest, 2, {"threads": 1, "server": True})
+    finally:
+        manifest.close()
+
+    assert (done, failed) == (4, 0)
+    with open(output) as f:
+        assert {json.loads(line)["text"] for line in f} == {"hello"}
+    started = [int(name) for name in os.listdir(pids)]
+    assert started  # the resident server was really used
+    assert not [pid for pid in started if is_running(pid)]
+    assert os.listdir(scratch) == []
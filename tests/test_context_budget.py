@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from context_budget import fit_exchanges, format_budget, select_summary, summary_items
+from prompt_cache import estimate_tokens
+
+SUMMARY = {
+    "summary": "Caring for Mom after her fall.",
+    "people": [
+        {"name": "Anna", "relationship": "sister", "context": "visits on Sundays"},
+        {"name": "Dr. Patel", "relationship": "neurologist"},
+    ],
+    "dates": [
+        {"date": "2026-03-01", "event": "insurance renewal"},
+        {"date": "2026-10-20", "event": "neurology follow-up"},
+    ],
+    "action_items": ["Call the pharmacy", "Book respite care"],
+    "topics": ["sleep", "medication"],
+    "emotional_patterns": "Tired but hopeful.",
+}
+
+
+def test_everything_is_rendered_without_a_budget():
+    text, tokens = select_summary(SUMMARY)
+    for piece in ("Overall: Caring for Mom", "- Anna (sister): visits on Sundays", "- Dr. Patel (neurologist)",
+                  "- 2026-10-20: neurology follow-up", "Key topics: sleep, medication",
+                  "Emotional context: Tired but hopeful.", "- Book respite care"):
+        assert piece in text
+    assert set(tokens) == {"overview", "people", "dates", "action_items", "topics", "emotional"}
+
+
+def test_items_rank_newest_and_nearest_date_first():
+    items = summary_items(SUMMARY, today=datetime(2026, 10, 18))
+    assert items["action_items"][0][2] == "- Book respite care\n"
+    assert items["people"][0][2].startswith("- Dr. Patel")
+    assert "neurology follow-up" in items["dates"][0][2]
+
+
+def test_sections_are_filled_in_priority_order():
+    action_items = select_summary({"action_items": SUMMARY["action_items"]})[1]["action_items"]
+    text, tokens = select_summary(SUMMARY, available=action_items)
+    # Action items come first in PRIORITY, so they take the whole budget
+    assert set(tokens) == {"action_items"}
+    assert "Call the pharmacy" in text and "Book respite care" in text
+    assert "Overall" not in text and "Anna" not in text
+
+
+def test_budget_edge_keeps_the_best_item_and_skips_the_rest():
+    full = select_summary({"action_items": ["Book respite care"]})[1]["action_items"]
+    text, tokens = select_summary(SUMMARY, available=full)
+    assert tokens == {"action_items": full}
+    assert "Book respite care" in text and "Call the pharmacy" not in text
+    # one token less and no action item fits; cheaper sections use the space instead
+    text, tokens = select_summary(SUMMARY, available=full - 1)
+    assert "action_items" not in tokens and "respite" not in text
+    assert 0 < sum(tokens.values()) <= full - 1
+
+
+def test_smaller_items_still_fill_the_space_a_large_one_could_not():
+    summary = {"action_items": ["x " * 50], "topics": ["sleep"]}
+    topic_cost = select_summary({"topics": ["sleep"]})[1]["topics"]
+    text, tokens = select_summary(summary, available=topic_cost)
+    assert tokens == {"topics": topic_cost}
+    assert "Key topics: sleep" in text
+
+
+def test_fit_exchanges_keeps_the_newest_blocks_that_fit():
+    blocks = ["User: one two three\n", "User: four five six\n", "User: seven eight nine\n"]
+    cost = estimate_tokens(blocks[0])
+    assert fit_exchanges(blocks, 2 * cost) == (blocks[1:], 2 * cost)
+    assert fit_exchanges(blocks, 2 * cost - 1) == (blocks[2:], cost)
+    assert fit_exchanges(blocks, 100) == (blocks, 3 * cost)
+
+
+def test_fit_exchanges_newest_block_may_overflow_only_when_asked():
+    blocks = ["User: " + "word " * 40]
+    cost = estimate_tokens(blocks[0])
+    assert fit_exchanges(blocks, 5) == (blocks, cost)
+    assert fit_exchanges(blocks, 5, keep_newest=False) == ([], 0)
+
+
+def test_format_budget_lists_only_non_empty_sections():
+    report = {"total": 420, "budget": 1200, "sections": {"recent": 300, "voice": 0, "people": 120}}
+    assert format_budget(report) == "context ~420/1200 tokens (recent 300, people 120)"
+    assert format_budget({"total": 0, "budget": 1200, "sections": {}}) == "context ~0/1200 tokens (empty)"
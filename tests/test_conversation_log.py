@@ -0,0 +1,113 @@
+import json
+import os
+
+from conversation_log import MANIFEST, ConversationLog
+
+
+def exchange(i):
+    return {"timestamp": f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}", "user": f"u{i}", "assistant": f"a{i}"}
+
+
+def fill(log, count, start=0):
+    for i in range(start, start + count):
+        log.append(exchange(i))
+
+
+def active_path(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return os.path.join(directory, json.load(f)["active"])
+
+
+def test_reopen_keeps_every_exchange_in_order(tmp_path):
+    log = ConversationLog(str(tmp_path), segment_size=3, compact_after=100)
+    fill(log, 8)
+    log.close()
+
+    log = ConversationLog(str(tmp_path), segment_size=3, compact_after=100)
+    assert len(log) == 8
+    assert [e["user"] for e in log] == [f"u{i}" for i in range(8)]
+    assert [e["user"] for e in log[-4:]] == ["u4", "u5", "u6", "u7"]
+    assert log[1]["user"] == "u1"
+    assert log[-1]["user"] == "u7"
+
+
+def test_torn_last_line_is_dropped_and_truncated(tmp_path):
+    log = ConversationLog(str(tmp_path), segment_size=100)
+    fill(log, 3)
+    log.close()
+    path = active_path(str(tmp_path))
+    good_size = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(b'{"timestamp": "2026-01-01T01:00:00", "user": "half')
+
+    log = ConversationLog(str(tmp_path), segment_size=100)
+    assert [e["user"] for e in log] == ["u0", "u1", "u2"]
+    assert os.path.getsize(path) == good_size
+
+    # New entries go after the surviving ones, not after the torn bytes
+    log.append(exchange(3))
+    log.close()
+    log = ConversationLog(str(tmp_path), segment_size=100)
+    assert [e["user"] for e in log] == ["u0", "u1", "u2", "u3"]
+
+
+def test_corrupt_line_drops_it_and_everything_after(tmp_path):
+    log = ConversationLog(str(tmp_path), segment_size=100)
+    fill(log, 2)
+    log.close()
+    with open(active_path(str(tmp_path)), "ab") as f:
+        f.write(b"not json\n")
+        f.write(json.dumps(exchange(9)).encode() + b"\n")
+
+    log = ConversationLog(str(tmp_path), segment_size=100)
+    assert [e["user"] for e in log] == ["u0", "u1"]
+
+
+def test_compaction_merges_segments_without_losing_data(tmp_path):
+    log = ConversationLog(str(tmp_path), segment_size=2, compact_target=5, compact_after=100)
+    fill(log, 11)
+    assert len(log.segments) == 5
+
+    log.compact()
+    assert [s["count"] for s in log.segments] == [4, 4, 2]
+    assert log.segments[0]["first"] == exchange(0)["timestamp"]
+    assert log.segments[-1]["last"] == exchange(9)["timestamp"]
+    assert [e["user"] for e in log] == [f"u{i}" for i in range(11)]
+
+    # Merged-away files are gone and the manifest matches what is on disk
+    files = {name for name in os.listdir(str(tmp_path)) if name.startswith("segment-")}
+    assert files == {s["file"] for s in log.segments} | {log.active_name}
+    log.close()
+    log = ConversationLog(str(tmp_path), segment_size=2, compact_target=5, compact_after=100)
+    assert [e["user"] for e in log] == [f"u{i}" for i in range(11)]
+
+
+def test_compaction_waits_for_open_readers(tmp_path):
+    log = ConversationLog(str(tmp_path), segment_size=2, compact_target=10, compact_after=100)
+    fill(log, 6)
+    reader = iter(log)
+    assert next(reader)["user"] == "u0"
+
+    log.compact()
+    assert [e["user"] for e in reader] == [f"u{i}" for i in range(1, 6)]
+    files = {name for name in os.listdir(str(tmp_path)) if name.startswith("segment-")}
+    assert files == {s["file"] for s in log.segments} | {log.active_name}
+
+
+def test_interrupted_compaction_leftovers_are_removed(tmp_path):
+    log = ConversationLog(str(tmp_path), segment_size=2, compact_after=100)
+    fill(log, 4)
+    log.close()
+    orphan = os.path.join(str(tmp_path), "segment-999999.jsonl.tmp")
+    with open(orphan, "w") as f:
+        f.write(json.dumps(exchange(50)) + "\n")
+
+    log = ConversationLog(str(tmp_path), segment_size=2, compact_after=100)
+    assert not os.path.exists(orphan)
+    assert len(log) == 4
+
+
+def test_since_skips_older_exchanges(tmp_path):
+    log = ConversationLog(str(tmp_path), segment_size=2, compact_after=100)
+    fill(log, 7)
+    assert [e["user"] for e in log.since(exchange(4)["timestamp"])] == ["u5", "u6"]
@@ -0,0 +1,98 @@
+import socket
+import time
+
+import pytest
+
+from model_router import FAST, PRIMARY, ModelRouter
+from ollama_client import OllamaClient, OllamaError
+from ollama_stub import StubOllamaServer
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(reply, prefill_delay=0.0, load_delay=0.0):
+        stub = StubOllamaServer(reply=reply, tokens_per_second=0, prefill_delay=prefill_delay,
+                                load_delay=load_delay)
+        client = OllamaClient(reply.split()[0].lower(), host=stub.start(), timeout=5)
+        started.append((stub, client))
+        return stub, client
+
+    yield start
+    for stub, client in started:
+        client.close()
+        stub.stop()
+
+
+def unreachable_client():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return OllamaClient("down", host=f"http://127.0.0.1:{port}", timeout=1)
+
+
+def test_short_input_goes_straight_to_the_fast_model(servers):
+    primary_stub, primary = servers("Primary reply here.")
+    _, fast = servers("Fast reply.")
+    router = ModelRouter(primary, fast, hedge_after=1.0, fast_max_words=4)
+    assert "".join(router.stream("prompt", "thanks a lot")) == "Fast reply."
+    assert router.last_route["route"] == FAST and router.last_route["winner"] == FAST
+    assert primary_stub.requests == []
+
+
+def test_prompt_primary_is_not_hedged(servers):
+    _, primary = servers("Primary reply here.")
+    fast_stub, fast = servers("Fast reply.")
+    router = ModelRouter(primary, fast, hedge_after=1.0, fast_max_words=2)
+    text, stats = router.generate("prompt", "how was my week do you think")
+    assert text == "Primary reply here."
+    assert router.last_route["winner"] == PRIMARY and router.last_route["hedged"] is None
+    assert stats["eval_tokens"] == 3
+    assert fast_stub.requests == []
+
+
+def test_slow_primary_is_hedged_and_the_fast_model_wins(servers):
+    _, primary = servers("Primary reply here.", prefill_delay=2.0)
+    _, fast = servers("Fast reply.")
+    router = ModelRouter(primary, fast, hedge_after=0.1, fast_max_words=2)
+    assert "".join(router.stream("prompt", "how was my week do you think")) == "Fast reply."
+    assert router.last_route["winner"] == FAST
+    assert router.last_route["hedged"] == "slow"
+    assert router.last_route["latency_ms"] < 1500
+
+
+def test_failed_primary_fails_over_to_the_fast_model(servers):
+    _, fast = servers("Fast reply.")
+    router = ModelRouter(unreachable_client(), fast, hedge_after=5.0, fast_max_words=2)
+    assert "".join(router.stream("prompt", "how was my week do you think")) == "Fast reply."
+    assert router.last_route["winner"] == FAST
+    assert router.last_route["hedged"] == "failed"
+
+
+def test_without_a_fast_model_errors_reach_the_caller():
+    router = ModelRouter(unreachable_client())
+    with pytest.raises((OllamaError, OSError)):
+        "".join(router.stream("prompt", "hi"))
+    assert router.last_route["winner"] is None
+
+
+def test_closing_the_stream_early_clears_the_last_stats(servers):
+    _, primary = servers("Primary reply here.")
+    router = ModelRouter(primary)
+    assert router.generate("prompt", "first turn")[1]["eval_tokens"] == 3
+    stream = router.stream("prompt", "second turn")
+    next(stream)
+    stream.close()  # barge-in: the rest of the reply is not wanted
+    assert router.last_stats == {}
+
+
+def test_preload_loads_the_models_concurrently(servers):
+    primary_stub, primary = servers("Primary reply here.", load_delay=0.5)
+    fast_stub, fast = servers("Fast reply.", load_delay=0.5)
+    router = ModelRouter(primary, fast)
+    started = time.perf_counter()
+    router.preload("system prompt")
+    assert time.perf_counter() - started < 0.9
+    assert [r["prompt"] for r in primary_stub.requests] == ["system prompt"]
+    assert [r["prompt"] for r in fast_stub.requests] == ["system prompt"]
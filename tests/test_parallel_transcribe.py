@@ -0,0 +1,90 @@
+import numpy as np
+
+from parallel_transcribe import ParallelTranscriber, find_silences, plan_chunks, stitch
+
+RATE = 16000
+
+
+def test_stitch_drops_words_repeated_across_a_seam():
+    assert stitch(["I went to the", "to the shop, and then", "and then home."]) == \
+        "I went to the shop, and then home."
+
+
+def test_stitch_ignores_case_and_punctuation_at_the_seam():
+    assert stitch(["She said hello.", "Hello, she said"]) == "She said hello. she said"
+    assert stitch(["my mother", "Mother's doctor"]) == "my mother Mother's doctor"
+
+
+def test_stitch_keeps_a_lone_short_repeat():
+    assert stitch(["I said no", "no to that"]) == "I said no no to that"
+    assert stitch(["and she", "she left"]) == "and she left"
+
+
+def test_stitch_handles_empty_chunks():
+    assert stitch(["", "hello there", "", "there you are"]) == "hello there you are"
+
+
+def test_plan_chunks_cuts_in_the_nearest_pause():
+    spans = plan_chunks(20.0, [(5.5, 5.9), (12.0, 12.4)], chunk_seconds=6.0, overlap=0.3)
+    cuts = [5.7, 12.2]
+    assert len(spans) == 3
+    assert spans[0] == (0.0, cuts[0] + 0.3)
+    assert spans[1] == (cuts[0] - 0.3, cuts[1] + 0.3)
+    assert spans[2] == (cuts[1] - 0.3, 20.0)
+
+
+def test_plan_chunks_cuts_mid_speech_without_pauses_and_covers_everything():
+    spans = plan_chunks(25.0, [], chunk_seconds=6.0, min_chunk=2.0, overlap=0.3)
+    assert spans[0][0] == 0.0 and spans[-1][1] == 25.0
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        assert start < end  # neighbours overlap
+    assert all(end - start >= 2.0 for start, end in spans)
+
+
+def test_plan_chunks_leaves_short_audio_whole():
+    assert plan_chunks(7.5, [(3.0, 3.5)], chunk_seconds=6.0, min_chunk=2.0) == [(0.0, 7.5)]
+
+
+def speech_with_pauses(pattern):
+    """PCM of alternating tones (True) and near-silence (False), one second per entry"""
+    t = np.arange(RATE) / RATE
+    rng = np.random.default_rng(0)
+    parts = [0.3 * np.sin(2 * np.pi * 200 * t) if loud else rng.normal(0, 0.001, RATE) for loud in pattern]
+    return (np.concatenate(parts) * 32767).astype("<i2").tobytes()
+
+
+def test_find_silences_locates_pauses():
+    silences = find_silences(speech_with_pauses([True, True, False, True, False, True]))
+    assert len(silences) == 2
+    assert abs(silences[0][0] - 2.0) < 0.05 and abs(silences[0][1] - 3.0) < 0.05
+    assert abs(silences[1][0] - 4.0) < 0.05 and abs(silences[1][1] - 5.0) < 0.05
+
+
+class FakeEngine:
+    def __init__(self):
+        self.calls = []
+
+    def transcribe_pcm(self, pcm, sample_rate=RATE):
+        seconds = len(pcm) / (2.0 * sample_rate)
+        self.calls.append(seconds)
+        return {"text": f"{seconds:.1f}", "segments": [{"start": 0.0, "end": seconds, "text": ""}],
+                "no_speech_prob": 0.1}
+
+    def stop(self):
+        pass
+
+
+def test_transcriber_offsets_segments_to_the_whole_clip():
+    engines = [FakeEngine(), FakeEngine()]
+    transcriber = ParallelTranscriber(engines, min_seconds=10.0, chunk_seconds=6.0)
+    try:
+        result = transcriber.transcribe_pcm(speech_with_pauses([True] * 5 + [False] + [True] * 6))
+        starts = [segment["start"] for segment in result["segments"]]
+        assert result["chunks"] == len(starts) == 2
+        assert starts[0] == 0.0 and 5.0 < starts[1] < 6.0
+        assert result["segments"][-1]["end"] == 12.0
+
+        short = transcriber.transcribe_pcm(speech_with_pauses([True] * 4))
+        assert "chunks" not in short
+    finally:
+        transcriber.close()
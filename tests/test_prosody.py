@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from audio_capture import SAMPLE_RATE
+from prosody import ProsodyTracker, analyze, format_features
+
+
+def voice(pitch, syllables_per_second, seconds=3.0, glide=1.0, gap=None):
+    """Synthetic speech: a harmonic tone at `pitch` (gliding by a factor of
+    `glide`), with one loudness bump per syllable and optional silence"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = pitch * glide ** (t / seconds)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    tone = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = 0.5 - 0.5 * np.cos(2 * np.pi * syllables_per_second * t)
+    samples = 0.2 * tone * envelope
+    if gap is not None:
+        samples[int(gap[0] * SAMPLE_RATE):int(gap[1] * SAMPLE_RATE)] = 0.0
+    samples += np.random.default_rng(0).normal(0, 1e-4, len(samples))  # room noise
+    return (np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes()
+
+
+@pytest.mark.parametrize("pitch", [110, 180, 250])
+def test_pitch_of_a_steady_tone(pitch):
+    features = analyze(voice(pitch, 4))
+    assert features["pitch_hz"] == pytest.approx(pitch, rel=0.02)
+    assert features["pitch_range_st"] < 0.1
+
+
+def test_gliding_pitch_has_a_range():
+    steady = analyze(voice(150, 4))
+    glide = analyze(voice(150, 4, glide=1.5))  # up seven semitones over the clip
+    assert glide["pitch_range_st"] > steady["pitch_range_st"] + 1.0
+
+
+@pytest.mark.parametrize("rate", [3, 4, 6])
+def test_every_syllable_is_counted(rate):
+    features = analyze(voice(180, rate))
+    # rate_sps is per second of speech; times the speech time it is the syllable count
+    assert round(features["rate_sps"] * features["speech_seconds"]) == pytest.approx(rate * 3, abs=1)
+
+
+def test_faster_speech_has_a_higher_rate():
+    assert analyze(voice(180, 6))["rate_sps"] > analyze(voice(180, 3))["rate_sps"] * 1.5
+
+
+def test_silence_in_the_middle_raises_the_pause_ratio():
+    fluent = analyze(voice(180, 4, seconds=4.0))
+    halting = analyze(voice(180, 4, seconds=4.0, gap=(1.5, 2.5)))
+    assert halting["pause_ratio"] > fluent["pause_ratio"] + 0.05
+
+
+def test_too_little_speech_gives_no_features():
+    assert analyze(bytes(64000)) is None
+    assert analyze(voice(180, 4, seconds=0.2)) is None
+    assert format_features(None) == "too little speech"
+
+
+def test_tracker_describes_a_change_from_the_baseline():
+    usual = analyze(voice(150, 3))
+    tracker = ProsodyTracker(window=3, min_baseline=5)
+    tracker.start_session([{"prosody": usual}] * 5)
+    tracker.add(usual)
+    assert tracker.describe() == ""
+
+    tracker.start_session([{"prosody": usual}] * 5)
+    for _ in range(3):
+        tracker.add(analyze(voice(190, 6)))
+    text = tracker.describe()
+    assert "faster" in text and "higher-pitched" in text
+    assert "stressed or anxious" in text
+
+
+def test_tracker_needs_enough_history_for_a_baseline():
+    tracker = ProsodyTracker(min_baseline=5)
+    tracker.start_session([{"prosody": analyze(voice(150, 3))}] * 4)
+    tracker.add(analyze(voice(220, 6)))
+    assert tracker.baseline is None and tracker.describe() == ""
@@ -0,0 +1,76 @@
+import os
+
+from conversation_log import ConversationLog
+from retrieval import MemoryIndex, query_terms
+
+HISTORY = [
+    ("Mom had a rough night again", "That sounds exhausting."),
+    ("The insurance paperwork is due Friday", "Let's make a plan for the paperwork."),
+    ("Dr. Patel changed Mom's medication", "Changes like that can take time."),
+    ("I made soup for dinner", "That sounds lovely."),
+    ("The medication makes Mom sleepy, and the medication schedule is confusing", "Let's go over it."),
+]
+
+
+def exchange(i, user, assistant):
+    return {"timestamp": f"2026-01-{i + 1:02d}T09:00:00", "user": user, "assistant": assistant}
+
+
+def build(tmp_path, history=HISTORY):
+    log = ConversationLog(str(tmp_path / "log"))
+    for i, (user, assistant) in enumerate(history):
+        log.append(exchange(i, user, assistant))
+    return log, MemoryIndex(str(tmp_path / "index.sqlite"), log)
+
+
+def test_query_terms_drop_stopwords_and_duplicates():
+    assert query_terms("How is Mom's medication, and is the medication working?") == \
+        ["mom's", "medication", "working"]
+
+
+def test_bm25_ranks_the_most_relevant_exchange_first(tmp_path):
+    log, index = build(tmp_path)
+    results = index.search("what about the medication schedule", k=3)
+    assert [r["position"] for r in results][:2] == [4, 2]
+    assert results[0]["score"] > results[1]["score"]
+    assert results[0]["user"] == HISTORY[4][0]
+
+
+def test_search_limits_and_filters(tmp_path):
+    log, index = build(tmp_path)
+    assert index.search("medication", k=1)[0]["position"] == 4
+    assert [r["position"] for r in index.search("medication", before=4)] == [2]
+    assert index.search("the and is", k=3) == []
+    assert index.search("medication", k=0) == []
+
+
+def test_index_is_rebuilt_from_the_history(tmp_path):
+    log, index = build(tmp_path)
+    assert index.search("paperwork")
+    index.close()
+    os.remove(str(tmp_path / "index.sqlite"))
+
+    index = MemoryIndex(str(tmp_path / "index.sqlite"), log)
+    assert [r["position"] for r in index.search("paperwork")] == [1]
+    count = index._connect().execute("SELECT COUNT(*) FROM exchanges").fetchone()[0]
+    assert count == len(HISTORY)
+
+
+def test_index_catches_up_on_exchanges_added_while_it_was_closed(tmp_path):
+    log, index = build(tmp_path)
+    assert index.search("soup")
+    index.close()
+    log.append(exchange(5, "The soup recipe came from Anna", "How kind of her."))
+
+    index = MemoryIndex(str(tmp_path / "index.sqlite"), log)
+    assert [r["position"] for r in index.search("anna")] == [5]
+
+
+def test_add_on_first_open_indexes_the_new_exchange_once(tmp_path):
+    log, _ = build(tmp_path)
+    new = exchange(5, "Anna is visiting on Sunday", "That will be nice.")
+    log.append(new)
+    index = MemoryIndex(str(tmp_path / "fresh.sqlite"), log)
+    index.add(5, new)
+    rows = index._connect().execute("SELECT rowid FROM exchanges ORDER BY rowid").fetchall()
+    assert [rowid for rowid, in rows] == list(range(6))
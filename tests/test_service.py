@@ -0,0 +1,185 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import service
+from service import BACKGROUND, LIVE, Scheduler, ServiceBusy, ServiceServer, read_message, send_message
+
+
+class Gate:
+    """Handler whose batches block until released, recording what ran"""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+
+    def __call__(self, index, payloads):
+        self.batches.append(list(payloads))
+        self.started.release()
+        self.release.wait(5)
+        return [f"done {payload}" for payload in payloads]
+
+
+def occupy(scheduler, gate, count=1):
+    """Submit `count` blocking jobs and wait until all are running"""
+    futures = [scheduler.submit(f"blocker-{i}") for i in range(count)]
+    for _ in range(count):
+        assert gate.started.acquire(timeout=2)
+    return futures
+
+
+def test_live_jobs_overtake_queued_background_jobs():
+    gate = Gate()
+    scheduler = Scheduler("test", gate, workers=1)
+    try:
+        occupy(scheduler, gate)
+        later = [scheduler.submit("summary", BACKGROUND), scheduler.submit("turn-1"), scheduler.submit("turn-2")]
+        gate.release.set()
+        assert [f.result(2) for f in later] == ["done summary", "done turn-1", "done turn-2"]
+        assert gate.batches[1:] == [["turn-1"], ["turn-2"], ["summary"]]
+    finally:
+        scheduler.close()
+
+
+def test_background_work_leaves_one_worker_free_for_live_work():
+    gate = Gate()
+    scheduler = Scheduler("test", gate, workers=2)
+    try:
+        background = [scheduler.submit(f"summary-{i}", BACKGROUND) for i in range(2)]
+        assert gate.started.acquire(timeout=2)
+        assert not gate.started.acquire(timeout=0.2)  # the second worker is held back
+        live = scheduler.submit("turn")
+        assert gate.started.acquire(timeout=2)
+        assert ["turn"] in gate.batches
+        gate.release.set()
+        assert live.result(2) == "done turn"
+        assert [f.result(2) for f in background] == ["done summary-0", "done summary-1"]
+    finally:
+        scheduler.close()
+
+
+def test_batches_only_group_the_same_priority():
+    gate = Gate()
+    scheduler = Scheduler("test", gate, workers=1, batch_size=3)
+    try:
+        occupy(scheduler, gate)
+        for name in ("a", "b"):
+            scheduler.submit(name)
+        scheduler.submit("summary", BACKGROUND)
+        for name in ("c", "d"):
+            scheduler.submit(name)
+        gate.release.set()
+        deadline = time.monotonic() + 2
+        while len(gate.batches) < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert gate.batches[1:] == [["a", "b", "c"], ["d"], ["summary"]]
+    finally:
+        scheduler.close()
+
+
+def test_full_queue_rejects_new_jobs():
+    gate = Gate()
+    scheduler = Scheduler("test", gate, workers=1, max_queue=2)
+    try:
+        occupy(scheduler, gate)
+        scheduler.submit("a")
+        scheduler.submit("b")
+        with pytest.raises(ServiceBusy):
+            scheduler.submit("c")
+    finally:
+        gate.release.set()
+        scheduler.close()
+
+
+def test_handler_errors_reach_every_caller_in_the_batch():
+    def handler(index, payloads):
+        raise RuntimeError("model crashed")
+
+    scheduler = Scheduler("test", handler, workers=1, batch_size=2)
+    try:
+        with pytest.raises(RuntimeError):
+            scheduler.submit("a").result(2)
+    finally:
+        scheduler.close()
+
+
+def test_close_fails_queued_jobs_instead_of_leaving_callers_waiting():
+    gate = Gate()
+    scheduler = Scheduler("test", gate, workers=1)
+    running = occupy(scheduler, gate)[0]
+    queued = [scheduler.submit("turn"), scheduler.submit("summary", BACKGROUND)]
+    threading.Timer(0.2, gate.release.set).start()
+    scheduler.close()
+    for future in queued:
+        with pytest.raises(ServiceBusy):
+            future.result(timeout=1)
+    assert running.result(timeout=1) == "done blocker-0"
+    with pytest.raises(ServiceBusy):
+        scheduler.submit("late")
+
+
+class EchoService:
+    """Stands in for CompanionService: replies with how much audio a turn had"""
+
+    class Session:
+        id = "test"
+
+    def session(self, session_id):
+        return self.Session()
+
+    def handle_turn(self, session, pcm, want_audio=False):
+        return {"type": "reply", "audio_bytes": len(pcm)}, b""
+
+    def summarize(self, session):
+        pass
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    monkeypatch.setattr(service, "MAX_MESSAGE_BYTES", 1000)
+    monkeypatch.setattr(service, "MAX_TURN_BYTES", 2500)
+    server = ServiceServer(EchoService(), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sock = socket.create_connection(server.server_address[:2], timeout=5)
+    stream = sock.makefile("rwb")
+    send_message(stream, {"type": "hello", "session": "test"})
+    assert read_message(stream)[0]["type"] == "ok"
+    yield stream
+    stream.close()
+    sock.close()
+    server.shutdown()
+    server.server_close()
+
+
+def end_turn(stream):
+    send_message(stream, {"type": "end_turn"})
+    return read_message(stream)[0]
+
+
+def test_turn_audio_under_the_limits_is_passed_on(connection):
+    for _ in range(2):
+        send_message(connection, {"type": "audio"}, b"\0" * 1000)
+    assert end_turn(connection) == {"type": "reply", "audio_bytes": 2000}
+
+
+def test_too_long_turn_is_dropped_with_an_error(connection):
+    for _ in range(3):
+        send_message(connection, {"type": "audio"}, b"\0" * 1000)
+    reply = end_turn(connection)
+    assert reply["type"] == "error" and "limit" in reply["message"]
+    # the connection stays usable and the next turn starts empty
+    send_message(connection, {"type": "audio"}, b"\0" * 500)
+    assert end_turn(connection) == {"type": "reply", "audio_bytes": 500}
+
+
+def test_oversized_message_is_skipped_not_buffered(connection):
+    send_message(connection, {"type": "audio"}, b"\0" * 5000)
+    assert end_turn(connection)["type"] == "error"
+    send_message(connection, {"type": "bogus"}, b"\0" * 5000)
+    reply, _ = read_message(connection)
+    assert reply["type"] == "error" and "exceeds" in reply["message"]
+    send_message(connection, {"type": "audio"}, b"\0" * 100)
+    assert end_turn(connection) == {"type": "reply", "audio_bytes": 100}
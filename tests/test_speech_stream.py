@@ -0,0 +1,51 @@
+from speech_stream import SentenceSplitter, SpeechPipeline
+
+
+def test_sentences_come_out_as_soon_as_they_are_complete():
+    splitter = SentenceSplitter()
+    assert splitter.feed("That sounds really ha") == []
+    assert splitter.feed("rd. You are doing ") == ["That sounds really hard."]
+    assert splitter.feed("well!\nTake a break") == ["You are doing well!"]
+    assert splitter.flush() == "Take a break"
+    assert splitter.flush() == ""
+
+
+def test_short_sentences_are_joined_with_the_next():
+    splitter = SentenceSplitter(min_chars=12)
+    assert splitter.feed("Oh. I see what you mean. ") == ["Oh. I see what you mean."]
+
+
+def test_abbreviations_do_not_end_a_sentence():
+    splitter = SentenceSplitter()
+    assert splitter.feed("Call Dr. Patel about it tomorrow. ") == ["Call Dr. Patel about it tomorrow."]
+
+
+def test_words_ending_like_abbreviations_still_end_a_sentence():
+    splitter = SentenceSplitter()
+    assert splitter.feed("You should get some rest. Tomorrow will be better. ") == \
+        ["You should get some rest.", "Tomorrow will be better."]
+    assert splitter.feed("We can sort out these problems. One at a time. ") == \
+        ["We can sort out these problems.", "One at a time."]
+
+
+def test_closing_quotes_stay_with_their_sentence():
+    splitter = SentenceSplitter()
+    assert splitter.feed('She said "I will be fine." Then ') == ['She said "I will be fine."']
+    assert splitter.flush() == "Then"
+
+
+def test_pipeline_drops_the_rest_after_an_interruption():
+    heard = []
+
+    def speak(sentence):
+        heard.append(sentence)
+        return sentence != "Second one."
+
+    pipeline = SpeechPipeline(speak)
+    pipeline.start()
+    for sentence in ("First one.", "Second one.", "Third one."):
+        pipeline.say(sentence)
+    pipeline.finish()
+    assert heard == ["First one.", "Second one."]
+    assert pipeline.spoken == ["First one."]
+    assert pipeline.spoken_text().endswith("...")
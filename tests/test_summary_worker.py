@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+from summary_worker import SummaryWorker
+
+
+class FakeContext:
+    """Records generate_summary() calls; can hold a run open or fail it"""
+
+    def __init__(self, summary_file, ok=True):
+        self.summary_file = summary_file
+        self.ok = ok
+        self.calls = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def generate_summary(self):
+        self.calls.append(time.monotonic())
+        self.entered.set()
+        self.release.wait(5)
+        return self.ok
+
+
+def wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def make_worker(tmp_path, debounce=0.2, max_delay=5.0, **kwargs):
+    context = FakeContext(str(tmp_path / "summary.json"), **kwargs)
+    return context, SummaryWorker(context, debounce=debounce, max_delay=max_delay, retry_delay=5.0)
+
+
+def test_requests_within_the_debounce_are_coalesced(tmp_path):
+    context, worker = make_worker(tmp_path)
+    worker.start()
+    try:
+        requested = time.monotonic()
+        for _ in range(3):
+            worker.request()
+            time.sleep(0.05)
+        assert os.path.exists(worker.pending_file)
+        assert wait_for(lambda: not worker.pending())
+        assert len(context.calls) == 1
+        assert context.calls[0] - requested >= 0.2
+        assert not os.path.exists(worker.pending_file)
+    finally:
+        worker.stop()
+
+
+def test_request_during_a_run_gets_its_own_debounced_run(tmp_path):
+    # The first run starts on its deadline, which has passed once it is done
+    context, worker = make_worker(tmp_path, debounce=0.3, max_delay=0.3)
+    context.release.clear()
+    worker.start()
+    try:
+        worker.request()
+        assert context.entered.wait(2)
+        worker.request()  # new exchange while the first summary is being written
+        finished = time.monotonic()
+        context.release.set()
+        assert wait_for(lambda: len(context.calls) == 2)
+        assert context.calls[1] - finished >= 0.25  # not straight away on the stale deadline
+        assert wait_for(lambda: not worker.pending())
+        assert not os.path.exists(worker.pending_file)
+    finally:
+        worker.stop()
+
+
+def test_postpone_holds_the_run_back_but_not_past_max_delay(tmp_path):
+    context, worker = make_worker(tmp_path, debounce=0.3, max_delay=0.5)
+    worker.start()
+    try:
+        requested = time.monotonic()
+        worker.request()
+        for _ in range(10):  # the user keeps talking
+            time.sleep(0.1)
+            worker.postpone()
+            if context.calls:
+                break
+        assert wait_for(lambda: context.calls)
+        assert 0.45 <= context.calls[0] - requested < 0.9
+    finally:
+        worker.stop()
+
+
+def test_pending_file_from_an_earlier_run_is_picked_up(tmp_path):
+    context, worker = make_worker(tmp_path)
+    worker.request()  # never started, as if the process died here
+    worker.stop()
+    assert os.path.exists(worker.pending_file)
+
+    context, worker = make_worker(tmp_path)
+    assert worker.pending()
+    assert worker.flush(timeout=2)
+    worker.stop()
+    assert len(context.calls) == 1
+    assert not os.path.exists(worker.pending_file)
+
+
+def test_failed_run_keeps_the_request_on_disk(tmp_path):
+    context, worker = make_worker(tmp_path, ok=False)
+    worker.request()
+    assert not worker.flush(timeout=2)
+    worker.stop()
+    assert worker.pending()
+    assert os.path.exists(worker.pending_file)
@@ -0,0 +1,74 @@
+import json
+import os
+import select
+import stat
+import sys
+
+import pytest
+
+from tts import PiperBackend, TextToSpeech
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="needs an executable script as the piper binary")
+
+# Behaves like `piper --json-input --output-raw`: audio for each line on
+# stdout in pieces, then the per-utterance log line on stderr
+FAKE_PIPER = '''
+import json, sys, time
+sys.stderr.write("[piper] [info] Loaded voice\\n"); sys.stderr.flush()
+for line in sys.stdin:
+    text = json.loads(line)["text"]
+    sample = bytes([ord(text[0]), 0])
+    for _ in range(3):
+        sys.stdout.buffer.write(sample * 20000)
+        sys.stdout.buffer.flush()
+        time.sleep(0.02)
+    sys.stderr.write("[piper] [info] Waiting for audio to finish playing...\\n")
+    sys.stderr.write("[piper] [info] Real-time factor: 0.1 (infer=0.01 sec, audio=0.1 sec)\\n")
+    sys.stderr.flush()
+'''
+
+
+@pytest.fixture
+def piper(tmp_path):
+    script = tmp_path / "piper"
+    script.write_text(f"#!{sys.executable}\n" + FAKE_PIPER)
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    model = tmp_path / "voice.onnx"
+    model.write_bytes(b"")
+    (tmp_path / "voice.onnx.json").write_text(json.dumps({"audio": {"sample_rate": 16000}}))
+    backend = PiperBackend(str(model), str(script))
+    yield backend
+    backend.close()
+
+
+def test_utterances_come_back_whole_from_one_resident_process(piper):
+    pcm, rate = piper.synthesize("alpha")
+    assert rate == 16000
+    assert pcm == b"a\0" * 60000
+    process = piper.process
+    assert piper.synthesize("bravo")[0] == b"b\0" * 60000
+    assert piper.process is process or not PiperBackend.resident
+
+
+@pytest.mark.skipif(not hasattr(select, "poll"), reason="resident mode needs select.poll")
+def test_stopping_early_does_not_leak_audio_into_the_next_utterance(piper):
+    stream = piper.stream("alpha")
+    assert next(stream) == 16000
+    assert next(stream).startswith(b"a\0")
+    stream.close()
+    assert piper.synthesize("charlie")[0] == b"c\0" * 60000
+
+
+def test_nothing_is_written_to_disk(piper, tmp_path):
+    before = set(os.listdir(tmp_path))
+    piper.synthesize("delta")
+    assert set(os.listdir(tmp_path)) == before
+
+
+def test_debug_dump_saves_new_lines_only_when_enabled(piper, tmp_path):
+    dumps = tmp_path / "dumps"
+    tts = TextToSpeech(piper, cache=None, dump_dir=str(dumps))
+    tts._dump(*piper.synthesize("echo"))
+    assert len(os.listdir(dumps)) == 1
+    TextToSpeech(piper, cache=None)._dump(b"\0\0", 16000)
+    assert len(os.listdir(dumps)) == 1
@@ -0,0 +1,87 @@
+import numpy as np
+
+from audio_capture import SAMPLE_RATE, SAMPLE_WIDTH
+from wake_word import KeywordSpotter, SlidingWindowDetector
+
+OCCURRENCES = (2.0, 8.5)  # seconds at which the wake word starts in the stream
+
+
+def chirp(seconds=0.6, low=400.0, high=1800.0):
+    """Stand-in wake word: a rising sweep with a syllable-like envelope"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    phase = 2 * np.pi * (low * t + (high - low) * t ** 2 / (2 * seconds))
+    return (0.3 * np.sin(phase) * np.sin(np.pi * t / seconds)).astype(np.float32)
+
+
+def to_pcm(samples):
+    return (np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes()
+
+
+def stream_with_word(seconds=14.0, occurrences=OCCURRENCES):
+    rng = np.random.default_rng(0)
+    samples = rng.normal(0, 0.002, int(seconds * SAMPLE_RATE)).astype(np.float32)
+    word = chirp()
+    for start in occurrences:
+        offset = int(start * SAMPLE_RATE)
+        samples[offset:offset + len(word)] += word
+    return to_pcm(samples)
+
+
+class FakeCapture:
+    """AudioCapture replaying a recording in real time: `step` more bytes arrive per read"""
+
+    def __init__(self, pcm, recorded, step):
+        self.pcm = pcm
+        self.recorded = recorded
+        self.step = step
+
+    def position(self):
+        return self.recorded
+
+    def read(self, start, end, timeout=None):
+        if end > len(self.pcm):
+            return None
+        self.recorded = min(len(self.pcm), max(self.recorded, end) + self.step)
+        return self.pcm[start:end]
+
+
+def make_detector():
+    spotter = KeywordSpotter([chirp()])
+    return SlidingWindowDetector(spotter.detect, window=3.0, hop=0.5)
+
+
+def test_each_occurrence_wakes_exactly_once():
+    wakes, hits = make_detector().scan(stream_with_word())
+    assert len(wakes) == len(OCCURRENCES)
+    assert hits > len(OCCURRENCES)  # several overlapping windows saw each one
+    for wake, start in zip(wakes, OCCURRENCES):
+        assert start < wake <= start + 3.0  # by the first window that holds (most of) the word
+
+
+def test_no_wake_without_the_word():
+    wakes, hits = make_detector().scan(stream_with_word(occurrences=()))
+    assert (wakes, hits) == ([], 0)
+
+
+def test_live_windows_are_deduplicated_like_the_offline_scan():
+    pcm = stream_with_word()
+    detector = make_detector()
+    capture = FakeCapture(pcm, detector.window_bytes, detector.hop_bytes)
+    fired = []
+    while True:
+        window = detector.read(capture)
+        if window is None:
+            break
+        if detector.check(window):
+            fired.append((detector.window_start + len(window)) / SAMPLE_WIDTH / SAMPLE_RATE)
+    assert fired == make_detector().scan(pcm)[0]
+
+
+def test_release_lets_the_next_overlapping_window_fire():
+    pcm = stream_with_word(occurrences=(1.0,))
+    detector = make_detector()
+    window = pcm[:detector.window_bytes]
+    assert detector.check(window, start=0)
+    assert not detector.check(window, start=detector.hop_bytes)
+    detector.release()
+    assert detector.check(window, start=detector.hop_bytes)
@@ -0,0 +1,120 @@
+import json
+import os
+import stat
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from whisper_engine import WhisperEngine, parse_cli_output
+
+# verbose_json as whisper-server returns it: speech, then a hallucination on
+# the trailing silence
+VERBOSE_JSON = {
+    "text": " I slept badly. Mom was up twice. Thank you.",
+    "segments": [
+        {"start": 0.0, "end": 1.4, "text": " I slept badly.", "no_speech_prob": 0.02},
+        {"start": 1.4, "end": 3.1, "text": " Mom was up twice.", "no_speech_prob": 0.1},
+        {"start": 3.1, "end": 5.0, "text": " Thank you.", "no_speech_prob": 0.92},
+    ],
+}
+
+
+class CannedServer:
+    """Answers /inference with a fixed JSON body and keeps the requests it got"""
+
+    def __init__(self, response):
+        requests = self.requests = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                requests.append((self.path, self.rfile.read(int(self.headers["Content-Length"]))))
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def engine(self, **kwargs):
+        engine = WhisperEngine("whisper-cli", "model.bin", port=self.server.server_address[1], **kwargs)
+        engine.start = lambda: True  # the canned server stands in for the resident one
+        return engine
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def canned():
+    server = CannedServer(VERBOSE_JSON)
+    yield server
+    server.close()
+
+
+def test_segment_over_the_no_speech_threshold_is_dropped(canned):
+    engine = canned.engine(no_speech_threshold=0.6)
+    result = engine.transcribe_pcm(bytes(32000))
+    assert result["text"] == "I slept badly. Mom was up twice."
+    assert [s["text"] for s in result["segments"]] == ["I slept badly.", "Mom was up twice."]
+    assert result["no_speech_prob"] == 0.02
+    path, body = canned.requests[0]
+    assert path == "/inference"
+    assert b"verbose_json" in body and b"RIFF" in body
+
+
+def test_without_a_threshold_the_server_text_is_kept(canned):
+    result = canned.engine().transcribe_pcm(bytes(32000))
+    assert result["text"] == "I slept badly. Mom was up twice. Thank you."
+    assert len(result["segments"]) == 3
+
+
+def test_all_silence_leaves_no_text():
+    server = CannedServer({"text": " Thank you.", "segments": [
+        {"start": 0.0, "end": 2.0, "text": " Thank you.", "no_speech_prob": 0.95},
+    ]})
+    try:
+        result = server.engine(no_speech_threshold=0.6).transcribe_pcm(bytes(32000))
+    finally:
+        server.close()
+    assert result == {"text": "", "segments": [], "no_speech_prob": 0.95}
+
+
+def test_cli_output_is_parsed_into_segments():
+    result = parse_cli_output(
+        "\n[00:00:00.000 --> 00:00:01.500]   Good morning.\n"
+        "[00:00:01.500 --> 00:01:02.250]   How are you?\n"
+    )
+    assert result["text"] == "Good morning. How are you?"
+    assert result["segments"][1] == {"start": 1.5, "end": 62.25, "text": "How are you?"}
+    assert result["no_speech_prob"] is None
+
+
+@pytest.mark.skipif(os.name != "posix", reason="needs an executable script as the whisper-cli binary")
+def test_cli_fallback_reads_the_audio_from_stdin(tmp_path):
+    received = tmp_path / "stdin.wav"
+    cli = tmp_path / "whisper-cli"
+    cli.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "assert sys.argv[sys.argv.index('-f') + 1] == '-'\n"
+        f"open({str(received)!r}, 'wb').write(sys.stdin.buffer.read())\n"
+        "print('[00:00:00.000 --> 00:00:01.000]   Hello there.')\n"
+    )
+    cli.chmod(cli.stat().st_mode | stat.S_IEXEC)
+    engine = WhisperEngine(str(cli), "model.bin", use_server=False, no_speech_threshold=0.6)
+    pcm = bytes(range(256)) * 64
+    result = engine.transcribe_pcm(pcm)
+    assert result["text"] == "Hello there."
+    wav = received.read_bytes()
+    assert wav.startswith(b"RIFF") and wav.endswith(pcm)
+    assert sorted(os.listdir(tmp_path)) == ["stdin.wav", "whisper-cli"]
@@ -0,0 +1,453 @@
+import hashlib
+import io
+import json
+import os
+import platform
+import select
+import shutil
+import struct
+import subprocess
+import threading
+import wave
+from collections import OrderedDict
+from datetime import datetime
+
+from metrics import metrics
+
+
+def parse_wav(data):
+    """(pcm, sample_rate) from 16-bit mono WAV bytes.
+
+    espeak --stdout writes a placeholder data size, so frames are read up
+    to whatever is actually there.
+    """
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError("expected 16-bit mono audio")
+        return wav.readframes(wav.getnframes()), wav.getframerate()
+
+
+def to_wav(pcm, sample_rate):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class EspeakBackend:
+    """eSpeak, one short-lived process per utterance (it has no model to load)"""
+
+    name = "espeak"
+
+    def __init__(self, voice=None, rate=175):
+        self.voice = voice
+        self.rate = rate
+        self.voice_id = f"espeak:{voice or 'default'}:{rate}"
+
+    def _command(self, text):
+        cmd = ["espeak", "--stdout", "-s", str(self.rate)]
+        if self.voice:
+            cmd += ["-v", self.voice]
+        return cmd + [text]
+
+    def synthesize(self, text):
+        result = subprocess.run(self._command(text), check=True, capture_output=True)
+        return parse_wav(result.stdout)
+
+    def stream(self, text):
+        """Yield the sample rate, then PCM chunks as eSpeak writes them"""
+        process = subprocess.Popen(self._command(text), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            header = process.stdout.read(44)  # eSpeak writes a plain 44-byte WAV header
+            if len(header) < 44 or header[:4] != b"RIFF" or header[36:40] != b"data":
+                raise RuntimeError("espeak produced no audio")
+            yield struct.unpack_from("<I", header, 24)[0]
+            while True:
+                chunk = process.stdout.read1(8192)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
+    def close(self):
+        pass
+
+
+class PiperBackend:
+    """Piper writing raw PCM to stdout (--output-raw), so no audio touches disk.
+
+    Where pipes can be polled (POSIX), one resident process keeps the voice
+    model loaded between utterances: each request is a JSON line on stdin,
+    the audio streams back on stdout, and the "Real-time factor" line Piper
+    logs on stderr once an utterance's audio is all written marks its end.
+    Elsewhere each utterance runs its own process and ends at EOF.
+    """
+
+    name = "piper"
+    resident = hasattr(select, "poll")
+
+    def __init__(self, model, piper_path="piper"):
+        self.model = model
+        self.piper_path = piper_path
+        self.voice_id = f"piper:{os.path.basename(model)}:{_file_fingerprint(model)}"
+        self.sample_rate = _piper_sample_rate(model)
+        self.process = None
+        self.lock = threading.Lock()
+
+    def _command(self):
+        return [self.piper_path, "--model", self.model, "--json-input", "--output-raw"]
+
+    def start(self):
+        if not self.resident or (self.process is not None and self.process.poll() is None):
+            return
+        self.process = subprocess.Popen(
+            self._command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    def stream(self, text):
+        """Yield the sample rate, then PCM chunks as Piper writes them"""
+        request = json.dumps({"text": text}).encode("utf-8") + b"\n"
+        yield self.sample_rate
+        if not self.resident:
+            yield from self._stream_once(request)
+            return
+        with self.lock:
+            self.start()
+            try:
+                self.process.stdin.write(request)
+                self.process.stdin.flush()
+            except OSError as e:
+                self.close()
+                raise RuntimeError(f"Piper process failed: {e}")
+            finished = False
+            try:
+                for chunk in self._read_utterance():
+                    if chunk is None:
+                        finished = True
+                    else:
+                        yield chunk
+            finally:
+                if not finished:
+                    # Stopped early (or Piper failed): the rest of this utterance would
+                    # be read as the start of the next one
+                    self._discard_utterance()
+
+    def _read_utterance(self, timeout=30.0):
+        """PCM chunks of the current request, then None once Piper reports it done"""
+        poller = select.poll()
+        stdout, stderr = self.process.stdout.fileno(), self.process.stderr.fileno()
+        poller.register(stdout, select.POLLIN)
+        poller.register(stderr, select.POLLIN)
+        log = b""
+        done = False
+        while True:
+            # After the done line only audio already in the pipe is left
+            events = poller.poll(0 if done else timeout * 1000)
+            if not events:
+                if done:
+                    yield None
+                    return
+                raise RuntimeError("Piper timed out")
+            for fd, _ in events:
+                data = os.read(fd, 65536)
+                if not data:
+                    raise RuntimeError("Piper exited without producing audio")
+                if fd == stdout:
+                    yield data
+                else:
+                    log += data
+                    lines = log.split(b"\n")
+                    log = lines.pop()
+                    done = done or any(b"Real-time factor" in line for line in lines)
+
+    def _discard_utterance(self, timeout=2.0):
+        try:
+            for chunk in self._read_utterance(timeout):
+                if chunk is None:
+                    return
+        except (OSError, RuntimeError):
+            pass
+        self.close()
+
+    def _stream_once(self, request):
+        process = subprocess.Popen(self._command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            process.stdin.write(request)
+            process.stdin.close()
+            while True:
+                chunk = process.stdout.read1(8192)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
+    def synthesize(self, text):
+        stream = self.stream(text)
+        sample_rate = next(stream)
+        pcm = b"".join(stream)
+        if not pcm:
+            raise RuntimeError("Piper produced no audio")
+        return pcm, sample_rate
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self.process is not None:
+            self.process.stdout.close()
+            self.process.stderr.close()
+        self.process = None
+
+
+def _piper_sample_rate(model):
+    """Sample rate from the voice's <model>.json config (22050 Hz if unreadable)"""
+    try:
+        with open(model + ".json", "r") as f:
+            return int(json.load(f)["audio"]["sample_rate"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return 22050
+
+
+def _file_fingerprint(path):
+    """Size and mtime, so a replaced voice model doesn't reuse old cached audio"""
+    try:
+        st = os.stat(path)
+        return f"{st.st_size}-{int(st.st_mtime)}"
+    except OSError:
+        return "missing"
+
+
+class AudioCache:
+    """Synthesized audio keyed by a hash of (voice, text): in-memory LRU over WAV files on disk.
+
+    Only entries put with `persist` go to disk (the fixed phrases); one-off
+    replies stay in memory so speaking doesn't write to the SD card.
+    """
+
+    def __init__(self, directory, memory_items=64):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(voice_id, text):
+        return hashlib.sha256(f"{voice_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".wav")
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+        if not self.directory or not os.path.exists(self._path(key)):
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                audio = parse_wav(f.read())
+        except (OSError, ValueError, wave.Error):
+            return None
+        self._remember(key, audio)
+        return audio
+
+    def put(self, key, audio, persist=True):
+        self._remember(key, audio)
+        if not self.directory or not persist:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(to_wav(*audio))
+        os.replace(tmp, path)
+
+    def _remember(self, key, audio):
+        with self.lock:
+            self.memory[key] = audio
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+
+
+def player_command(sample_rate):
+    """Command that plays raw 16-bit mono PCM from stdin, or None if no player is installed"""
+    if platform.system() == "Linux" and shutil.which("aplay"):
+        return ["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-r", str(sample_rate), "-c", "1", "-"]
+    if shutil.which("ffplay"):
+        return ["ffplay", "-nodisp", "-autoexit", "-loglevel", "error",
+                "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "-"]
+    return None
+
+
+class TextToSpeech:
+    """Synthesizes through a backend, caches the audio and plays it.
+
+    Only one utterance plays at a time. stop() kills playback at once and
+    makes further speak() calls return immediately until resume().
+    `on_playback`, if set, is called each time audio starts going to the
+    player. With a `dump_dir`, each newly synthesized line is also saved
+    there as a WAV for debugging.
+    """
+
+    def __init__(self, backend, cache, dump_dir=""):
+        self.backend = backend
+        self.cache = cache
+        self.dump_dir = dump_dir
+        self.dumps = 0
+        self.lock = threading.Lock()
+        self.player = None
+        self.stopped = threading.Event()
+        self.on_playback = None
+
+    def audio_for(self, text, persist=False):
+        """(pcm, sample_rate) for `text`, from the cache when possible"""
+        key = AudioCache.key(self.backend.voice_id, text)
+        audio = self._cached(key)
+        if audio is None:
+            audio = self.backend.synthesize(text)
+            self.cache.put(key, audio, persist)
+        return audio
+
+    def _cached(self, key):
+        audio = self.cache.get(key)
+        metrics.incr("tts_cache", result="miss" if audio is None else "hit")
+        return audio
+
+    def prewarm(self, phrases):
+        """Synthesize fixed phrases in the background so they play without delay"""
+        def run():
+            for phrase in phrases:
+                try:
+                    self.audio_for(phrase, persist=True)
+                except Exception as e:
+                    print(f"Could not pre-synthesize '{phrase}': {e}")
+                    return
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def speak(self, text):
+        """Play `text`. Returns False if stop() cut it off.
+
+        Uncached text from a backend that can stream is piped to the player
+        as it is synthesized, and cached (in memory) once complete.
+        """
+        if self.stopped.is_set():
+            return False
+        if player_command(0) is None:
+            if not isinstance(self.backend, EspeakBackend):
+                raise RuntimeError("no audio player found (install aplay or ffplay)")
+            # Let espeak play it itself, uncached
+            return self._play(["espeak", "-s", str(self.backend.rate), text], [])
+
+        key = AudioCache.key(self.backend.voice_id, text)
+        audio = self._cached(key)
+        if audio is None and hasattr(self.backend, "stream"):
+            stream = self.backend.stream(text)
+            try:
+                sample_rate = next(stream)
+                chunks = []
+                finished = self._play(player_command(sample_rate), stream, chunks)
+            finally:
+                stream.close()
+            if finished and chunks:
+                self.cache.put(key, (b"".join(chunks), sample_rate), persist=False)
+                self._dump(b"".join(chunks), sample_rate)
+            return finished
+        if audio is None:
+            audio = self.backend.synthesize(text)
+            self.cache.put(key, audio, persist=False)
+            self._dump(*audio)
+        pcm, sample_rate = audio
+        return self._play(player_command(sample_rate), [pcm])
+
+    def _dump(self, pcm, sample_rate):
+        if not self.dump_dir:
+            return
+        self.dumps += 1
+        path = os.path.join(self.dump_dir, f"{datetime.now():%Y%m%d-%H%M%S}-tts-{self.dumps:04d}.wav")
+        try:
+            os.makedirs(self.dump_dir, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(to_wav(pcm, sample_rate))
+        except OSError as e:
+            print(f"Could not write debug dump: {e}")
+
+    def _play(self, command, chunks, played=None):
+        """Run the player, feeding it `chunks` of PCM; False if stop() cut it off"""
+        with self.lock:
+            if self.stopped.is_set():
+                return False
+            player = self.player = subprocess.Popen(
+                command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        on_playback = self.on_playback
+        if not chunks and on_playback is not None:
+            on_playback()  # the player makes its own audio (espeak)
+        try:
+            for chunk in chunks:
+                if self.stopped.is_set():
+                    break
+                if on_playback is not None:
+                    # Before the write: a whole cached utterance only fits the pipe as it plays
+                    on_playback()
+                    on_playback = None
+                player.stdin.write(chunk)
+                if played is not None:
+                    played.append(chunk)
+            player.stdin.close()
+        except (BrokenPipeError, OSError):
+            # Killed by stop(), or the player died: what was sent isn't a whole utterance
+            if played is not None:
+                played.clear()
+        player.wait()
+        with self.lock:
+            self.player = None
+        if self.stopped.is_set():
+            return False
+        if player.returncode != 0:
+            print(f"Audio player exited with status {player.returncode}")
+        return True
+
+    def stop(self):
+        with self.lock:
+            self.stopped.set()
+            if self.player is not None and self.player.poll() is None:
+                self.player.kill()
+
+    def resume(self):
+        self.stopped.clear()
+
+    def close(self):
+        self.stop()
+        self.backend.close()
+
+
+def create_backend(engine="auto", piper_model="", piper_path="piper"):
+    """Piper when a voice model is configured and the binary exists, otherwise eSpeak"""
+    if engine in ("auto", "piper") and piper_model and os.path.exists(piper_model) and shutil.which(piper_path):
+        return PiperBackend(piper_model, piper_path)
+    if engine == "piper":
+        print(f"Piper not available (model '{piper_model}', binary '{piper_path}'), using eSpeak")
+    return EspeakBackend()
@@ -0,0 +1,271 @@
+import threading
+import time
+
+import numpy as np
+
+from audio_capture import SAMPLE_RATE, SAMPLE_WIDTH
+
+
+def pcm_to_float(pcm):
+    """16-bit PCM bytes to a new float32 array in [-1, 1); the PCM is read in place"""
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+    samples /= 32768.0
+    return samples
+
+
+def frame_features(pcm, sample_rate=SAMPLE_RATE, frame_ms=20):
+    """Per-frame energy (dBFS) and zero-crossing rate, computed for all frames at once"""
+    samples = pcm_to_float(pcm)
+    frame_len = sample_rate * frame_ms // 1000
+    count = len(samples) // frame_len
+    if count == 0:
+        return np.empty(0, np.float32), np.empty(0, np.float32)
+    frames = samples[:count * frame_len].reshape(count, frame_len)
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_len - 1)
+    return energy_db, zcr
+
+
+class Endpointer:
+    """Decides when an utterance has started and ended from streamed PCM.
+
+    A frame counts as speech when its energy is `margin_db` above the
+    tracked noise floor, or slightly less loud but with a high zero-crossing
+    rate (unvoiced consonants like "s" and "f"). The utterance ends after
+    `trailing_silence` seconds without speech, or at `max_seconds`.
+    """
+
+    WAITING = "waiting"
+    SPEECH = "speech"
+    DONE = "done"
+    NO_SPEECH = "no_speech"
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=20, trailing_silence=0.8,
+                 max_seconds=20.0, no_speech_timeout=8.0, min_speech=0.2,
+                 margin_db=10.0, zcr_threshold=0.3, floor_db=-60.0, noise_floor=None):
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * SAMPLE_WIDTH
+        self.trailing_frames = int(trailing_silence * 1000 / frame_ms)
+        self.max_frames = int(max_seconds * 1000 / frame_ms)
+        self.no_speech_frames = int(no_speech_timeout * 1000 / frame_ms)
+        self.min_speech_frames = max(1, int(min_speech * 1000 / frame_ms))
+        self.margin_db = margin_db
+        self.zcr_threshold = zcr_threshold
+        self.noise_floor = noise_floor  # measured from the first audio fed if not given
+        self.min_floor = floor_db
+        self.pending = b""
+        self.frames_seen = 0
+        self.speech_run = 0
+        self.silence_run = 0
+        self.speech_start = None  # frame index
+        self.speech_end = None
+        self.state = self.WAITING
+
+    def process(self, pcm):
+        """Feed more audio and return the current state"""
+        if self.state in (self.DONE, self.NO_SPEECH):
+            return self.state
+        data = self.pending + bytes(pcm) if self.pending else pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self.pending = bytes(data[usable:])
+        energy_db, zcr = frame_features(data[:usable], frame_ms=self.frame_ms)
+        if self.noise_floor is None and len(energy_db):
+            self.noise_floor = max(float(np.percentile(energy_db, 10)), self.min_floor)
+
+        for energy, crossings in zip(energy_db.tolist(), zcr.tolist()):
+            self._frame(energy, crossings)
+            if self.state in (self.DONE, self.NO_SPEECH):
+                break
+        return self.state
+
+    def _frame(self, energy, crossings):
+        index = self.frames_seen
+        self.frames_seen += 1
+        threshold = self.noise_floor + self.margin_db
+        is_speech = energy > threshold or (
+            energy > threshold - self.margin_db / 2 and crossings > self.zcr_threshold
+        )
+
+        if not is_speech:
+            # Track the floor slowly so steady background noise isn't treated as speech
+            self.noise_floor = max(self.min_floor, 0.95 * self.noise_floor + 0.05 * energy)
+
+        if self.state == self.WAITING:
+            self.speech_run = self.speech_run + 1 if is_speech else 0
+            if self.speech_run >= self.min_speech_frames:
+                self.state = self.SPEECH
+                self.speech_start = index - self.speech_run + 1
+                self.speech_end = index + 1
+            elif index + 1 >= self.no_speech_frames:
+                self.state = self.NO_SPEECH
+            return
+
+        if is_speech:
+            self.silence_run = 0
+            self.speech_end = index + 1
+        else:
+            self.silence_run += 1
+        if self.silence_run >= self.trailing_frames or index + 1 - self.speech_start >= self.max_frames:
+            self.state = self.DONE
+
+    def speech_range_bytes(self):
+        """Byte offsets (relative to the first byte fed) of the detected speech"""
+        if self.speech_start is None:
+            return None
+        return self.speech_start * self.frame_bytes, self.speech_end * self.frame_bytes
+
+
+def capture_utterance(capture, trailing_silence=0.8, max_seconds=20.0, no_speech_timeout=8.0,
+                      preroll=0.3, tail=0.2, chunk_seconds=0.1, start=None, noise_floor=None):
+    """Read from an AudioCapture until the user stops talking.
+
+    Starts at the current position, or at the earlier buffered position
+    `start` (e.g. where the user barged in). Returns a zero-copy view of the
+    utterance (with a little audio kept either side), or None if nobody
+    spoke before `no_speech_timeout`.
+    """
+    endpointer = Endpointer(
+        sample_rate=capture.sample_rate,
+        trailing_silence=trailing_silence,
+        max_seconds=max_seconds,
+        no_speech_timeout=no_speech_timeout,
+        noise_floor=noise_floor,
+    )
+    origin = capture.position() if start is None else start
+    chunk = capture.seconds_to_bytes(chunk_seconds)
+    pos = origin
+    while True:
+        view = capture.read(pos, pos + chunk)
+        if view is None:
+            return None
+        pos += chunk
+        state = endpointer.process(view)
+        if state == Endpointer.NO_SPEECH:
+            return None
+        if state == Endpointer.DONE:
+            break
+
+    start, end = endpointer.speech_range_bytes()
+    # Pre-roll may reach back before `origin`; read() clamps it to what's buffered
+    start = origin + start - capture.seconds_to_bytes(preroll)
+    end = min(origin + end + capture.seconds_to_bytes(tail), pos)
+    return capture.read(start, end)
+
+
+class BargeInDetector:
+    """Spots the user talking over the bot's own voice.
+
+    The microphone also hears the speaker, so frames are judged against an
+    echo floor rather than the room's noise floor. For the first
+    `calibration` seconds of playback the floor follows the loudest frames
+    (the bot as heard by the mic); after that it decays slowly and quieter
+    frames can push it up by at most 1 dB per frame, so a user getting
+    louder over a few frames isn't absorbed into it. A barge-in is
+    `min_speech` seconds of frames at least `margin_db` above the floor.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=20, margin_db=10.0, min_speech=0.08,
+                 calibration=0.25, decay_db_per_second=3.0, floor_db=-55.0):
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * SAMPLE_WIDTH
+        self.margin_db = margin_db
+        self.min_speech_frames = max(1, int(min_speech * 1000 / frame_ms))
+        self.calibration_frames = int(calibration * 1000 / frame_ms)
+        self.decay = decay_db_per_second * frame_ms / 1000
+        self.min_floor = floor_db
+        self.floor = floor_db
+        self.pending = b""
+        self.frames_seen = 0
+        self.speech_run = 0
+        self.speech_start = None  # frame index
+
+    def process(self, pcm):
+        """Feed more audio; True once the user has started talking"""
+        if self.speech_start is not None:
+            return True
+        data = self.pending + bytes(pcm) if self.pending else pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self.pending = bytes(data[usable:])
+        energy_db, _ = frame_features(data[:usable], frame_ms=self.frame_ms)
+
+        for energy in energy_db.tolist():
+            index = self.frames_seen
+            self.frames_seen += 1
+            if index < self.calibration_frames:
+                self.floor = max(self.floor, energy)
+                continue
+            if energy > self.floor + self.margin_db:
+                self.speech_run += 1
+                if self.speech_run >= self.min_speech_frames:
+                    self.speech_start = index - self.speech_run + 1
+                    return True
+            else:
+                self.speech_run = 0
+                self.floor = max(self.min_floor, self.floor - self.decay, min(energy, self.floor + 1.0))
+        return False
+
+
+class BargeInMonitor:
+    """Watches an AudioCapture on a background thread while the bot is speaking.
+
+    Nothing is judged until playback_started() is called when the first
+    audio actually plays: the echo floor is calibrated on the bot's voice,
+    not on the silent room while the reply is still being generated, and
+    audio captured before then is ignored. Calls `on_speech` (which should
+    stop playback) as soon as the user starts talking. Afterwards
+    `speech_start` is the capture position where their speech began, so
+    the next utterance can be read from there without losing its first
+    words.
+    """
+
+    def __init__(self, capture, on_speech, margin_db=10.0, chunk_seconds=0.02):
+        self.capture = capture
+        self.on_speech = on_speech
+        self.detector = BargeInDetector(sample_rate=capture.sample_rate, margin_db=margin_db)
+        self.chunk = capture.seconds_to_bytes(chunk_seconds)
+        self.triggered = threading.Event()
+        self.stopped = threading.Event()
+        self.playing = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.origin = None  # capture position where playback began
+        self.noise_floor = None
+        self.speech_start = None
+        self.stop_latency = None  # seconds from the user's first word until playback was stopped
+
+    def start(self):
+        # Room noise before playback starts, for endpointing the user's interruption
+        energy_db, _ = frame_features(self.capture.latest(1.0))
+        if len(energy_db):
+            self.noise_floor = max(float(np.percentile(energy_db, 10)), -60.0)
+        self.thread.start()
+
+    def playback_started(self):
+        """Call when the reply's first audio starts playing; later calls are ignored"""
+        if not self.playing.is_set():
+            self.origin = self.capture.position()
+            self.playing.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join(timeout=1)
+
+    def _run(self):
+        while not self.playing.wait(0.05):
+            if self.stopped.is_set():
+                return
+        pos = self.origin
+        while not self.stopped.is_set():
+            view = self.capture.read(pos, pos + self.chunk, timeout=0.5)
+            if view is None:
+                if self.capture.running:
+                    continue
+                return
+            pos += self.chunk
+            if self.detector.process(view):
+                self.speech_start = self.origin + self.detector.speech_start * self.detector.frame_bytes
+                onset = time.perf_counter() - (self.capture.position() - self.speech_start) / self.capture.bytes_per_second
+                self.triggered.set()
+                self.on_speech()
+                self.stop_latency = time.perf_counter() - onset
+                return
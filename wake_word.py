@@ -0,0 +1,432 @@
+import glob
+import json
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+from audio_capture import SAMPLE_RATE, SAMPLE_WIDTH
+from vad import frame_features, pcm_to_float
+
+
+def _mel_filterbank(sample_rate, n_fft, n_mels):
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    mels = np.linspace(hz_to_mel(60.0), hz_to_mel(sample_rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mels) / sample_rate).astype(int)
+    bank = np.zeros((n_mels, n_fft // 2 + 1), np.float32)
+    for m in range(1, n_mels + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        if center > left:
+            bank[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            bank[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+    return bank
+
+
+def _dct_matrix(n_in, n_out):
+    k = np.arange(n_out)[:, None]
+    n = np.arange(n_in)[None, :]
+    return (np.cos(np.pi * k * (2 * n + 1) / (2 * n_in)) * np.sqrt(2.0 / n_in)).astype(np.float32)
+
+
+_N_FFT = 512
+_MEL_BANK = _mel_filterbank(SAMPLE_RATE, _N_FFT, 26)
+_DCT = _dct_matrix(26, 13)
+
+
+def mfcc(samples, sample_rate=SAMPLE_RATE, frame_ms=25, hop_ms=10):
+    """MFCCs 1-12 per 10 ms frame.
+
+    c0 (overall loudness) is dropped so distance to a template doesn't
+    depend on how loudly the wake word was said. No per-window mean
+    normalisation is applied because windows are mostly silence.
+    """
+    frame_len = sample_rate * frame_ms // 1000
+    hop = sample_rate * hop_ms // 1000
+    if len(samples) < frame_len:
+        return np.empty((0, 12), np.float32)
+    emphasized = np.append(samples[0], samples[1:] - 0.97 * samples[:-1]).astype(np.float32)
+    count = 1 + (len(emphasized) - frame_len) // hop
+    frames = np.lib.stride_tricks.sliding_window_view(emphasized, frame_len)[::hop][:count]
+    spectrum = np.abs(np.fft.rfft(frames * np.hamming(frame_len).astype(np.float32), _N_FFT)) ** 2
+    mel = spectrum @ _MEL_BANK.T
+    # Limit each frame to 40 dB of dynamic range so near-empty bands (digital
+    # silence vs. room noise) don't dominate the distance
+    mel = np.maximum(mel, mel.max(axis=1, keepdims=True) * 1e-4 + 1e-10)
+    return (np.log(mel) @ _DCT.T)[:, 1:]
+
+
+def subsequence_dtw(template, window):
+    """Best average per-frame distance of `template` aligned anywhere inside `window`.
+
+    Steps are restricted to (1,1), (1,2) and (2,1) so each template row only
+    depends on earlier rows and can be computed with whole-row numpy ops.
+    """
+    n, m = len(template), len(window)
+    if n < 2 or m < 2:
+        return np.inf
+    cost = np.sqrt(((template[:, None, :] - window[None, :, :]) ** 2).sum(axis=2))
+    acc = np.full((n, m), np.inf, np.float32)
+    acc[0] = cost[0]  # the keyword may start at any frame of the window
+    acc[1, 1:] = cost[1, 1:] + acc[0, :-1]
+    acc[1, 2:] = np.minimum(acc[1, 2:], cost[1, 2:] + acc[0, :-2])
+    for i in range(2, n):
+        best = np.full(m, np.inf, np.float32)
+        best[1:] = acc[i - 1, :-1]
+        best[2:] = np.minimum(best[2:], acc[i - 1, :-2])
+        best[1:] = np.minimum(best[1:], acc[i - 2, :-1])
+        acc[i] = cost[i] + best
+    return float(acc[-1].min() / n)
+
+
+def trim_silence(samples, sample_rate=SAMPLE_RATE, margin_db=15.0):
+    """Cut leading/trailing silence off an enrolment recording"""
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes()
+    energy_db, _ = frame_features(pcm, sample_rate)
+    if not len(energy_db):
+        return samples
+    voiced = np.nonzero(energy_db > energy_db.max() - margin_db)[0]
+    frame = sample_rate * 20 // 1000
+    return samples[max(0, voiced[0] - 5) * frame:(voiced[-1] + 6) * frame]
+
+
+def load_wav(path, sample_rate=SAMPLE_RATE):
+    """Read a 16-bit WAV as mono float32 at `sample_rate`"""
+    with wave.open(path, "rb") as wav:
+        channels = wav.getnchannels()
+        rate = wav.getframerate()
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit WAV is supported")
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+    samples = samples.reshape(-1, channels).mean(axis=1).astype(np.float32) / 32768.0
+    if rate != sample_rate and len(samples):
+        positions = np.arange(0, len(samples), rate / sample_rate)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+    return samples
+
+
+class KeywordSpotter:
+    """Cheap wake-word detector: MFCC + DTW against a few enrolled recordings.
+
+    Silent windows are rejected from frame energy alone, so an empty room
+    costs almost nothing. Whisper is only needed to confirm a detection.
+    """
+
+    def __init__(self, templates, threshold=None, min_speech_db=-45.0):
+        self.templates = [mfcc(t) for t in templates]
+        self.templates = [t for t in self.templates if len(t) >= 10]
+        self.min_speech_db = min_speech_db
+        self.threshold = threshold if threshold is not None else self._auto_threshold()
+        self.last_score = None
+
+    @classmethod
+    def from_directory(cls, directory, threshold=None):
+        """Load enrolled recordings from `directory`, or None if there are none"""
+        paths = sorted(glob.glob(os.path.join(directory, "*.wav")))
+        if not paths:
+            return None
+        if threshold is None:
+            threshold = _saved_threshold(directory)
+        spotter = cls([load_wav(p) for p in paths], threshold)
+        return spotter if spotter.templates else None
+
+    def _auto_threshold(self):
+        # Enrolled samples of the same word should match each other; allow some slack on top
+        if len(self.templates) < 2:
+            return 6.0
+        scores = [
+            subsequence_dtw(a, b)
+            for i, a in enumerate(self.templates)
+            for j, b in enumerate(self.templates)
+            if i != j
+        ]
+        return float(np.max(scores) * 1.25)
+
+    def score(self, pcm):
+        """Lowest DTW distance to any template (inf for silence)"""
+        energy_db, _ = frame_features(pcm)
+        if not len(energy_db) or energy_db.max() < self.min_speech_db:
+            return np.inf
+        features = mfcc(pcm_to_float(pcm))
+        return min(subsequence_dtw(t, features) for t in self.templates)
+
+    def detect(self, pcm):
+        """True if the wake word probably occurs in this PCM window"""
+        self.last_score = self.score(pcm)
+        return self.last_score <= self.threshold
+
+
+class SlidingWindowDetector:
+    """Runs a window detector over continuous audio in overlapping windows.
+
+    A window of `window` seconds is checked every `hop` seconds, so a wake
+    word straddling one window's edge is whole in the next, and is found
+    about `hop` seconds after it ends instead of up to `window` seconds.
+    After a detection, windows overlapping the one that fired are skipped
+    so one utterance gives one wake; release() lifts that early (e.g. when
+    Whisper doesn't confirm the wake word).
+    """
+
+    def __init__(self, detect, window=3.0, hop=1.0, sample_rate=SAMPLE_RATE):
+        self.detect = detect  # callable(pcm) -> bool
+        self.window_bytes = int(window * sample_rate) * SAMPLE_WIDTH
+        self.hop_bytes = max(1, int(min(hop, window) * sample_rate)) * SAMPLE_WIDTH
+        self.sample_rate = sample_rate
+        self.cursor = None        # stream position (bytes) where the next window starts
+        self.window_start = None
+        self.suppress_until = 0   # stream position the last detection's window ended at
+
+    def read(self, capture):
+        """Next overlapping window from an AudioCapture (waits until it is recorded), or None"""
+        position = capture.position()
+        if self.cursor is None:
+            self.cursor = max(0, position - self.window_bytes)
+        elif position - self.cursor > self.window_bytes + self.hop_bytes:
+            # Fell behind (slow detector or busy caller): skip to the most recent window
+            self.cursor = position - self.window_bytes
+        start = self.cursor
+        pcm = capture.read(start, start + self.window_bytes)
+        if pcm is None:
+            return None
+        self.window_start = start
+        self.cursor = start + self.hop_bytes
+        return pcm
+
+    def check(self, pcm, start=None):
+        """Run the detector on one window unless it overlaps the last detection"""
+        start = self.window_start if start is None else start
+        if start is not None and start < self.suppress_until:
+            return False
+        if not self.detect(pcm):
+            return False
+        self.suppress_until = (start or 0) + len(pcm)
+        return True
+
+    def release(self):
+        self.suppress_until = 0
+
+    def reset(self):
+        """Start again from live audio (e.g. after a conversation)"""
+        self.cursor = None
+        self.window_start = None
+        self.release()
+
+    def scan(self, pcm):
+        """Offline: (stream times in seconds at which wakes fire, raw window hits before dedup)"""
+        last = max(0, len(pcm) - self.window_bytes)
+        hits = [start for start in range(0, last + 1, self.hop_bytes)
+                if self.detect(pcm[start:start + self.window_bytes])]
+        wakes, suppress_until = [], 0
+        for start in hits:
+            if start >= suppress_until:
+                end = min(start + self.window_bytes, len(pcm))
+                wakes.append(end / SAMPLE_WIDTH / self.sample_rate)
+                suppress_until = end
+        return wakes, len(hits)
+
+
+THRESHOLD_FILE = "threshold.json"
+
+
+def _saved_threshold(directory):
+    path = os.path.join(directory, THRESHOLD_FILE)
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f).get("threshold")
+        except (OSError, ValueError):
+            pass
+    return None
+
+
+def save_threshold(directory):
+    """Calibrate the threshold from every template in `directory` and save it there"""
+    paths = sorted(glob.glob(os.path.join(directory, "*.wav")))
+    if not paths:
+        return None
+    threshold = KeywordSpotter([load_wav(p) for p in paths]).threshold
+    with open(os.path.join(directory, THRESHOLD_FILE), "w") as f:
+        json.dump({"threshold": threshold, "templates": len(paths)}, f, indent=2)
+    return threshold
+
+
+def evaluate(spotter, sample_dir):
+    """False-accept/false-reject and CPU cost over positive/ and negative/ WAV folders"""
+    results = {"positive": [], "negative": []}
+    audio_seconds = 0.0
+    cpu_start = time.process_time()
+    for label in results:
+        for path in sorted(glob.glob(os.path.join(sample_dir, label, "*.wav"))):
+            samples = load_wav(path)
+            audio_seconds += len(samples) / SAMPLE_RATE
+            pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes()
+            results[label].append((os.path.basename(path), spotter.detect(pcm), spotter.last_score))
+    cpu_seconds = time.process_time() - cpu_start
+
+    positives, negatives = results["positive"], results["negative"]
+    rejected = [name for name, hit, _ in positives if not hit]
+    accepted = [name for name, hit, _ in negatives if hit]
+    return {
+        "threshold": spotter.threshold,
+        "positives": len(positives),
+        "negatives": len(negatives),
+        "false_reject_rate": len(rejected) / len(positives) if positives else None,
+        "false_accept_rate": len(accepted) / len(negatives) if negatives else None,
+        "false_rejects": rejected,
+        "false_accepts": accepted,
+        "audio_seconds": round(audio_seconds, 2),
+        "cpu_seconds": round(cpu_seconds, 3),
+        "cpu_seconds_per_audio_hour": round(cpu_seconds / audio_seconds * 3600, 2) if audio_seconds else None,
+        "scores": {label: [(name, score) for name, _, score in items] for label, items in results.items()},
+    }
+
+
+def _boundary_streams(positives, background, window, offsets=(-0.4, -0.2, 0.0, 0.2, 0.4)):
+    """Streams with one wake word centred on (or near) the edge between two disjoint windows.
+
+    Yields (samples, end of the wake word in seconds).
+    """
+    length = int(3 * window * SAMPLE_RATE)
+    for word in positives:
+        for offset in offsets:
+            stream = background[:length].copy()
+            centre = int((2 * window + offset) * SAMPLE_RATE)
+            start = max(0, centre - len(word) // 2)
+            word = word[:length - start]
+            stream[start:start + len(word)] += word
+            yield stream, (start + len(word)) / SAMPLE_RATE
+
+
+def evaluate_boundaries(spotter, sample_dir, window=3.0, hop=1.0):
+    """Misses, wake latency and duplicate wakes for back-to-back vs overlapping windows.
+
+    Each positive sample is mixed into background audio (the negatives, or
+    faint noise) so that it straddles a window boundary, then scanned both
+    ways with the same spotter.
+    """
+    positives = [trim_silence(load_wav(p)) for p in sorted(glob.glob(os.path.join(sample_dir, "positive", "*.wav")))]
+    negatives = [load_wav(p) for p in sorted(glob.glob(os.path.join(sample_dir, "negative", "*.wav")))]
+    length = int(3 * window * SAMPLE_RATE)
+    background = np.concatenate(negatives) if negatives else np.zeros(0, dtype=np.float32)
+    if len(background) < length:
+        noise = np.random.default_rng(0).normal(0, 0.001, length - len(background)).astype(np.float32)
+        background = np.concatenate([background, noise])
+
+    report = {"window": window, "hop": hop, "streams": 0}
+    schemes = {"back_to_back": SlidingWindowDetector(spotter.detect, window, window),
+               "overlapping": SlidingWindowDetector(spotter.detect, window, hop)}
+    results = {name: {"missed": 0, "latencies": [], "wakes": 0, "raw_hits": 0, "cpu_seconds": 0.0}
+               for name in schemes}
+    for stream, word_end in _boundary_streams(positives, background, window):
+        report["streams"] += 1
+        pcm = (np.clip(stream, -1, 1) * 32767).astype("<i2").tobytes()
+        for name, detector in schemes.items():
+            result = results[name]
+            cpu_start = time.process_time()
+            wakes, hits = detector.scan(pcm)
+            result["cpu_seconds"] += time.process_time() - cpu_start
+            result["wakes"] += len(wakes)
+            result["raw_hits"] += hits
+            after = [t for t in wakes if t >= word_end - 0.05]
+            if after:
+                result["latencies"].append(after[0] - word_end)
+            else:
+                result["missed"] += 1
+    for name, result in results.items():
+        latencies = sorted(result.pop("latencies"))
+        streams = report["streams"] or 1
+        result["miss_rate"] = result["missed"] / streams
+        result["mean_latency"] = round(float(np.mean(latencies)), 3) if latencies else None
+        result["p95_latency"] = round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 3) if latencies else None
+        result["wakes_per_stream"] = round(result["wakes"] / streams, 2)
+        result["cpu_seconds"] = round(result["cpu_seconds"], 3)
+        report[name] = result
+    return report
+
+
+def enroll(directory, count=5, seconds=2.0):
+    """Record a few samples of the wake word to use as templates"""
+    from audio_capture import write_wav
+    from main import WAKE_WORD, record_audio
+
+    os.makedirs(directory, exist_ok=True)
+    existing = len(glob.glob(os.path.join(directory, "*.wav")))
+    for i in range(count):
+        input(f"[{i + 1}/{count}] Press Enter, then say '{WAKE_WORD}'...")
+        pcm = record_audio(seconds)
+        if not pcm:
+            print("Recording failed, skipping")
+            continue
+        samples = trim_silence(pcm_to_float(pcm))
+        out = os.path.join(directory, f"sample_{existing + i + 1:02d}.wav")
+        write_wav((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes(), out)
+        print(f"Saved {out} ({len(samples) / SAMPLE_RATE:.2f}s)")
+    threshold = save_threshold(directory)
+    if threshold is not None:
+        print(f"Threshold {threshold:.3f} saved to {os.path.join(directory, THRESHOLD_FILE)}")
+
+
+def print_boundary_report(report):
+    print(f"{report['streams']} streams with the wake word across a window edge "
+          f"({report['window']:g}s windows, {report['hop']:g}s hop when overlapping)")
+    print(f"{'':14s} {'missed':>8s} {'mean latency':>13s} {'p95 latency':>12s} {'wakes/stream':>13s} {'raw hits':>9s} {'CPU s':>7s}")
+    for name in ("back_to_back", "overlapping"):
+        r = report[name]
+        mean = f"{r['mean_latency']:.2f}s" if r["mean_latency"] is not None else "-"
+        p95 = f"{r['p95_latency']:.2f}s" if r["p95_latency"] is not None else "-"
+        print(f"{name:14s} {r['miss_rate']:8.0%} {mean:>13s} {p95:>12s} {r['wakes_per_stream']:13.2f} "
+              f"{r['raw_hits']:9d} {r['cpu_seconds']:7.2f}")
+    with open("wake_word_boundary_report.json", "w") as f:
+        json.dump(report, f, indent=2)
+    print("Full report written to wake_word_boundary_report.json")
+
+
+def main():
+    from main import LISTEN_DURATION, WAKE_HOP_SECONDS, WAKE_WORD_TEMPLATES, WAKE_WORD_THRESHOLD
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("enroll", "report", "boundary"):
+        print("Usage:")
+        print("  python wake_word.py enroll [count]         record wake-word templates")
+        print("  python wake_word.py report <sample_dir>    evaluate on <sample_dir>/positive and /negative")
+        print("  python wake_word.py boundary <sample_dir>  wake words straddling window edges:")
+        print("                                             back-to-back vs overlapping windows")
+        return
+
+    if sys.argv[1] == "enroll":
+        enroll(WAKE_WORD_TEMPLATES, int(sys.argv[2]) if len(sys.argv) > 2 else 5)
+        return
+
+    spotter = KeywordSpotter.from_directory(WAKE_WORD_TEMPLATES, WAKE_WORD_THRESHOLD)
+    if spotter is None:
+        print(f"No templates in {WAKE_WORD_TEMPLATES}. Run: python wake_word.py enroll")
+        return
+    sample_dir = sys.argv[2] if len(sys.argv) > 2 else "wake_word_samples"
+    if sys.argv[1] == "boundary":
+        print_boundary_report(evaluate_boundaries(spotter, sample_dir, LISTEN_DURATION, WAKE_HOP_SECONDS))
+        return
+    report = evaluate(spotter, sample_dir)
+    print(f"Threshold:          {report['threshold']:.3f}")
+    print(f"Samples:            {report['positives']} positive, {report['negatives']} negative "
+          f"({report['audio_seconds']:.1f}s of audio)")
+    if report["false_reject_rate"] is not None:
+        print(f"False reject rate:  {report['false_reject_rate']:.1%} {report['false_rejects']}")
+    if report["false_accept_rate"] is not None:
+        print(f"False accept rate:  {report['false_accept_rate']:.1%} {report['false_accepts']}")
+    if report["cpu_seconds_per_audio_hour"] is not None:
+        per_hour = report["cpu_seconds_per_audio_hour"]
+        print(f"CPU per hour:       {per_hour:.1f} CPU-seconds per hour of audio "
+              f"({per_hour / 36:.2f}% of one core)")
+    with open("wake_word_report.json", "w") as f:
+        json.dump(report, f, indent=2)
+    print("Full report written to wake_word_report.json")
+
+
+if __name__ == "__main__":
+    main()
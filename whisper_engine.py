@@ -0,0 +1,345 @@
+import atexit
+import http.client
+import io
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import wave
+
+from metrics import metrics
+
+
+# whisper-cli's result lines: "[00:00:01.240 --> 00:00:03.800]  some text"
+_CLI_SEGMENT = re.compile(r"^\[(\d+):(\d+):([\d.]+) --> (\d+):(\d+):([\d.]+)\]\s*(.*)$")
+
+
+def pcm_to_wav(pcm, sample_rate=16000):
+    """WAV file bytes for 16-bit mono PCM, built in memory"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def _seconds(hours, minutes, seconds):
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def parse_cli_output(stdout):
+    """Transcript dict from whisper-cli's timestamped stdout (it has no no-speech probability)"""
+    segments = []
+    for line in stdout.splitlines():
+        match = _CLI_SEGMENT.match(line.strip())
+        if match:
+            h1, m1, s1, h2, m2, s2, text = match.groups()
+            segments.append({"start": _seconds(h1, m1, s1), "end": _seconds(h2, m2, s2), "text": text.strip()})
+    return {
+        "text": " ".join(segment["text"] for segment in segments if segment["text"]).strip(),
+        "segments": segments,
+        "no_speech_prob": None,
+    }
+
+
+def parse_verbose_json(result, no_speech_threshold=None):
+    """Transcript dict from whisper-server's verbose_json response.
+
+    The clip's no-speech probability is the lowest of its segments': one
+    confident speech segment is enough to count as speech. Segments above
+    `no_speech_threshold` (Whisper's "Thank you." on trailing silence) are
+    dropped and the text is rebuilt from the rest.
+    """
+    segments = [
+        {
+            "start": segment.get("start"),
+            "end": segment.get("end"),
+            "text": segment.get("text", "").strip(),
+            "no_speech_prob": segment.get("no_speech_prob"),
+        }
+        for segment in result.get("segments", [])
+    ]
+    probabilities = [s["no_speech_prob"] for s in segments if s["no_speech_prob"] is not None]
+    text = result.get("text", "").strip()
+    if no_speech_threshold is not None and segments:
+        segments = [s for s in segments if s["no_speech_prob"] is None or s["no_speech_prob"] <= no_speech_threshold]
+        text = " ".join(s["text"] for s in segments if s["text"])
+    return {
+        "text": text,
+        "segments": segments,
+        "no_speech_prob": min(probabilities) if probabilities else None,
+    }
+
+
+def default_server_path(cli_path):
+    """Guess the whisper-server binary that sits next to whisper-cli"""
+    directory, name = os.path.split(cli_path)
+    return os.path.join(directory, name.replace("whisper-cli", "whisper-server"))
+
+
+class WhisperEngine:
+    """Keeps a whisper.cpp server running so the model is only loaded once.
+
+    Audio is posted to the server over a loopback HTTP connection that is
+    reused between calls. If the server can't be started (binary missing,
+    port taken, crash) every call falls back to spawning whisper-cli.
+    transcribe_pcm() keeps the whole round trip in memory and drops
+    segments over `no_speech_threshold`.
+    """
+
+    def __init__(self, cli_path, model, transcript_base="transcript",
+                 server_path=None, host="127.0.0.1", port=8178,
+                 use_server=True, startup_timeout=30, threads=None, no_speech_threshold=None):
+        self.cli_path = cli_path
+        self.model = model
+        self.transcript_base = transcript_base
+        self.server_path = server_path or default_server_path(cli_path)
+        self.host = host
+        self.port = port
+        self.use_server = use_server
+        self.startup_timeout = startup_timeout
+        self.threads = threads  # whisper.cpp's own default when None
+        self.no_speech_threshold = no_speech_threshold
+        self.process = None
+        self.connection = None
+        self.server_failed = False
+        # Start-up and the shared keep-alive connection are used from the
+        # warm-up thread as well as the main loop
+        self.lock = threading.RLock()
+        atexit.register(self.stop)
+
+    def start(self):
+        """Start the resident server. Returns True if it is ready to serve."""
+        with self.lock:
+            return self._start()
+
+    def _start(self):
+        if not self.use_server or self.server_failed:
+            return False
+        if self.process and self.process.poll() is None:
+            return True
+        if not os.path.exists(self.server_path):
+            print(f"Whisper server not found at {self.server_path}, using whisper-cli per call")
+            self.server_failed = True
+            return False
+
+        try:
+            self.process = subprocess.Popen(
+                [
+                    self.server_path,
+                    "-m", self.model,
+                    "--host", self.host,
+                    "--port", str(self.port),
+                ] + self._thread_args(),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError as e:
+            print(f"Could not start whisper server: {e}")
+            self.server_failed = True
+            return False
+
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                with socket.create_connection((self.host, self.port), timeout=0.5):
+                    return True
+            except OSError:
+                time.sleep(0.1)
+
+        print("Whisper server did not come up, using whisper-cli per call")
+        self.stop()
+        self.server_failed = True
+        return False
+
+    def stop(self):
+        """Shut down the resident server if it is running"""
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def _thread_args(self):
+        return ["-t", str(self.threads)] if self.threads else []
+
+    def warm_up(self):
+        """Start the server and run one inference on silence so the first real one is fast"""
+        if not self.start():
+            return False
+        try:
+            self._post_inference(pcm_to_wav(bytes(16000)), "warmup.wav")  # 0.5 s of silence
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            print(f"Whisper warm-up failed: {e}")
+            return False
+        return True
+
+    def transcribe(self, audio_file):
+        """Transcribe a WAV file, preferring the resident server"""
+        if self.start():
+            try:
+                with open(audio_file, "rb") as f:
+                    return self._post_inference(f.read(), os.path.basename(audio_file)).get("text", "").strip()
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                print(f"Whisper server error, falling back to whisper-cli: {e}")
+                metrics.incr("fallbacks", kind="whisper_cli")
+                self.stop()
+        return self.transcribe_with_cli(audio_file)
+
+    def transcribe_pcm(self, pcm, sample_rate=16000):
+        """Transcribe 16-bit mono PCM without touching disk.
+
+        Returns {"text", "segments", "no_speech_prob"}; segments carry
+        start/end seconds. whisper-cli (the fallback) reads the audio from
+        stdin and reports no no-speech probability.
+        """
+        wav = pcm_to_wav(pcm, sample_rate)
+        if self.start():
+            try:
+                return parse_verbose_json(self._post_inference(wav, "audio.wav", "verbose_json"),
+                                          self.no_speech_threshold)
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                print(f"Whisper server error, falling back to whisper-cli: {e}")
+                metrics.incr("fallbacks", kind="whisper_cli")
+                self.stop()
+        try:
+            result = subprocess.run(
+                [self.cli_path, "-m", self.model, "-f", "-", "--no-prints"] + self._thread_args(),
+                input=wav, check=True, capture_output=True,
+            )
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"Error transcribing: {e}")
+            return {"text": "", "segments": [], "no_speech_prob": None}
+        return parse_cli_output(result.stdout.decode("utf-8", errors="replace"))
+
+    def transcribe_with_cli(self, audio_file):
+        """Transcribe by spawning whisper-cli (loads the model every call)"""
+        try:
+            subprocess.run([
+                self.cli_path,
+                "-m", self.model,
+                "-f", audio_file,
+                "-of", self.transcript_base,
+                "-otxt"
+            ] + self._thread_args(), check=True, capture_output=True)
+
+            transcript_file = self.transcript_base + ".txt"
+            if os.path.exists(transcript_file):
+                with open(transcript_file, "r") as f:
+                    return f.read().strip()
+            return ""
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"Error transcribing: {e}")
+            return ""
+
+    def _post_inference(self, audio_bytes, filename, response_format="json"):
+        """POST audio to the server; returns its parsed JSON response"""
+        boundary = uuid.uuid4().hex
+        body = b"".join([
+            _form_field(boundary, "response_format", response_format.encode()),
+            _form_field(boundary, "temperature", b"0.0"),
+            _form_field(boundary, "file", audio_bytes, filename, "audio/wav"),
+            f"--{boundary}--\r\n".encode(),
+        ])
+        headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+        with self.lock:
+            return self._request_inference(body, headers)
+
+    def _request_inference(self, body, headers):
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.connection.request("POST", "/inference", body=body, headers=headers)
+                response = self.connection.getresponse()
+                payload = response.read()
+                break
+            except (ConnectionError, http.client.RemoteDisconnected):
+                # Keep-alive socket went stale, reconnect once
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+        if response.status != 200:
+            raise ValueError(f"HTTP {response.status}: {payload[:200]!r}")
+        result = json.loads(payload.decode("utf-8", errors="replace"))
+        if not isinstance(result, dict):
+            raise ValueError("unexpected response from whisper server")
+        return result
+
+
+def _form_field(boundary, name, value, filename=None, content_type=None):
+    disposition = f'form-data; name="{name}"'
+    if filename:
+        disposition += f'; filename="{filename}"'
+    header = f"--{boundary}\r\nContent-Disposition: {disposition}\r\n"
+    if content_type:
+        header += f"Content-Type: {content_type}\r\n"
+    return header.encode() + b"\r\n" + value + b"\r\n"
+
+
+def compare_latency(engine, audio_file, runs=5):
+    """Time the per-call whisper-cli path against the resident server"""
+    results = {}
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        engine.transcribe_with_cli(audio_file)
+        timings.append(time.perf_counter() - start)
+    results["cli"] = timings
+
+    start = time.perf_counter()
+    ready = engine.start()
+    startup = time.perf_counter() - start
+    if ready:
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            engine.transcribe(audio_file)
+            timings.append(time.perf_counter() - start)
+        results["server"] = timings
+        results["server_startup"] = [startup]
+    return results
+
+
+def main():
+    from main import WHISPER_PATH, WHISPER_MODEL, TEMP_AUDIO, TEMP_TRANSCRIPT
+
+    audio_file = sys.argv[1] if len(sys.argv) > 1 else TEMP_AUDIO
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    engine = WhisperEngine(WHISPER_PATH, WHISPER_MODEL, TEMP_TRANSCRIPT)
+    print(f"Comparing whisper-cli vs resident server on {audio_file} ({runs} runs each)...")
+    results = compare_latency(engine, audio_file, runs)
+    engine.stop()
+
+    for name, timings in results.items():
+        print(f"  {name:15s} mean {statistics.mean(timings) * 1000:8.1f} ms"
+              f"   median {statistics.median(timings) * 1000:8.1f} ms"
+              f"   min {min(timings) * 1000:8.1f} ms")
+    if "server" in results:
+        saved = statistics.median(results["cli"]) - statistics.median(results["server"])
+        print(f"Resident server saves {saved * 1000:.1f} ms per transcription")
+    else:
+        print("Resident server unavailable; only the whisper-cli path was measured")
+
+
+if __name__ == "__main__":
+    main()